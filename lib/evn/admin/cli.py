@@ -103,6 +103,22 @@ class ListUnitTestClassnamesCommandLine(AdminCommandLine):
         See also: `evnadmin unittest --help`
     """)
 
+class ShowChangeSetPhasesCommandLine(AdminCommandLine):
+    _rev_   = True
+    _repo_  = True
+    _conf_  = True
+    _usage_ = '%prog [ options ] REPO_PATH'
+    _description_ = textwrap.dedent("""\
+        Loads the changeset for a given revision and shows the time (wall
+        clock and CPU) and page faults spent in each phase of loading and
+        analysing it (i.e. replay, _close, _check_modify_invariants and
+        _load_propchanges).  The same phases are recorded for every commit
+        processed by the hooks.
+    """)
+
+    def _post_run(self):
+        self.command.result.results_to_table(output=sys.stdout)
+
 class DumpDefaultConfigCommandLine(AdminCommandLine):
     pass
 
@@ -606,6 +622,67 @@ class RunHookCommandLine(AdminCommandLine):
     def _process_parser_results(self):
         self.command.hook_args = self.args
 
+class ServeHooksCommandLine(AdminCommandLine):
+    _conf_ = True
+    _repo_ = True
+    _quiet_ = True
+    _usage_ = '%prog [ options ] REPO_PATH'
+    _description_ = textwrap.dedent("""\
+        Run a hook server for a repository.
+
+        Every hook invocation normally starts a new Python interpreter that
+        has to import the Subversion bindings, load the configuration and
+        open the repository before any actual hook logic is run.  This
+        command does all of that once, then listens on a unix socket for hook
+        invocations forwarded by the evn hook script, running each one in a
+        forked child process.
+
+        The evn hook script will only forward hooks to the server if the
+        'hook-server-enabled' configuration option is set for the repository
+        (run `evnadmin fix-hooks` after setting it).  If the server isn't
+        running, hooks are run in-process as per normal.
+
+        The server runs in the foreground until it receives SIGTERM or
+        SIGINT.  Configuration changes require the server to be restarted.
+    """)
+
+class DrainPostCommitSpoolCommandLine(AdminCommandLine):
+    _conf_ = True
+    _repo_ = True
+    _quiet_ = True
+    _usage_ = '%prog [ options ] REPO_PATH'
+    _description_ = textwrap.dedent("""\
+        Process post-commit hooks that have been queued for a repository.
+
+        When the 'async-post-commit' configuration option is set, the
+        post-commit hook merely enqueues the new revision in the repository's
+        post-commit spool (evn/spool) and returns, rather than analysing the
+        revision and updating evn:roots and evn:last_rev whilst the client
+        waits.  This command drains that spool in revision order.
+
+        The post-commit hook runs this command automatically (detached, with
+        output going to evn/logs/post-commit-spool.log) if it's not already
+        running, so it's only necessary to run it manually in order to keep
+        a worker running permanently via --watch, or to retry revisions that
+        previously failed to process.  Only one instance drains the spool at
+        any given time.
+    """)
+
+    def _add_parser_options(self):
+        self.parser.add_option(
+            '-w', '--watch',
+            dest='watch',
+            action='store_true',
+            help=(
+                'keep running after the spool has been drained, waiting for '
+                'new revisions to be enqueued (if another instance is '
+                'already draining the spool, wait for it to exit first)'
+            )
+        )
+
+    def _process_parser_results(self):
+        self.command.watch = self.options.watch
+
 class _SetRepoHookRemoteDebugCommandLine(AdminCommandLine):
     _conf_ = True
     _repo_ = True
@@ -667,8 +744,65 @@ class AnalyzeCommandLine(AdminCommandLine):
         If you need to analyze revision ranges, say as part of altering roots
         via root hints and exclusions, use the analyze-revision-range command
         instead.
+
+        With --jobs greater than 1, a pool of worker processes replays
+        revisions (in windows of --window revisions) ahead of the revision
+        being analyzed into the replay cache (see show-replay-cache), and
+        each revision's changeset is then loaded from the cache.  Revisions
+        are still analyzed, and their revprops written, strictly in order.
+
+        Progress records (revisions per second, ETA, time spent per phase,
+        RSS and the largest revisions seen) are written periodically (see
+        the analyze-progress-interval configuration option) to stderr and,
+        as JSON, to evn/logs/analyze.log.  With --checkpoint-every, the
+        last revision analyzed is checkpointed every N revisions, and when
+        analysis is resumed, the revisions analyzed since the checkpoint
+        are verified before continuing.
     """)
 
+    def _add_parser_options(self):
+        self.parser.add_option(
+            '-j', '--jobs',
+            dest='jobs',
+            type='int',
+            default=1,
+            metavar='JOBS',
+            help=(
+                'number of worker processes replaying revisions ahead of '
+                'the analysis [default: %default]'
+            ),
+        )
+
+        self.parser.add_option(
+            '-w', '--window',
+            dest='window',
+            type='int',
+            default=100,
+            metavar='REVS',
+            help=(
+                'number of revisions each worker replays at a time '
+                '[default: %default]'
+            ),
+        )
+
+        self.parser.add_option(
+            '-k', '--checkpoint-every',
+            dest='checkpoint_every',
+            type='int',
+            default=0,
+            metavar='REVS',
+            help=(
+                'record a verified checkpoint every REVS revisions, such '
+                'that resuming an interrupted analysis only needs to verify '
+                'the revisions analyzed since [default: %default, never]'
+            ),
+        )
+
+    def _process_parser_results(self):
+        self.command.jobs = self.options.jobs
+        self.command.window = self.options.window
+        self.command.checkpoint_every = self.options.checkpoint_every
+
 class AnalyzeRevisionRangeCommandLine(AdminCommandLine):
     _repo_  = True
     _conf_  = True
@@ -690,6 +824,57 @@ class AnalyzeRevisionRangeCommandLine(AdminCommandLine):
         will affect evn:last_rev after each revision has been analyzed.
     """)
 
+class MigrateRpropsCommandLine(AdminCommandLine):
+    _repo_  = True
+    _conf_  = True
+    _quiet_ = True
+    _usage_ = '%prog [ options ] REPO_PATH'
+    _description_ = textwrap.dedent("""\
+        Converts the evn:* revision properties of every analyzed revision in
+        a repository to the given revision property schema version.
+
+        Version 1 stores the complete set of roots known at each revision in
+        that revision's evn:roots property, which means every commit rewrites
+        a property whose size grows with the number of roots in the
+        repository.  Version 2 only stores the roots added and removed by
+        each revision (evn:roots_delta), plus a full list of root paths every
+        'roots-checkpoint-interval' revisions (evn:roots_checkpoint).  Either
+        version can be read regardless of the version recorded in r0; the
+        recorded version only controls how new revisions are written.
+
+        Version 3 is version 2 with dict and list values written in a
+        compact, compressed binary form (see `evnadmin benchmark-revprop-
+        encoding`) instead of as Python literals.  Likewise, version 2 of
+        the base revision properties (i.e. those on r0, such as the root
+        hints), selected via --to-base-version, writes them in compact form.
+
+        This command will require the repository to be set to readonly.  It
+        can safely be re-run if interrupted.
+    """)
+
+    def _add_parser_options(self):
+        self.parser.add_option(
+            '-t', '--to-version',
+            dest='version',
+            type='int',
+            metavar='VERSION',
+            help='schema version to migrate to [default: latest]',
+        )
+        self.parser.add_option(
+            '-b', '--to-base-version',
+            dest='base_version',
+            type='int',
+            metavar='VERSION',
+            help=(
+                'base (r0) revision property schema version to migrate to '
+                '[default: unchanged]'
+            ),
+        )
+
+    def _process_parser_results(self):
+        self.command.version = self.options.version
+        self.command.base_version = self.options.base_version
+
 class ShowRootsCommandLine(AdminCommandLine):
     _rev_       = True
     _repo_      = True
@@ -731,10 +916,67 @@ class RootInfoCommandLine(AdminCommandLine):
         self.command.root_path = self.args.pop(0)
 
 class FindMergesCommandLine(AdminCommandLine):
-    _rev_   = True
     _repo_  = True
     _conf_  = True
     _usage_ = '%prog [ options ] REPO_PATH'
+    _rev_range_ = True
+    _description_ = textwrap.dedent("""\
+        Prints the revisions within a revision range (all revisions by
+        default) that changed svn:mergeinfo, according to the merge index
+        (evn/db/merges.db).  The merge index is kept up to date as each new
+        revision is analyzed; run backfill-merge-index to build it for a
+        repository analyzed by an older version of Enversion.
+    """)
+
+class ShowMergedRevisionsCommandLine(AdminCommandLine):
+    _repo_      = True
+    _conf_      = True
+    _argc_      = 3
+    _usage_     = '%prog [ options ] SOURCE_PATH ROOT REPO_PATH'
+    _verbose_   = True
+    _description_ = textwrap.dedent("""\
+        Prints the revisions of SOURCE_PATH (i.e. /trunk) that have been
+        merged into ROOT (i.e. /branches/1.x), less any that have since been
+        reverse merged, according to the merge index (evn/db/merges.db).
+        With --verbose, each merge is listed as well.
+    """)
+
+    def _pre_process_parser_results(self):
+        self.command.source_path = self.args.pop(0)
+        self.command.root_path = self.args.pop(0)
+
+class BackfillMergeIndexCommandLine(AdminCommandLine):
+    _repo_      = True
+    _conf_      = True
+    _quiet_     = True
+    _usage_     = '%prog [ options ] REPO_PATH'
+    _description_ = textwrap.dedent("""\
+        Rebuilds a repository's merge index (evn/db/merges.db) for every
+        analyzed revision.  Only revisions that svn.fs.paths_changed()
+        suggests changed svn:mergeinfo are replayed, so this is much quicker
+        than re-analyzing the repository.
+    """)
+
+class RebuildRootIndexCommandLine(AdminCommandLine):
+    _repo_  = True
+    _conf_  = True
+    _quiet_ = True
+    _usage_ = '%prog [ options ] REPO_PATH'
+    _description_ = textwrap.dedent("""\
+        Rebuilds a repository's root index (evn/db/roots.db) from the
+        evn:roots revision properties of every analyzed revision.
+
+        The root index records the revisions each root was created and
+        removed in, and is used to look up historical roots (i.e. when
+        analyzing copies and renames, or via show-roots and root-info)
+        without reading revision properties.  It is kept up to date as each
+        new revision is analyzed, so this command only needs to be run for
+        repositories analyzed by an older version of Enversion, or if the
+        index has fallen behind (i.e. because it couldn't be written to).
+        Lookups fall back to the revision properties for any revision not
+        covered by the index, so it's safe to run whilst the repository is
+        in use.
+    """)
 
 class PurgeEvnPropsCommandLine(AdminCommandLine):
     _repo_  = True
@@ -743,6 +985,51 @@ class PurgeEvnPropsCommandLine(AdminCommandLine):
     _usage_ = '%prog [ options ] REPO_PATH'
     _rev_range_ = True
 
+class ShowReplayCacheCommandLine(AdminCommandLine):
+    _repo_  = True
+    _conf_  = True
+    _usage_ = '%prog [ options ] REPO_PATH'
+    _description_ = textwrap.dedent("""\
+        Shows how many revisions a repository's replay cache
+        (evn/db/replay.db) holds, and how much disk space it uses.
+
+        When the replay-cache configuration option is set, the editor
+        callbacks svn.repos.replay2() makes when a revision is first loaded
+        are recorded in the cache, and subsequent loads of that revision
+        (i.e. re-analyzing it) are driven from the cache instead.
+    """)
+
+    def _post_run(self):
+        r = self.command.result
+        revs = '-'
+        if r.revisions:
+            revs = 'r%d:%d' % (r.min_rev, r.max_rev)
+        rows = [
+            ('Enabled', 'Revisions', 'Range', 'Actions', 'Size (KB)'),
+            (
+                'yes' if r.enabled else 'no',
+                r.revisions,
+                revs,
+                r.actions,
+                '%.1f' % (float(r.size) / 1024.0),
+            ),
+        ]
+        k = Dict()
+        k.banner = ('Replay cache', '(%s)' % r.path)
+        k.output = sys.stdout
+        render_text_table(rows, **k)
+
+class PurgeReplayCacheCommandLine(AdminCommandLine):
+    _repo_  = True
+    _conf_  = True
+    _quiet_ = True
+    _usage_ = '%prog [ options ] REPO_PATH'
+    _rev_range_ = True
+    _description_ = textwrap.dedent("""\
+        Discards the replay cache (evn/db/replay.db) entries for a range of
+        revisions (all revisions by default), then compacts the cache.
+    """)
+
 class IsRepoReadonlyCommandLine(AdminCommandLine):
     _repo_  = True
     _conf_  = True
@@ -7,6 +7,11 @@ import pprint
 import textwrap
 import traceback
 import subprocess
+import multiprocessing
+
+from collections import (
+    deque,
+)
 
 import svn
 import svn.fs
@@ -25,12 +30,57 @@ from evn.repo import (
     RepositoryError,
     RepositoryRevOrTxn,
     RepositoryRevisionConfig,
+
+    revprop_cache,
 )
 
 from evn.debug import (
     RemoteDebugSession,
 )
 
+from evn.server import (
+    HookServer,
+    HookServerAlreadyRunning,
+)
+
+from evn.spool import (
+    PostCommitSpool,
+)
+
+from evn.root import (
+    RootPathMatcher,
+    RootMatcherCache,
+    SimpleRootMatcher,
+)
+
+from evn.rootindex import (
+    RootIndex,
+    root_index_path,
+)
+
+from evn.replaycache import (
+    ReplayCache,
+    replay_cache_path,
+    prime_replay_cache,
+)
+
+from evn.mergeindex import (
+    MergeIndex,
+    load_merges,
+    format_ranges,
+    merge_index_path,
+    has_mergeinfo_changes,
+)
+
+from evn.progress import (
+    roots_digest,
+    analyze_log_path,
+    analyze_checkpoint_path,
+
+    AnalysisProgress,
+    AnalysisCheckpoint,
+)
+
 from evn.command import (
     Command,
     CommandError,
@@ -50,12 +100,20 @@ from evn.hook import (
 
 from evn.change import (
     ChangeSet,
+    ProplistCache,
+)
+
+from evn.constants import (
+    EVN_BRPROPS_SCHEMA,
+    EVN_RPROPS_SCHEMA,
+    e,  # Errors
 )
 
 from evn.util import (
     chdir,
-    literal_eval,
+    decode_propval,
     requires_context,
+    prepend_error_if_missing,
     Pool,
     Dict,
     Options,
@@ -132,6 +190,18 @@ class ShowLibraryPathCommand(Command):
         self._out("Library path: %s" % lib)
         self._out("Unit tests: %s" % tests)
 
+class ShowChangeSetPhasesCommand(RepositoryRevisionCommand):
+    @requires_context
+    def run(self):
+        RepositoryRevisionCommand.run(self)
+
+        cs = ChangeSet(self.path, self.rev, self.options)
+        try:
+            cs.load()
+            self.result = cs.analysis.tracker
+        finally:
+            cs.destroy()
+
 class DumpDefaultConfigCommand(Command):
     def run(self):
         cf = Config()
@@ -629,7 +699,123 @@ class RunHookCommand(RepoHookCommand):
                     sys.stderr.write(err)
                     raise exc
 
+class ServeHooksCommand(RepositoryCommand):
+    @requires_context
+    def run(self):
+        RepositoryCommand.run(self)
+
+        socket_path = self.conf.hook_server_socket_path
+        if not self.conf.hook_server_enabled:
+            m = (
+                "hook server is not enabled for repository '%s'; hooks will "
+                "not be forwarded to it until 'hook-server-enabled' is set "
+                "and `evnadmin fix-hooks` has been run"
+            )
+            self._warn(m % self.name)
+
+        server = HookServer(
+            path=self.path,
+            handler=self._run_hook,
+            socket_path=socket_path,
+        )
+
+        m = "Serving hooks for repository '%s' on %s."
+        self._out(m % (self.name, socket_path))
+        self._flush()
+
+        try:
+            server.serve_forever()
+        except HookServerAlreadyRunning:
+            m = "hook server already running for repository '%s' on %s"
+            raise CommandError(m % (self.name, socket_path))
+        except KeyboardInterrupt:
+            pass
+
+    def _run_hook(self, hook_name, hook_args, istream, ostream, estream):
+        # Called in a forked child of the server for each hook invocation.
+        # Everything expensive (svn bindings, config, the open repo handle)
+        # has been inherited from the parent; we just need to mimic what the
+        # `evnadmin run-hook` command line would have done.
+        command = RunHookCommand(istream, ostream, estream)
+        command.conf = self.conf
+        command.options = Options(dict(conf=self.options.conf))
+        command.path = self.path
+        command.repo = self.repo
+        command.hook_name = hook_name
+        command.hook_args = hook_args
+
+        try:
+            with command:
+                command.run()
+        except CommandError as err:
+            msg = 'evnadmin run-hook failed: %s' % err.message
+            estream.write(prepend_error_if_missing(msg))
+            return 1
+
+        return 0
+
+class DrainPostCommitSpoolCommand(RepositoryCommand):
+    watch = None
+    watch_timeout = 60
+
+    @requires_context
+    def run(self):
+        RepositoryCommand.run(self)
+
+        spool = PostCommitSpool(self.path)
+        spool.listen()
+
+        while True:
+            if not spool.lock(blocking=self.watch):
+                # Another worker is already draining the spool.
+                return
+
+            try:
+                self._drain(spool)
+                while self.watch:
+                    spool.wait(self.watch_timeout)
+                    self._drain(spool)
+            finally:
+                spool.unlock()
+
+            # Post-commit hooks only start a new worker if they don't see
+            # this one holding the lock, so check for anything enqueued
+            # whilst we were releasing it before exiting.
+            if not spool.pending():
+                return
+
+    def _drain(self, spool):
+        rc0 = self.r0_revprop_conf
+        for (rev, args) in spool.pending():
+            rc0._reload()
+            last_rev = rc0.get('last_rev')
+            if last_rev is not None and rev <= last_rev:
+                # Already processed (i.e. by `evnadmin analyze`).
+                spool.remove(rev)
+                continue
+
+            with RepositoryHook(**self.repo_kwds) as r:
+                r.from_spool = True
+                try:
+                    r.run_hook('post-commit', [ str(rev) ] + list(args))
+                except RepositoryError as err:
+                    # Leave the entry in the spool; processing can't proceed
+                    # past this revision until the error has been resolved.
+                    m = "failed to process r%d: %s" % (rev, err.args[0])
+                    raise CommandError(m)
+
+            spool.remove(rev)
+            self._out("Processed r%d." % rev)
+            self._flush()
+
 class AnalyzeCommand(RepositoryCommand):
+    jobs = 1
+    window = 100
+    checkpoint_every = 0
+
+    progress = None
+    checkpoint = None
+
     @requires_context
     def run(self, from_enable=False):
         RepositoryCommand.run(self)
@@ -661,17 +847,152 @@ class AnalyzeCommand(RepositoryCommand):
                     "from revision %d..." % (self.name, start_rev)
                 )
 
-        k = self.repo_kwds
-        for i in xrange(start_rev, end_rev+1):
-            with RepositoryRevOrTxn(**k) as r:
-                r.process_rev_or_txn(i)
-                if i == 0:
-                    continue
-                cs = r.changeset
-                self._out(str(i) + ':' + cs.analysis.one_liner)
+        self.checkpoint = AnalysisCheckpoint(
+            analyze_checkpoint_path(self.path)
+        )
+        if last_rev:
+            start_rev = self._verify_checkpoint(start_rev)
+
+        # Consecutive revisions tend to copy from and remove the same nodes,
+        # so share a proplist cache between all of their changesets, and
+        # historical root matchers between all of their RepositoryRevOrTxns.
+        size = self.conf.proplist_cache_size
+        self.options.proplist_cache = ProplistCache(max_size=size)
+        size = self.conf.rootmatcher_cache_size
+        self.options.rootmatcher_cache = RootMatcherCache(max_size=size)
+
+        self.progress = AnalysisProgress(
+            start_rev,
+            end_rev,
+            interval=self.conf.analyze_progress_interval,
+            log_path=analyze_log_path(self.path),
+            stream=None if self.options.quiet else self.estream,
+            caches=dict(
+                revprops=revprop_cache,
+                rootmatchers=self.options.rootmatcher_cache,
+            ),
+        )
+
+        if self.jobs > 1 and end_rev > start_rev:
+            self._analyze_in_parallel(start_rev, end_rev)
+        else:
+            for i in xrange(start_rev, end_rev+1):
+                self._analyze_rev(i)
+
+        if self.progress.count:
+            self.progress.flush()
 
         self._out("Finished analyzing repository '%s'." % self.name)
 
+    def _verify_checkpoint(self, last_rev):
+        """
+        Verifies that every revision analyzed since the last checkpoint (if
+        there is one) has its roots recorded, and returns the revision
+        analysis should resume from: @last_rev (i.e. evn:last_rev) if so,
+        otherwise the first revision that doesn't, in which case
+        evn:last_rev is wound back accordingly.
+        """
+        c = self.checkpoint.load()
+        if not c or c.rev > last_rev:
+            return last_rev
+
+        k = dict(fs=self.fs, conf=self.conf)
+        roots = RepositoryRevisionConfig(rev=c.rev, **k).roots
+        if roots is None or roots_digest(roots) != c.digest:
+            m = "ignoring stale analysis checkpoint for r%d" % c.rev
+            self._warn(m)
+            self.checkpoint.clear()
+            return last_rev
+
+        for rev in xrange(c.rev+1, last_rev+1):
+            if RepositoryRevisionConfig(rev=rev, **k).roots is not None:
+                continue
+            m = "r%d has no roots despite evn:last_rev being r%d"
+            self._warn(m % (rev, last_rev))
+            self.r0_revprop_conf.last_rev = rev-1
+            return rev
+
+        return last_rev
+
+    def _analyze_rev(self, rev):
+        with RepositoryRevOrTxn(**self.repo_kwds) as r:
+            r.process_rev_or_txn(rev)
+            if rev == 0:
+                return
+            cs = r.changeset
+            self._out(str(rev) + ':' + cs.analysis.one_liner)
+
+            if self.progress:
+                count = int(cs.analysis.change_count)
+                self.progress.update(rev, r.phase_times, count)
+
+            every = self.checkpoint_every
+            if every and rev % every == 0:
+                self.checkpoint.save(rev, r.roots)
+                if self.progress:
+                    self.progress.flush()
+
+    def _analyze_in_parallel(self, start_rev, end_rev):
+        """
+        Analyzes @start_rev through @end_rev in two stages.  A pool of
+        self.jobs worker processes replays windows of self.window revisions
+        ahead of the current revision into the replay cache (which doesn't
+        depend on any evn:roots state), whilst we analyze each revision in
+        order as usual, loading its changeset from the cache instead of
+        replaying it ourselves.
+
+        Windows are purged from the cache once analyzed, unless the cache is
+        enabled via the replay-cache configuration option.
+        """
+        cache = ReplayCache(replay_cache_path(self.path))
+        if not cache.available:
+            raise CommandError("sqlite3 module is not available")
+
+        keep = self.conf.replay_cache
+        send_deltas = self.conf.replay_text_deltas
+        self.options.replay_cache = cache
+
+        if start_rev == 0:
+            self._analyze_rev(0)
+            start_rev = 1
+
+        size = max(self.window, 1)
+        windows = [
+            (i, min(i+size-1, end_rev))
+                for i in xrange(start_rev, end_rev+1, size)
+        ]
+
+        # Keep a couple of windows queued per worker, such that none of
+        # them go idle, without racing too far ahead of us.
+        ahead = self.jobs * 2
+        pending = deque()
+        submitted = 0
+
+        pool = multiprocessing.Pool(self.jobs)
+        try:
+            for (first, last) in windows:
+                while submitted < len(windows) and len(pending) < ahead:
+                    (lo, hi) = windows[submitted]
+                    args = ((self.path, lo, hi, send_deltas),)
+                    pending.append(pool.apply_async(prime_replay_cache, args))
+                    submitted += 1
+
+                pending.popleft().get()
+                for i in xrange(first, last+1):
+                    self._analyze_rev(i)
+
+                if not keep:
+                    cache.purge(first, last, vacuum=False)
+
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+            self.options.replay_cache = None
+            cache.close()
+
 class AnalyzeRevisionRangeCommand(RepositoryRevisionRangeCommand):
     @requires_context
     def run(self, from_enable=False):
@@ -680,6 +1001,11 @@ class AnalyzeRevisionRangeCommand(RepositoryRevisionRangeCommand):
 
         from evn.exe import evnadmin
 
+        size = self.conf.proplist_cache_size
+        self.options.proplist_cache = ProplistCache(max_size=size)
+        size = self.conf.rootmatcher_cache_size
+        self.options.rootmatcher_cache = RootMatcherCache(max_size=size)
+
         k = self.repo_kwds
         for i in xrange(self._start_rev, self._end_rev+1):
             with RepositoryRevOrTxn(**k) as r:
@@ -692,6 +1018,62 @@ class AnalyzeRevisionRangeCommand(RepositoryRevisionRangeCommand):
         self._out(evnadmin.show_rev_props(self.name, r=str(self._end_rev)))
         self._out(evnadmin.show_base_rev_props(self.name))
 
+class MigrateRpropsCommand(RepositoryCommand):
+    version = None
+    base_version = None
+
+    def _rewrite_values(self, rc):
+        # Re-setting a value writes it back out in whatever form the
+        # config's current schema version dictates.
+        with rc.batch():
+            for (name, value) in rc.items():
+                if isinstance(value, (dict, list)):
+                    rc[name] = value
+
+    @requires_context
+    def run(self):
+        RepositoryCommand.run(self)
+        self.ensure_readonly()
+
+        version = self.version or max(EVN_RPROPS_SCHEMA)
+        if version not in EVN_RPROPS_SCHEMA:
+            known = ', '.join(str(v) for v in sorted(EVN_RPROPS_SCHEMA))
+            m = e.UnknownRpropsSchemaVersion % (version, known)
+            raise CommandError(m)
+
+        base_version = self.base_version
+        if base_version is not None and base_version not in EVN_BRPROPS_SCHEMA:
+            known = ', '.join(str(v) for v in sorted(EVN_BRPROPS_SCHEMA))
+            m = e.UnknownBrpropsSchemaVersion % (base_version, known)
+            raise CommandError(m)
+
+        rc0 = self.r0_revprop_conf
+        last_rev = rc0.get('last_rev') or 0
+
+        # Record the new versions up front; values are readable in any
+        # format, so if we're interrupted part way through, the repository is
+        # still consistent and we can simply be re-run.
+        rc0.rprops_version = version
+        if base_version is not None:
+            rc0.version = base_version
+            self._rewrite_values(rc0)
+
+        k = dict(fs=self.fs, conf=self.conf)
+        index = None
+        for rev in xrange(1, last_rev+1):
+            rc = RepositoryRevisionConfig(rev=rev, **k)
+            if index is not None:
+                rc._base_roots_index = index
+            roots = rc.roots
+            if roots is None:
+                index = None
+                continue
+            self._rewrite_values(rc)
+            index = rc._index_roots(roots)
+
+        m = "Migrated revision properties for repository '%s' to version %d."
+        self._out(m % (self.name, version))
+
 class ShowRootsCommand(RepositoryRevisionCommand):
     @requires_context
     def run(self):
@@ -704,9 +1086,20 @@ class ShowRootsCommand(RepositoryRevisionCommand):
             )
             self._out(m % (self.name, self.last_rev, self.youngest_rev))
 
-        k = dict(fs=self.fs, rev=self.rev, conf=self.conf)
-        rc = RepositoryRevisionConfig(**k)
-        roots = rc.roots
+        # The root index can give us the roots present at any revision it
+        # covers, but only the paths and created revisions, which is all that
+        # is recorded for roots inherited from earlier revisions anyway.  If
+        # any roots were created in this revision, though, we need their full
+        # details from the revision properties.
+        index = RootIndex(root_index_path(self.path))
+        created = index.roots_at(self.rev)
+        index.close()
+        if created is not None and self.rev not in created.values():
+            roots = dict((p, { 'created': c }) for (p, c) in created.items())
+        else:
+            k = dict(fs=self.fs, rev=self.rev, conf=self.conf)
+            rc = RepositoryRevisionConfig(**k)
+            roots = rc.roots
 
         if roots is None:
             m = "Repository '%s' has no roots defined at r%d."
@@ -726,21 +1119,27 @@ class RootInfoCommand(RepositoryRevisionCommand):
         assert self.root_path and isinstance(self.root_path, str)
         p = format_dir(self.root_path)
 
-        k = dict(fs=self.fs, rev=self.rev, conf=self.conf)
-        rc = RepositoryRevisionConfig(**k)
-        roots = rc.roots
-        if not roots:
-            m = "Repository '%s' has no roots defined at r%d"
-            self._out(m % (self.name, self.rev))
-            return
+        index = RootIndex(root_index_path(self.path))
+        created = index.created_rev(p, self.rev)
+        index.close()
+
+        if created is None:
+            k = dict(fs=self.fs, rev=self.rev, conf=self.conf)
+            rc = RepositoryRevisionConfig(**k)
+            roots = rc.roots
+            if not roots:
+                m = "Repository '%s' has no roots defined at r%d"
+                self._out(m % (self.name, self.rev))
+                return
 
-        root = roots.get(p)
-        if not root:
-            m = "No root named '%s' is present in repository '%s' at r%d."
-            self._out(m % (p, self.name, self.rev))
-            return
+            root = roots.get(p)
+            if not root:
+                m = "No root named '%s' is present in repository '%s' at r%d."
+                self._out(m % (p, self.name, self.rev))
+                return
+
+            created = root['created']
 
-        created = root['created']
         m = "Found root '%s' in repository '%s' at r%d (created at r%d)."
         self._verbose(m % (p, self.name, self.rev, created))
 
@@ -783,6 +1182,97 @@ class RootInfoCommand(RepositoryRevisionCommand):
         self.ostream.write(buf.read())
 
 
+class RebuildRootIndexCommand(RepositoryCommand):
+    @requires_context
+    def run(self):
+        RepositoryCommand.run(self)
+
+        index = RootIndex(root_index_path(self.path))
+        if not index.available:
+            raise CommandError("sqlite3 module is not available")
+
+        index.clear()
+
+        k = dict(fs=self.fs, conf=self.conf)
+        hints = self.r0_revprop_conf.get('root_hints') or {}
+        base_roots = dict()
+        rev = 1
+        try:
+            # Keep going until we've caught up with evn:last_rev, which may
+            # advance whilst we're running if the repository is in use.
+            while True:
+                rc0 = RepositoryRevisionConfig(rev=0, **k)
+                last_rev = rc0.get('last_rev') or 0
+                if rev > last_rev:
+                    break
+
+                rc = RepositoryRevisionConfig(rev=rev, **k)
+                rc._base_roots_index = rc._index_roots(base_roots)
+                roots = rc.roots
+                if roots is None:
+                    m = "r%d has no roots defined; stopping."
+                    self._out(m % rev)
+                    break
+
+                pm = RootPathMatcher()
+                for (path, root_type) in (hints.get(rev) or {}).items():
+                    pm.add_path(path, root_type)
+                root_types = dict(
+                    (p, pm.get_root_details(p).root_type)
+                        for (p, r) in roots.items()
+                            if r['created'] == rev
+                )
+
+                if not index.update(rev, roots, base_roots, root_types):
+                    m = "failed to update root index at r%d"
+                    raise CommandError(m % rev)
+
+                base_roots = roots
+                rev += 1
+        finally:
+            index.close()
+
+        m = "Rebuilt root index for repository '%s' (r%d)."
+        self._out(m % (self.name, rev-1))
+
+class ShowReplayCacheCommand(RepositoryCommand):
+    @requires_context
+    def run(self):
+        RepositoryCommand.run(self)
+
+        cache = ReplayCache(replay_cache_path(self.path))
+        if not cache.available:
+            raise CommandError("sqlite3 module is not available")
+
+        try:
+            (revisions, min_rev, max_rev, actions, size) = cache.stats()
+        finally:
+            cache.close()
+
+        r = Dict()
+        r.path = cache.path
+        r.enabled = self.conf.replay_cache
+        r.revisions = revisions
+        r.min_rev = min_rev
+        r.max_rev = max_rev
+        r.actions = actions
+        r.size = size
+        self.result = r
+
+class PurgeReplayCacheCommand(RepositoryRevisionRangeCommand):
+    @requires_context
+    def run(self):
+        RepositoryRevisionRangeCommand.run(self)
+
+        cache = ReplayCache(replay_cache_path(self.path))
+        try:
+            count = cache.purge(self._start_rev, self._end_rev)
+        finally:
+            cache.close()
+
+        m = "Purged %d revision(s) from the replay cache of repository '%s'."
+        self._out(m % (count, self.name))
+
 class ChangeSetCommand(RepositoryCommand):
     rev_or_txn = None
 
@@ -894,100 +1384,117 @@ class ChangeSetCommand(RepositoryCommand):
             c.run()
             return c.result
 
-class FindMergesCommand(RepositoryRevisionCommand):
-    # XXX TODO: this is broken.
+class FindMergesCommand(RepositoryRevisionRangeCommand):
     """
-    When set to True, run() will yield revisions that contain merges instead
-    of printing them to stdout.  This functionality is used by the classmethod
-    find_merges.
+    Prints each revision in the given range that changed svn:mergeinfo
+    (i.e. contained a merge), as recorded in the merge index (see
+    evn.mergeindex).  The revisions are also available as a list via
+    `result`.
     """
-    yield_values = False
-
-    def __iter__(self):
-        CSC = ChangeSetCommand
-
-        revs = (self._start_rev, self._end_rev+1)
-        for i in xrange(*revs):
-            with Pool() as pool:
-                k = CSC.get_changeset_kwds_for_rev_or_txn(self, i, pool)
-                with ChangeSet(**k) as cs:
-                    cs.load()
-                    yield (i, cs.has_merges)
-
-    def _find_merges(self):
-        CSC = ChangeSetCommand
-
-        revs = (self._start_rev, self._end_rev+1)
-        for i in xrange(*revs):
-            with Pool() as pool:
-                k = CSC.get_changeset_kwds_for_rev_or_txn(self, i, pool)
-                with ChangeSet(**k) as cs:
-                    cs.load()
-                    yield (i, cs.has_merges)
-
     @requires_context
     def run(self):
-        RepositoryRevisionCommand.run(self)
-
-        CSC = ChangeSetCommand
-
-        if not self.yield_values:
-            m = "Finding merges between revisions %d:%d..."
-            self._err(m % (self._start_rev, self._end_rev))
-
-            revs = (self._start_rev, self._end_rev+1)
-            for i in xrange(*revs):
-                with Pool(self.pool) as pool:
-                    k = CSC.get_changeset_kwds_for_rev_or_txn(self, i, pool)
-                    with ChangeSet(**k) as cs:
-                        cs.load()
+        RepositoryRevisionRangeCommand.run(self)
 
-                        if cs.has_merges:
-                            self.ostream.write('%d%s' % (i, os.linesep))
-                            self._err('%d: merge' % i)
+        index = MergeIndex(merge_index_path(self.path))
+        try:
+            if not index.covers(self._end_rev):
+                m = (
+                    "merge index doesn't cover r%d; run `evnadmin "
+                    "backfill-merge-index %s` first"
+                )
+                raise CommandError(m % (self._end_rev, self.name))
+            revs = index.find_merges(self._start_rev, self._end_rev)
+        finally:
+            index.close()
 
-                        elif self._verbose:
-                            self._err('%d' % i)
+        self.result = revs
+        for rev in revs:
+            self.ostream.write('%d%s' % (rev, os.linesep))
 
-                self._flush()
+class ShowMergedRevisionsCommand(RepositoryCommand):
+    """
+    Shows which revisions of a source path have been merged into a root,
+    according to the merge index.  `result` is a list of inclusive (start,
+    end) revision tuples.
+    """
+    source_path = None
+    root_path = None
 
     @requires_context
-    def run_old(self):
-        RepositoryRevisionCommand.run(self)
+    def run(self):
+        RepositoryCommand.run(self)
 
-        if not self.yield_values:
-            m = "Finding merges between revisions %d:%d..."
-            self._err(m % (self._start_rev, self._end_rev))
-            for (i, has_merges) in self:
-                if has_merges:
-                    self.ostream.write('%d%s' % (i, os.linesep))
-                    self._err('%d: merge' % i)
-                    self._flush()
-                elif self._verbose:
-                    self._err('%d' % i)
-            self._flush()
+        assert self.source_path and isinstance(self.source_path, str)
+        assert self.root_path and isinstance(self.root_path, str)
+        source = self.source_path.rstrip('/')
+        root = format_dir(self.root_path)
 
-    @classmethod
-    def find_merges(cls, path, revision, **kwds):
-        k = DecayDict(**kwds)
-        estream = kwds.get('estream', sys.stderr)
-        ostream = kwds.get('ostream', sys.stdout)
-        istream = kwds.get('istream', sys.stdout)
+        index = MergeIndex(merge_index_path(self.path))
+        try:
+            if index.last_rev is None:
+                m = (
+                    "merge index is empty; run `evnadmin "
+                    "backfill-merge-index %s` first"
+                )
+                raise CommandError(m % self.name)
+            merges = index.merges_into_root(source, root)
+            self.result = index.merged_revisions(source, root)
+        finally:
+            index.close()
+
+        for (rev, target, src, ranges, reverse) in merges:
+            m = '%s %s' % ('reverse merged' if reverse else 'merged', ranges)
+            self._verbose('r%d: %s from %s into %s' % (rev, m, src, target))
+
+        if not self.result:
+            m = "No revisions of '%s' have been merged into '%s'."
+            self._out(m % (source, root))
+            return
 
-        c = FindMergesCommand(istream, ostream, estream)
+        self._out(format_ranges(self.result))
 
-        c.revision = revision
+class BackfillMergeIndexCommand(RepositoryCommand):
+    @requires_context
+    def run(self):
+        RepositoryCommand.run(self)
 
-        c.path    = path
-        c.conf    = kwds.get('conf', Config())
-        c.options = kwds.get('options', Options())
+        index = MergeIndex(merge_index_path(self.path))
+        if not index.available:
+            raise CommandError("sqlite3 module is not available")
 
-        k.assert_empty(cls)
+        index.clear()
 
-        c.yield_values = True
-        with c:
-            c.run()
-            return c
+        k = dict(fs=self.fs, conf=self.conf)
+        rev = 1
+        count = 0
+        try:
+            # Keep going until we've caught up with evn:last_rev, which may
+            # advance whilst we're running if the repository is in use.
+            while True:
+                rc0 = RepositoryRevisionConfig(rev=0, **k)
+                last_rev = rc0.get('last_rev') or 0
+                if rev > last_rev:
+                    break
+
+                with Pool() as pool:
+                    if not has_mergeinfo_changes(self.fs, rev, pool):
+                        rev += 1
+                        continue
+
+                roots = RepositoryRevisionConfig(rev=rev, **k).roots
+                rm = SimpleRootMatcher(set(roots or ()))
+                merges = load_merges(self.path, rev, rm.find_root_path)
+                index.backfill(rev, merges)
+                if merges:
+                    count += 1
+                rev += 1
+
+            index.set_last_rev(rev-1)
+        finally:
+            index.close()
+
+        m = "Backfilled merge index for repository '%s' (r%d, %d merges)."
+        self._out(m % (self.name, rev-1, count))
 
 class PurgeEvnPropsCommand(RepositoryRevisionRangeCommand):
     @requires_context
@@ -999,6 +1506,12 @@ class PurgeEvnPropsCommand(RepositoryRevisionRangeCommand):
         if self._start_rev == 0:
             self._start_rev = 1
 
+        # The root index no longer reflects anything from the first purged
+        # revision onward.
+        index = RootIndex(root_index_path(self.path))
+        index.rewind(self._start_rev-1)
+        index.close()
+
         fs = self.fs
         prefix = self.conf.propname_prefix
         revproplist = svn.fs.revision_proplist
@@ -1028,7 +1541,7 @@ class ShowRevPropsCommand(RepositoryRevisionCommand):
         for (key, value) in d.items():
             ix = key.find(':')
             try:
-                v = literal_eval(value)
+                v = decode_propval(value)
             except:
                 v = value
             if ix != -1:
@@ -1239,6 +1752,9 @@ class AddRootHintCommand(RepositoryRevisionCommand):
             )
         else:
             rc0.last_rev = last_rev
+            index = RootIndex(root_index_path(self.path))
+            index.rewind(last_rev)
+            index.close()
             msg = (
                 'evn:last_rev has been reset from %d to %d; '
                 'run `evnadmin analyze %s` when ready to '
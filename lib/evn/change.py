@@ -4,8 +4,8 @@
 import os
 import gc
 import time
-
-import itertools
+import weakref
+import binascii
 
 import svn
 import svn.fs
@@ -46,8 +46,7 @@ from evn.path import (
 
 from evn.perfmon import (
     track_resource_usage,
-    ResourceUsageTracker,
-    DummyResourceUsageTracker,
+    PhaseTracker,
 )
 
 from evn.root import (
@@ -59,9 +58,13 @@ from evn.constants import (
     EVN_ERROR_CONFIRMATION_BLURB,
 )
 
+from evn.replaycache import (
+    replay,
+    ReplayRecorder,
+)
+
 from evn.util import (
     try_int,
-    memoize,
     Pool,
     Dict,
     Options,
@@ -148,11 +151,20 @@ PropertyReplacementType = _PropertyReplacementType()
 # PropertyChange-type Classes
 #===============================================================================
 class PropertyChange(object):
+    __slots__ = (
+        '__name',
+        '__parent',
+        '__old_value',
+        '__new_value',
+        '__replacement',
+        '__is_replace',
+        '__removal',
+    )
 
     def __init__(self, **kwds):
         k = DecayDict(kwds)
-        self.__name = k.name
-        self.__parent = k.parent
+        self.__name = intern(k.name)
+        self.__parent = weakref.ref(k.parent)
         self.__old_value = k.old_value
         self.__new_value = k.get('new_value')
         self.__replacement = None
@@ -172,7 +184,9 @@ class PropertyChange(object):
 
     @property
     def parent(self):
-        return self.__parent
+        # Parents are only referenced weakly (they own their propchanges);
+        # None is returned once the parent has been collected.
+        return self.__parent() if self.__parent is not None else None
 
     def unparent(self):
         """
@@ -340,6 +354,11 @@ class PropertyChange(object):
         )
 
 class MergeinfoPropertyChange(PropertyChange):
+    __slots__ = (
+        '__merged',
+        '__reverse_merged',
+    )
+
     def __init__(self, **kwds):
         PropertyChange.__init__(self, **kwds)
 
@@ -401,6 +420,34 @@ class MergeinfoPropertyChange(PropertyChange):
             ', '.join('%s=%s' % (k, v) for (k, v) in r),
         )
 
+#===============================================================================
+# Cache Classes
+#===============================================================================
+class ProplistCache(dict):
+    """
+    Maps (rev, path) tuples to the proplist of path in rev.  Used by
+    ChangeSet._get_proplist() for the proplists of committed revisions
+    (i.e. copy, remove and previous sources), which never change, and can
+    thus be shared by the changesets of consecutive revisions (see
+    AnalyzeCommand) via the 'proplist_cache' option.  The cache is simply
+    emptied once it reaches @max_size entries.
+
+    >>> c = ProplistCache(max_size=2)
+    >>> c[(1, '/a')] = {}
+    >>> c[(1, '/b')] = {}
+    >>> c[(2, '/a')] = { 'svn:eol-style': 'native' }
+    >>> c.items()
+    [((2, '/a'), {'svn:eol-style': 'native'})]
+    """
+    def __init__(self, max_size=10000):
+        dict.__init__(self)
+        self.max_size = max_size
+
+    def __setitem__(self, key, value):
+        if len(self) >= self.max_size:
+            self.clear()
+        dict.__setitem__(self, key, value)
+
 #===============================================================================
 # Change-type Classes
 #===============================================================================
@@ -408,15 +455,15 @@ class AbstractChange(object):
     def __init__(self, **kwds):
         object.__init__(self)
         k = DecayDict(kwds)
-        self.__kwds = kwds
-        self.__path = k.path
+        self.__path = intern(k.path)
         self._assert_empty(k)
 
         self.__is_open = True
-        self.__close_count = itertools.count(1)
         self.__proplist = None
-        self.__propchanges = dict()
-        self.__change_prop = dict()
+        # Only a small fraction of changes touch properties, so these dicts
+        # are only created on demand.
+        self.__propchanges = None
+        self.__change_prop = None
 
         self.__previous_proplist = None
         self.__has_loaded_propchanges = False
@@ -427,7 +474,7 @@ class AbstractChange(object):
         assert not self.__destroyed
         self.__destroyed = True
 
-        for (k, v) in self.__propchanges.items():
+        for (k, v) in (self.__propchanges or dict()).items():
             v.unparent()
             del v
             del self.__propchanges[k]
@@ -518,17 +565,19 @@ class AbstractChange(object):
     @property
     def propchanges(self):
         assert self.has_loaded_propchanges
-        return self.__propchanges
+        return self.__propchanges or dict()
 
     def has_propchange(self, name):
         assert self.has_loaded_propchanges
-        return name in self.__propchanges
+        return name in self.propchanges
 
     def get_propchange(self, name):
         assert self.has_loaded_propchanges
-        return self.__propchanges[name]
+        return self.propchanges[name]
 
     def _add_propchange(self, propchange):
+        if self.__propchanges is None:
+            self.__propchanges = dict()
         assert propchange.name not in self.__propchanges
         assert propchange.parent == self
         self.__propchanges[propchange.name] = propchange
@@ -568,7 +617,7 @@ class AbstractChange(object):
     @property
     def has_propchanges(self):
         assert self.is_changeset or not self.is_remove
-        return bool(len(self.__propchanges))
+        return bool(self.__propchanges)
 
     @property
     def proplist(self):
@@ -621,18 +670,26 @@ class AbstractChange(object):
 
     def _close(self):
         # Protect against _close() being called multiple times.
-        assert self.__close_count.next() == 1
+        assert self.__is_open
         self.__is_open = False
 
+    @property
+    def _changed_props(self):
+        # Properties changed via _change_prop() that _load_propchanges()
+        # hasn't yet turned into PropertyChange objects.
+        return self.__change_prop or dict()
+
     def _change_prop(self, name, value):
         if not self.is_change:
             self.change_type = ChangeType.Modify
+        if self.__change_prop is None:
+            self.__change_prop = dict()
         assert name not in self.__change_prop
         self.__change_prop[name] = value
 
     def _load_propchanges(self):
         assert not self.has_loaded_propchanges
-        for (name, new_value) in self.__change_prop.items():
+        for (name, new_value) in (self.__change_prop or dict()).items():
             if new_value is not None:
                 assert new_value == self.proplist[name]
             k = Dict()
@@ -736,17 +793,20 @@ class AbstractChange(object):
 class NodeChange(AbstractChange):
     def __init__(self, **kwds):
         k = DecayDict(kwds)
-        self.__parent = k.parent
-        self.__changeset = k.changeset
+        # Both the parent and the changeset own this change (via set
+        # membership and the changeset's change stores respectively), so
+        # only weak references are kept back to them.  This keeps the tree
+        # free of reference cycles, allowing a ChangeSet and all its changes
+        # to be freed by reference counting alone.
+        self.__parent = weakref.ref(k.parent)
+        self.__changeset = weakref.ref(k.changeset)
         self.__change_type = k.change_type
         if self.is_copy:
-            self.__copied_from_path = k.copied_from_path
+            self.__copied_from_path = intern(k.copied_from_path)
             self.__copied_from_rev  = k.copied_from_rev
-            self.__copied_from_proplist = k.copied_from_proplist
         elif self.is_remove:
-            self.__removed_from_path = k.removed_from_path
+            self.__removed_from_path = intern(k.removed_from_path)
             self.__removed_from_rev  = k.removed_from_rev
-            self.__removed_from_proplist = k.removed_from_proplist
 
         AbstractChange.__init__(self, path=k.path)
         k.assert_empty(self)
@@ -760,6 +820,8 @@ class NodeChange(AbstractChange):
         self.__old = None
         self.__proplist = None
         self.__previous_proplist = None
+        self.__copied_from_proplist = None
+        self.__removed_from_proplist = None
         self.__has_changed_type = False
         self.__registered = False
 
@@ -778,29 +840,33 @@ class NodeChange(AbstractChange):
         self.__previous_parent_path = None
         self.__checked_modify_invariants = False
 
-        self.__propreplacements = dict()
+        self.__propreplacements = None
         self.__has_loaded_propchanges = False
         self.__has_loaded_propreplacements = False
 
-        self.__notes = list()
-        self.__errors = list()
-        self.__warnings = list()
+        # The vast majority of changes never get any notes, errors or
+        # warnings, so the lists are only created on demand.
+        self.__notes = None
+        self.__errors = None
+        self.__warnings = None
 
     @property
     def notes(self):
-        return self.__notes
+        return self.__notes or list()
 
     @property
     def errors(self):
-        return self.__errors
+        return self.__errors or list()
 
     @property
     def warnings(self):
-        return self.__warnings
+        return self.__warnings or list()
 
     def note(self, n):
         if '%' in n:
             n = n % self
+        if self.__notes is None:
+            self.__notes = list()
         self.__notes.append(n)
         self.changeset.note(self, n)
 
@@ -808,6 +874,8 @@ class NodeChange(AbstractChange):
         c = EVN_ERROR_CONFIRMATIONS.get(e, '')
         if '%' in e:
             e = e % self
+        if self.__errors is None:
+            self.__errors = list()
         self.__errors.append(e)
 
         self.changeset.error(self, e, confirm=c)
@@ -815,6 +883,8 @@ class NodeChange(AbstractChange):
     def warn(self, w):
         if '%' in w:
             w = w % self
+        if self.__warnings is None:
+            self.__warnings = list()
         self.__warnings.append(w)
         self.changeset.warn(self, w)
 
@@ -860,6 +930,8 @@ class NodeChange(AbstractChange):
 
     def _add_propreplacement(self, propchange):
         assert propchange.is_replace
+        if self.__propreplacements is None:
+            self.__propreplacements = dict()
         assert propchange.name not in self.__propreplacements
         self.__propreplacements[propchange.name] = propchange
         self.changeset._register_propreplacement(propchange)
@@ -920,12 +992,12 @@ class NodeChange(AbstractChange):
     def has_propreplacements(self):
         assert self.is_change
         assert self.has_loaded_propreplacements
-        return bool(len(self.__propreplacements))
+        return bool(self.__propreplacements)
 
     def has_propreplacement(self, name):
         assert self.is_change
         assert self.has_loaded_propreplacements
-        return name in self.__propreplacements
+        return name in (self.__propreplacements or dict())
 
     @property
     def has_loaded_propreplacements(self):
@@ -933,7 +1005,7 @@ class NodeChange(AbstractChange):
 
     @property
     def propreplacements(self):
-        return dict(self.__propreplacements)
+        return dict(self.__propreplacements or dict())
 
     @property
     def replacement(self):
@@ -1099,12 +1171,12 @@ class NodeChange(AbstractChange):
 
     @property
     def parent(self):
-        return self.__parent
+        return self.__parent() if self.__parent is not None else None
 
     def reparent(self, parent):
-        assert self.__parent != parent
+        assert self.parent != parent
         self.parent.remove(self)
-        self.__parent = parent
+        self.__parent = weakref.ref(parent)
         self.parent.add(self)
 
     def unparent(self):
@@ -1135,7 +1207,7 @@ class NodeChange(AbstractChange):
 
     @property
     def changeset(self):
-        return self.__changeset
+        return self.__changeset() if self.__changeset is not None else None
 
     @property
     def is_changeset(self):
@@ -1170,6 +1242,16 @@ class NodeChange(AbstractChange):
     @property
     def copied_from_proplist(self):
         assert self.is_copy
+        return self.__get_copied_from_proplist()
+
+    def __get_copied_from_proplist(self):
+        # Fetched on demand (via the changeset's proplist cache) as most
+        # copies never have their source's properties compared against.
+        if self.__copied_from_proplist is None:
+            self.__copied_from_proplist = self._get_proplist(
+                self.__copied_from_path,
+                self.__copied_from_rev,
+            )
         return self.__copied_from_proplist
 
     @property
@@ -1185,7 +1267,7 @@ class NodeChange(AbstractChange):
     @property
     def renamed_from_proplist(self):
         assert self.is_rename
-        return self.__copied_from_proplist
+        return self.__get_copied_from_proplist()
 
     @property
     def removed_from_path(self):
@@ -1200,6 +1282,11 @@ class NodeChange(AbstractChange):
     @property
     def removed_from_proplist(self):
         assert self.is_remove
+        if self.__removed_from_proplist is None:
+            self.__removed_from_proplist = self._get_proplist(
+                self.__removed_from_path,
+                self.__removed_from_rev,
+            )
         return self.__removed_from_proplist
 
     @property
@@ -1275,6 +1362,10 @@ class AbstractChangeSet(set, AbstractChange):
         self.__file_count = 0
         self.__child_count = 0
 
+        self.__spilled_files = None
+        self.__spilled_file_errors = None
+        self.__spilled_file_count = 0
+
         self.__destroyed = None
 
     def destroy(self):
@@ -1330,11 +1421,57 @@ class AbstractChangeSet(set, AbstractChange):
 
     @property
     def is_empty(self):
-        return self.child_count == 0
+        return self.child_count == 0 and not self.has_spilled_files
 
     @property
     def has_files(self):
-        return self.file_count > 0
+        return self.file_count > 0 or self.has_spilled_files
+
+    @property
+    def has_spilled_files(self):
+        return self.__spilled_file_count > 0
+
+    @property
+    def spilled_file_count(self):
+        return self.__spilled_file_count
+
+    @property
+    def spilled_files(self):
+        """
+        Returns a dict mapping change types to lists of the names of the file
+        changes that have been spilled from this directory (see _spill()).
+        """
+        return self.__spilled_files or dict()
+
+    @property
+    def spilled_file_errors(self):
+        """
+        Returns a dict mapping the names of spilled files to the errors that
+        were deferred when they were spilled (see _spill()).
+        """
+        return self.__spilled_file_errors or dict()
+
+    def _spill(self, child, errors=None):
+        """
+        Removes the file change @child from this directory, retaining only
+        its name and change type (and any @errors whose reporting has been
+        deferred until the changeset is processed).  Used by streaming
+        analysis (see ChangeSet.__spill_files()).
+        """
+        assert child.is_file
+        assert child.parent == self
+        name = intern(os.path.basename(child.path))
+        if self.__spilled_files is None:
+            self.__spilled_files = dict()
+        self.__spilled_files.setdefault(child.change_type, []).append(name)
+        if errors:
+            if self.__spilled_file_errors is None:
+                self.__spilled_file_errors = dict()
+            self.__spilled_file_errors[name] = list(errors)
+        # Bump the count before removing the child, otherwise we'd appear
+        # empty (and remove ourselves from our parent).
+        self.__spilled_file_count += 1
+        self.remove(child)
 
     @property
     def has_dirs(self):
@@ -1583,42 +1720,62 @@ class DirectoryChange(AbstractChangeSet, NodeChange):
 class FileChange(NodeChange):
     def __init__(self, **kwds):
         NodeChange.__init__(self, **kwds)
-        self.__kwds = kwds
         self.__base_checksum = None
         self.__text_checksum = None
-        self.__apply_textdelta_count = itertools.count(1)
         self.__has_text_changed = False
-
-        # Force the is_link property to be resolved up front whilst the root
-        # is still open; things get segfaulty when called after the root has
-        # closed.
-        if self.is_link:
-            pass
+        self.__is_link = None
+        self.__filesize = None
 
     @property
-    @memoize
     def is_link(self):
+        """
+        Returns True if the file is a symlink.  Subversion only has one type
+        of special file, so this is decided by the svn:special property where
+        possible.  Files without it are only considered links if their
+        contents look like one, which requires reading the file; callers
+        that need this for many files should resolve them in one go (whilst
+        the changeset's root is still open) via ChangeSet.resolve_links().
+        """
+        if self.__is_link is None:
+            with Pool(self.changeset.pool) as pool:
+                self._resolve_link(pool)
+        return self.__is_link
+
+    def _resolve_link(self, pool):
+        if self.__is_link is not None:
+            return
+
+        if self.is_remove:
+            self.__is_link = False
+        elif self.is_special:
+            self.__is_link = True
+        else:
+            self.__is_link = self.__sniff_link(pool)
+
+    def __sniff_link(self, pool):
         # The file contents of a symlink (from Subversion's perspective) will
         # be the string 'link <target path>'.
-        if self.is_remove:
-            return False
 
         # 6 = len('link a') <- shortest possible link
         if self.filesize < 6:
             return False
 
-        with Pool() as pool:
-            fs = svn.fs.file_contents(self.root, self.path, pool)
-            if not fs:
-                return False
-            stream = Stream(fs)
-            buf = stream.read(5)
-            return (buf == 'link ')
+        fs = svn.fs.file_contents(self.root, self.path, pool)
+        if not fs:
+            return False
+        stream = Stream(fs)
+        buf = stream.read(5)
+        return (buf == 'link ')
 
     @property
-    @memoize
     def filesize(self):
-        return svn.fs.file_length(self.root, self.path, self.changeset.pool)
+        if self.__filesize is None:
+            self.__filesize = svn.fs.file_length(
+                self.root,
+                self.path,
+                self.changeset.pool,
+            )
+        return self.__filesize
 
     @property
     def is_root(self):
@@ -1667,6 +1824,10 @@ class FileChange(NodeChange):
 
     @property
     def base_checksum(self):
+        if self.__base_checksum is None and self.__has_text_changed:
+            if not self.changeset.send_deltas:
+                cs = self.changeset
+                self.__base_checksum = cs._get_base_checksum(self)
         return self.__base_checksum
 
     @property
@@ -1694,7 +1855,8 @@ class FileChange(NodeChange):
         return self.__has_text_changed
 
     def _apply_textdelta(self, base_checksum):
-        assert self.__apply_textdelta_count.next() == 1
+        # Protect against _apply_textdelta() being called multiple times.
+        assert not self.__has_text_changed
         self.__base_checksum = base_checksum
         self.__has_text_changed = True
         if not self.is_change:
@@ -1723,6 +1885,11 @@ class ChangeSet(AbstractChangeSet):
 
         self.__roots = dict()
 
+        if options.get('proplist_cache') is not None:
+            self.__proplists = options.proplist_cache
+        else:
+            self.__proplists = ProplistCache()
+
         self.__fs = None
         self.__root = None
         self.__revprops = None
@@ -1776,12 +1943,10 @@ class ChangeSet(AbstractChangeSet):
 
         self.__pool = None
 
-        self._tracker = None
-        self._track_resource_usage = options.track_resource_usage
-        if self._track_resource_usage:
-            self._tracker = ResourceUsageTracker(self.__class__.__name__)
-        else:
-            self._tracker = DummyResourceUsageTracker()
+        # Callers that want this changeset's phases recorded as part of a
+        # larger tree (i.e. RepositoryRevOrTxn.changeset) replace this with
+        # their own tracker prior to calling load().
+        self.tracker = PhaseTracker('r%s' % str(rev_or_txn))
 
         self._delete_entry_called = 0
         self._raw_deletes = list()
@@ -1807,6 +1972,29 @@ class ChangeSet(AbstractChangeSet):
 
         self.files_over_max_size = []
 
+        # By default, we ask svn.repos.replay2() for the tree structure only;
+        # text deltas are replaced with a dummy delta (apply_textdelta() is
+        # still called for every file whose text changed), and property
+        # changes are replaced with a single dummy change per node, which we
+        # expand into the actual changes ourselves (see _expand_propchanges()).
+        # This saves libsvn computing (and us receiving) deltas for every
+        # modified file, which we'd otherwise throw away.
+        self.send_deltas = bool(options.send_deltas)
+
+        # Streaming analysis: plain file creates and modifies are spilled
+        # from the tree as their directory is closed, such that memory use
+        # scales with directories rather than files (see __spill_files()).
+        # If set, spilled_file_check is called with each file create before
+        # it's spilled, and returns any errors to defer.
+        self.spill_files = bool(options.spill_files)
+        self.spilled_file_check = None
+        self.__spilled_file_count = 0
+
+        # If set, a ReplayCache that load() drives us from for revisions it
+        # has already seen, instead of calling svn.repos.replay2(), and that
+        # records the replay2() callbacks for revisions it hasn't.
+        self.replay_cache = options.get('replay_cache') or None
+
     @property
     def is_tag_create(self):
         return self.top.is_tag_create
@@ -1834,65 +2022,20 @@ class ChangeSet(AbstractChangeSet):
 
     def destroy(self):
         """
-        Destroy a ChangeSet object, releasing all acquired resources.
+        Destroy a ChangeSet object, releasing all acquired resources (most
+        notably the pool, and with it, the fs and all roots) immediately.
 
-        This method needs to be called before a ChangeSet object can be
-        garbage collected.
+        Changes only refer back to their parent and changeset weakly, so
+        this no longer needs to be called in order for a ChangeSet and its
+        changes to be freed; it just releases Subversion resources at a
+        deterministic point, and detaches any changes callers still hold.
         """
-        # XXX TODO: this entire method is just horrid.  Basically, the initial
-        # implementation of the ChangeSet class and various Change* subclasses
-        # (AbstractChange, FileChange, DirectoryChange, etc) were rife with
-        # circular links, because all child objects linked backed to their
-        # parents (i.e. via self.parent).  (And by "initial implementation", I
-        # mean "initial and still current implementation".)
-        #
-        # This prevented a ChangeSet and all its child objects from being
-        # garbage collected.  Upon realizing the error of my ways, much
-        # hacking was done to break the circular references so that objects
-        # could be collected properly.
-        #
-        # This particular method is the biggest, ugliest artefact from that
-        # hacking work.  It is almost certainly overkill (del'ing objects,
-        # then setting them to None... say wha'?), but eh, in its current
-        # form, warts and all, it works.  Call changeset.destroy(), and gc
-        # will be able to clean up the object and all the children correctly.
-        #
-        # But, yeah, this whole approach should definitely get cleaned up when
-        # ChangeSet and friends go in for their next refactoring service.
-
         assert not self.__destroyed
         self.__destroyed = True
 
-        del self._nada
-        del self._copy
-        del self._create
-        del self._modify
-        del self._remove
-        del self._replace
-        del self._copied_from
-        del self._renamed_from
-
-        del self._raw_deletes
-        del self._indirect_copy_then_modify
-        del self._removes_that_might_be_renames
-
-        del self.__all_propchanges
-        del self.__all_propreplacements
-        del self.__mergeinfo_propchanges
-
-        del self.__notes
-        del self.__errors
-        del self.__warnings
-
-        del self.__roots
-        del self.__revprops
-
-        del self.__fs
-        del self.__ptr
-        del self.__repo
-        del self.__root
-        del self.__baton
-        del self.__base_root
+        for c in self._all_changes.values():
+            c.unparent()
+            c.destroy()
 
         self._nada = None
         self._copy = None
@@ -1903,6 +2046,7 @@ class ChangeSet(AbstractChangeSet):
         self._replace = None
         self._copied_from = None
         self._renamed_from = None
+        self._all_changes = None
 
         self.__all_propchanges = None
         self.__all_propreplacements = None
@@ -1917,25 +2061,19 @@ class ChangeSet(AbstractChangeSet):
         self.__warnings = None
 
         self.__roots = None
+        self.__proplists = None
 
         self.__fs = None
+        self.__ptr = None
         self.__repo = None
         self.__root = None
+        self.__baton = None
         self.__revprops = None
         self.__base_root = None
 
-        del self._tracker
-        self._tracker = None
-
-        for (k, c) in self._all_changes.items():
-            c.unparent()
-            c.destroy()
-            del c
-
-        for k in self._all_changes.keys():
-            del self._all_changes[k]
-        del self._all_changes
-        self._all_changes = None
+        self.tracker = None
+        self.spilled_file_check = None
+        self.replay_cache = None
 
         if self.__pool is not None:
             self.__pool.destroy()
@@ -1979,7 +2117,7 @@ class ChangeSet(AbstractChangeSet):
         return id(self)
 
     def _track(self, msg):
-        return self._tracker.track(msg)
+        return self.tracker.track(msg)
 
     @property
     def id(self):
@@ -2025,18 +2163,39 @@ class ChangeSet(AbstractChangeSet):
 
         self.root_details = AbsoluteRootDetails
 
-        (self.__ptr, self.__baton) = svn.delta.make_editor(self, self.pool)
-
-        svn.repos.replay2(
-            self.root,              # root
-            '',                     # base_dir
-            SVN_INVALID_REVNUM,     # low_water_mark
-            True,                   # send_deltas
-            self.__ptr,             # editor
-            self.__baton,           # edit_baton
-            None,                   # authz_read_func
-            self.pool,              # pool
-        )
+        cache = self.replay_cache if self.is_rev else None
+        if cache is not None:
+            events = cache.load(self.rev, self.send_deltas)
+            if events is not None:
+                with self._track('replay_cache'):
+                    replay(events, self, self.pool)
+                return
+
+        editor = self
+        if cache is not None:
+            editor = ReplayRecorder(self)
+
+        (self.__ptr, self.__baton) = svn.delta.make_editor(editor, self.pool)
+
+        with self._track('replay2'):
+            svn.repos.replay2(
+                self.root,              # root
+                '',                     # base_dir
+                SVN_INVALID_REVNUM,     # low_water_mark
+                self.send_deltas,       # send_deltas
+                self.__ptr,             # editor
+                self.__baton,           # edit_baton
+                None,                   # authz_read_func
+                self.pool,              # pool
+            )
+
+        # The editor and its baton refer back to us; drop them now that the
+        # replay has finished so that we don't keep ourselves alive.
+        self.__ptr = None
+        self.__baton = None
+
+        if cache is not None:
+            cache.save(self.rev, self.send_deltas, editor.events)
 
     @property
     def log_msg(self):
@@ -2083,7 +2242,8 @@ class ChangeSet(AbstractChangeSet):
             p = '/'
         else:
             (c, m) = args
-            p = c.path
+            # Spilled files (see __spill_files()) are reported by path.
+            p = c if isinstance(c, basestring) else c.path
         t.setdefault(p, []).append(m)
         return (p, m)
 
@@ -2333,6 +2493,18 @@ class ChangeSet(AbstractChangeSet):
     def is_changeset(self):
         return True
 
+    def resolve_links(self, changes):
+        """
+        Resolves the is_link property of each file change in @changes in a
+        single pass (and pool), reading file contents only for files whose
+        svn:special property doesn't settle the matter.  Must be called
+        whilst the root is still open (i.e. before destroy()).
+        """
+        with Pool(self.pool) as pool:
+            for change in changes:
+                assert change.is_file
+                change._resolve_link(pool)
+
     def _get_proplist(self, path, rev=None):
         """
         Returns a dict() of properties, where keys represent property names
@@ -2340,8 +2512,22 @@ class ChangeSet(AbstractChangeSet):
         node's proplist in the current root (which is either a rev or a txn)
         is used.
         """
-        root = self.root if rev is None else self._get_root(rev)
-        return svn.fs.node_proplist(root, path, self.pool)
+        if rev is None:
+            return svn.fs.node_proplist(self.root, path, self.pool)
+
+        # Proplists of committed revisions never change, so they can be
+        # cached (and shared between changesets, see ProplistCache).
+        key = (rev, path)
+        proplists = self.__proplists
+        try:
+            return proplists[key]
+        except KeyError:
+            pass
+
+        root = self._get_root(rev)
+        proplist = svn.fs.node_proplist(root, path, self.pool)
+        proplists[key] = proplist
+        return proplist
 
     def _get_root(self, rev):
         if rev not in self.__roots:
@@ -2395,7 +2581,6 @@ class ChangeSet(AbstractChangeSet):
         k.change_type = ChangeType.Remove
         k.removed_from_path = self._format_path(base_path, is_dir=is_dir)
         k.removed_from_rev  = base_rev
-        k.removed_from_proplist = self._get_proplist(base_path, base_rev)
 
         self.__register(cls(**k))
 
@@ -2473,19 +2658,82 @@ class ChangeSet(AbstractChangeSet):
             k.change_type = ChangeType.Copy
             k.copied_from_path = copied_from_path
             k.copied_from_rev  = copied_from_rev
-            k.copied_from_proplist = self._get_proplist(
-                copied_from_path,
-                copied_from_rev
-            )
 
         k.changeset = self
         return self.__register(cls(**k))
 
     def change_dir_prop(self, change, name, value, pool):
-        change._change_prop(name, value)
+        self.__change_prop(change, name, value)
 
     def change_file_prop(self, change, name, value, pool):
-        change._change_prop(name, value)
+        self.__change_prop(change, name, value)
+
+    def __change_prop(self, change, name, value):
+        if not self.send_deltas and name == '' and value is None:
+            self._expand_propchanges(change)
+        else:
+            change._change_prop(name, value)
+
+    def _get_replay_source(self, change):
+        """
+        Returns a (path, rev) tuple identifying the node svn.repos.replay2()
+        compares @change against when sending deltas, or None if @change is
+        a brand new node.  For nodes opened beneath a copied directory, this
+        is the corresponding node beneath the copy's source.
+        """
+        if change.is_changeset:
+            return ('/', self.base_rev)
+        elif change.is_create:
+            return None
+        elif change.is_copy:
+            return (change.copied_from_path, change.copied_from_rev)
+
+        parent = change.parent
+        while not parent.is_changeset:
+            if parent.is_copy:
+                path = change.path.rstrip('/')
+                k = self._find_first_parent_copy(path, change.parent)
+                base_path = self._format_path(k.base_path, change.is_dir)
+                return (base_path, k.base_rev)
+            parent = parent.parent
+
+        return (change.path, self.base_rev)
+
+    def _expand_propchanges(self, change):
+        """
+        Called when a metadata-only replay signals that @change has property
+        modifications; works out what they are by comparing @change's
+        properties against those of its replay source, exactly like
+        svn.repos.replay2() does when sending deltas.
+        """
+        new = change.proplist
+        if change.is_copy:
+            old = change.copied_from_proplist
+        else:
+            source = self._get_replay_source(change)
+            old = self._get_proplist(*source) if source else dict()
+
+        for (name, value) in new.items():
+            if old.get(name) != value:
+                change._change_prop(name, value)
+
+        for name in old:
+            if name not in new:
+                change._change_prop(name, None)
+
+    def _get_base_checksum(self, change):
+        """
+        Returns the hex MD5 checksum of @change's replay source, which is
+        what apply_textdelta() receives as its base checksum when deltas are
+        being sent.
+        """
+        source = self._get_replay_source(change)
+        if not source:
+            return None
+        (path, rev) = source
+        root = self._get_root(rev)
+        digest = svn.fs.file_md5_checksum(root, path, self.pool)
+        return binascii.hexlify(digest) if digest else None
 
     def open_directory(self, path, parent, base_rev, dir_pool):
         assert base_rev == -1
@@ -2513,7 +2761,10 @@ class ChangeSet(AbstractChangeSet):
         return change._apply_textdelta(base_checksum)
 
     def __removes_for_path(self, path):
-        return [ r for r in self._remove.values() if path == r.path ]
+        # _remove is keyed by path (see __register()), so there's at most one
+        # remove for any given path.
+        remove = self._remove.get(path)
+        return [ remove ] if remove is not None else []
 
     @property
     def __copies_that_are_possibly_renames(self):
@@ -2774,6 +3025,66 @@ class ChangeSet(AbstractChangeSet):
 
     def close_directory(self, change):
         change._close()
+        if self.spill_files and not change.is_changeset:
+            self.__spill_files(change)
+
+    def __is_within_copy(self, change):
+        while not change.is_changeset:
+            if change.is_copy:
+                return True
+            change = change.parent
+        return False
+
+    def __can_spill(self, change):
+        if change.is_replace or change.path in self._remove:
+            return False
+        props = change._changed_props
+        if change.is_create:
+            return SVN_PROP_MERGEINFO not in props
+        elif change.is_modify:
+            return change.has_text_changed and not props
+        else:
+            return False
+
+    def __spill_files(self, directory):
+        """
+        Spills the file changes of @directory that analysis doesn't need to
+        keep around, retaining only their names (see AbstractChangeSet's
+        _spill()).  Called as each directory is closed, at which point all
+        of its children have been replayed (including removes, so any
+        replacements are known).
+
+        Only creates (without svn:mergeinfo) and text-only modifies that
+        aren't within a copy are spilled; they're unaffected by rename and
+        replacement detection, and the only checks RepositoryRevOrTxn needs
+        to perform on them are tag modifications (which only depend on the
+        directory) and blocked files (see spilled_file_check).  Everything
+        else, including all directories, is retained as usual.
+        """
+        if not directory.file_count or self.__is_within_copy(directory):
+            return
+
+        check = self.spilled_file_check
+        for change in list(directory.files):
+            if not self.__can_spill(change):
+                continue
+
+            errors = None
+            if change.is_create:
+                store = self._create
+                if check:
+                    errors = check(change)
+            else:
+                store = self._modify
+
+            del store[change.path]
+            del self._all_changes[change.path]
+            directory._spill(change, errors)
+            self.__spilled_file_count += 1
+
+    @property
+    def spilled_file_count(self):
+        return self.__spilled_file_count
 
     def close_file(self, change, text_checksum):
         change._close(text_checksum)
@@ -2808,7 +3119,7 @@ class ChangeSet(AbstractChangeSet):
         assert self.__analysis is None
         self.__analysis_start_time = time.time()
         k = Dict()
-        k.change_count = len(self._all_changes)
+        k.change_count = len(self._all_changes) + self.__spilled_file_count
         k.notes = self.notes
         k.errors = self.errors
         k.warnings = self.warnings
@@ -2835,6 +3146,7 @@ class ChangeSet(AbstractChangeSet):
 
         self.__analysis_end_time = time.time()
         k.analysis_time = self.analysis_time
+        k.tracker = self.tracker
         self.__analysis = ChangeSetAnalysis(**k)
 
     @property
@@ -2852,7 +3164,8 @@ class ChangeSet(AbstractChangeSet):
                 load_time='0.000s',
                 analysis_time='0.000s',
                 commit_root=None,
-                user=self.revprops.get(SVN_PROP_REVISION_AUTHOR, '<noauthor>')
+                user=self.revprops.get(SVN_PROP_REVISION_AUTHOR, '<noauthor>'),
+                tracker=self.tracker,
             )
         assert self.__analysis is not None
         return self.__analysis
@@ -2875,8 +3188,19 @@ class ChangeSetAnalysis(object):
         else:
             self.action_type = k.action_type
         self.user = k.user
+        self.tracker = k.get('tracker')
         k.assert_empty(self)
 
+    @property
+    def phases(self):
+        """
+        Returns the top-level phases recorded while the changeset was loaded
+        (and analysed) as an ordered dict of name -> perfmon.Phase, or None
+        if they weren't tracked.
+        """
+        if self.tracker:
+            return self.tracker.phases
+
     @property
     def one_liner(self):
         return self.__get_one_liner()
@@ -377,7 +377,13 @@ class CommandLine:
             if f and not os.path.exists(f):
                 self.usage_error("configuration file '%s' does not exist" % f)
 
-        self.conf.load(filename=f)
+        # Knowing the repo up front lets the configuration be loaded from its
+        # compiled snapshot, if it's still current, rather than parsed.
+        repo_path = None
+        if self._repo_ and self.args:
+            repo_path = os.path.abspath(self.args[0])
+
+        self.conf.load(filename=f, repo_path=repo_path)
         self.command.conf = self.conf
 
         if self._repo_:
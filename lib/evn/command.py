@@ -193,7 +193,10 @@ class RepositoryCommand(SubversionCommand):
         self.conf.load_repo(self.path)
         self.hook_names = self.conf.hook_names
 
-        self.repo       = svn.repos.open(self.path, self.pool)
+        # The repo may have already been opened on our behalf (i.e. by the
+        # hook server, which keeps a warm handle around between hooks).
+        if self.repo is None:
+            self.repo   = svn.repos.open(self.path, self.pool)
         self.fs         = svn.repos.fs(self.repo)
         self.hook_dir   = svn.repos.hook_dir(self.repo, self.pool)
 
@@ -4,8 +4,8 @@
 import os
 import re
 import sys
-import copy
 import stat
+import marshal
 
 from os.path import (
     isdir,
@@ -29,6 +29,7 @@ from evn.util import (
     try_int,
     memoize,
     load_class,
+    try_remove_file,
     file_exists_and_not_empty,
     first_writable_file_that_preferably_exists,
 )
@@ -43,6 +44,10 @@ from evn.path import (
 #===============================================================================
 CONFIG = None
 
+# Bumped whenever the layout of the compiled configuration snapshot (see
+# Config.snapshot_filename) changes.
+CONFIG_SNAPSHOT_VERSION = 1
+
 #===============================================================================
 # Exceptions
 #===============================================================================
@@ -89,6 +94,7 @@ class Config(RawConfigParser):
     def __init__(self):
         RawConfigParser.__init__(self)
         self.__repo_path = None
+        self.__snapshot_key = None
         self._repo_name = None
         self._repo_admins = None
         self._admins = None
@@ -97,9 +103,11 @@ class Config(RawConfigParser):
         f = join_path(d, 'admin', 'cli.py')
         self.__python_evn_module_dir = d
         self.__python_evn_admin_cli_file_fullpath = f
+        self.__python_evn_hook_client_file_fullpath = (
+            join_path(d, 'hookclient.py')
+        )
 
         self.__load_defaults()
-        self._default_sections_copy = copy.deepcopy(self._sections)
         self.__multiline_pattern = re.compile(r'([^\s].*?)([\s]+\\)?')
         self.__validate()
 
@@ -111,6 +119,10 @@ class Config(RawConfigParser):
     def python_evn_admin_cli_file_fullpath(self):
         return self.__python_evn_admin_cli_file_fullpath
 
+    @property
+    def python_evn_hook_client_file_fullpath(self):
+        return self.__python_evn_hook_client_file_fullpath
+
     @property
     def repo_name(self):
         return self._repo_name
@@ -196,12 +208,101 @@ class Config(RawConfigParser):
 
         return first_writable_file_that_preferably_exists(files)
 
+    @property
+    def snapshot_filename(self):
+        """
+        The compiled configuration snapshot: the resolved configuration (i.e.
+        the defaults, plus every configuration file that applies to the repo)
+        as of the last time any of those files were read, saving subsequent
+        invocations (i.e. each hook) from having to parse them again.
+        """
+        if not self.repo_path:
+            raise RepositoryNotSet()
+        return join_path(self.repo_path, 'conf/evn.conf.snapshot')
+
+    def _snapshot_key(self):
+        """
+        Returns a tuple of (path, (inode, size, mtime)) tuples (the latter
+        being None if the file doesn't exist) for every file that contributes
+        to the configuration, including this module (which provides the
+        defaults).  A snapshot is only used if its key matches.
+        """
+        files = [ abspath(__file__) ]
+        files += self.possible_conf_filenames
+        files += self.possible_repo_conf_filenames
+        key = list()
+        for f in files:
+            try:
+                st = os.stat(f)
+            except OSError:
+                key.append((f, None))
+            else:
+                key.append((f, (st.st_ino, st.st_size, st.st_mtime)))
+        return tuple(key)
+
+    def _load_snapshot(self, key):
+        if key == self.__snapshot_key:
+            # Nothing has changed since we last loaded (or saved) one.
+            return True
+
+        try:
+            with open(self.snapshot_filename, 'rb') as f:
+                data = marshal.loads(f.read())
+            (version, snapshot_key, defaults, sections) = data
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            return False
+
+        if version != CONFIG_SNAPSHOT_VERSION or snapshot_key != key:
+            return False
+
+        self._defaults = self._dict(defaults)
+        self._sections = self._dict(
+            (name, self._dict(options)) for (name, options) in sections
+        )
+        self.__validate()
+        self.__snapshot_key = key
+        return True
+
+    def _save_snapshot(self, key):
+        """
+        Writes our current configuration to the snapshot file, keyed by
+        @key, which must have been obtained (via _snapshot_key()) before
+        any of the files were read.  Failures are ignored (i.e. if hooks are
+        run as a user that can't write to the repo's conf directory); the
+        files will just be read again next time.
+        """
+        self.__snapshot_key = key
+        sections = [
+            (name, options.items())
+                for (name, options) in self._sections.items()
+        ]
+        data = (CONFIG_SNAPSHOT_VERSION, key, self._defaults.items(), sections)
+
+        path = self.snapshot_filename
+        if not isdir(dirname(path)):
+            return
+
+        tmp = '%s.%d' % (path, os.getpid())
+        try:
+            with open(tmp, 'wb') as f:
+                f.write(marshal.dumps(data))
+            os.rename(tmp, path)
+        except (IOError, OSError):
+            try_remove_file(tmp)
+
     def load(self, filename=None, repo_path=None):
         self.__filename = filename
+        key = None
+        if repo_path:
+            self.__set_repo_path(repo_path)
+            key = self._snapshot_key()
+            if self._load_snapshot(key):
+                return
+
         self.read(self.actual_conf_filenames)
         self.__validate()
         if repo_path:
-            self.load_repo(repo_path)
+            self.__read_repo_conf_files(key)
 
     @property
     def modifications(self):
@@ -210,7 +311,7 @@ class Config(RawConfigParser):
         been modified from their default value.
         """
         current = self._sections
-        default = self._default_sections_copy
+        default = Config()._sections
         modified = {}
         for (section, options) in current.items():
             if section not in default:
@@ -283,15 +384,34 @@ class Config(RawConfigParser):
     def __validate(self):
         dummy = self.unix_hook_permissions
 
-    def load_repo(self, repo_path):
+    def __set_repo_path(self, repo_path):
         self.__repo_path = repo_path
         self._repo_name = os.path.basename(repo_path)
 
         assert self.repo_path
         assert self.repo_name
 
+    def load_repo(self, repo_path):
+        self.__set_repo_path(repo_path)
+        key = self._snapshot_key()
+        if self._load_snapshot(key):
+            return
+
+        if self.__snapshot_key is not None:
+            # Our configuration came from files that have since changed (i.e.
+            # we're the long-lived `evnadmin serve-hooks` process), so start
+            # again from the defaults rather than layering over it.
+            defaults = Config()
+            self._defaults = defaults._defaults
+            self._sections = defaults._sections
+            self.read(self.actual_conf_filenames)
+
+        self.__read_repo_conf_files(key)
+
+    def __read_repo_conf_files(self, key):
         self.read(self.actual_repo_conf_filenames)
         self.__validate()
+        self._save_snapshot(key)
 
     def get_multiline_to_single_line(self, section, name):
         return (
@@ -356,6 +476,18 @@ class Config(RawConfigParser):
         self.set('main', 'standard-layout', 'branches,tags,trunk')
         self.set('main', 'no-svnmucc-after-evnadmin-create', '')
         self.set('main', 'selftest-base-dir', '~/tmp/evn-test')
+        self.set('main', 'hook-server-enabled', '0')
+        self.set('main', 'hook-server-socket-filename', 'evn/hooks.sock')
+        self.set('main', 'persist-pre-commit-analysis', '1')
+        self.set('main', 'async-post-commit', '0')
+        self.set('main', 'roots-checkpoint-interval', '100')
+        self.set('main', 'replay-text-deltas', '0')
+        self.set('main', 'proplist-cache-size', '10000')
+        self.set('main', 'streaming-analysis', '0')
+        self.set('main', 'replay-cache', '0')
+        self.set('main', 'analyze-progress-interval', '60')
+        self.set('main', 'revprop-cache-size', '256')
+        self.set('main', 'rootmatcher-cache-size', '64')
 
         self.set(
             'main',
@@ -432,6 +564,11 @@ class Config(RawConfigParser):
             'unix-evn-run-hook-code',
             '"{0}" "{1}" run-hook $*',
         )
+        self.set(
+            'main',
+            'unix-evn-run-hook-client-code',
+            '"{0}" "{1}" "{2}" "{0}" "{3}" $*',
+        )
         self.set(
             'main',
             'unix-svn-hook-syntax-for-invoking-evn-hook',
@@ -555,6 +692,142 @@ class Config(RawConfigParser):
             'main', self._p('%s-evn-run-hook-code'),
         ).format(self.python, self.python_evn_admin_cli_file_fullpath)
 
+    @property
+    def evn_run_hook_client_code(self):
+        return self.get('main', 'unix-evn-run-hook-client-code').format(
+            self.python,
+            self.python_evn_hook_client_file_fullpath,
+            self.hook_server_socket_path,
+            self.python_evn_admin_cli_file_fullpath,
+        )
+
+    @property
+    def hook_server_enabled(self):
+        return bool(try_int(self.get('main', 'hook-server-enabled')))
+
+    @property
+    def persist_pre_commit_analysis(self):
+        val = self.get('main', 'persist-pre-commit-analysis')
+        return bool(try_int(val))
+
+    @property
+    def async_post_commit(self):
+        """
+        If set, post-commit hooks merely enqueue the revision in the repo's
+        post-commit spool (evn/spool), which is drained in revision order by
+        `evnadmin drain-post-commit-spool` (started on demand if it's not
+        already running).  Not supported on Windows.
+        """
+        if os.name == 'nt':
+            return False
+        return bool(try_int(self.get('main', 'async-post-commit')))
+
+    @property
+    def roots_checkpoint_interval(self):
+        """
+        When evn:roots are stored as per-revision deltas (revision property
+        schema version 2), a full copy of the roots (paths and creation
+        revisions only) is also stored every this many revisions, bounding
+        the number of revisions that need to be read in order to rebuild the
+        roots for any given revision.
+        """
+        return max(try_int(self.get('main', 'roots-checkpoint-interval')), 1)
+
+    @property
+    def replay_text_deltas(self):
+        """
+        If set, changesets are loaded with full text deltas for every
+        modified file (and full property deltas), rather than with the tree
+        structure and dummy deltas only.  Analysis doesn't need the deltas,
+        so this is only useful for debugging.
+        """
+        return bool(try_int(self.get('main', 'replay-text-deltas')))
+
+    @property
+    def max_revlock_waits(self):
+        """
+        The maximum number of seconds a hook will wait for the post-commit
+        of its base revision to create that revision's lock file, before
+        giving up and reporting the repository as being out of sync.
+        """
+        return try_int(self.get('main', 'max-revlock-waits')) or 0
+
+    @property
+    def proplist_cache_size(self):
+        """
+        The maximum number of node proplists (of copy and remove sources)
+        cached whilst analyzing consecutive revisions (i.e. `evnadmin
+        analyze`).  The cache is emptied whenever it fills up.
+        """
+        return max(try_int(self.get('main', 'proplist-cache-size')), 1)
+
+    @property
+    def revprop_cache_size(self):
+        """
+        The maximum number of revisions whose decoded revision properties
+        are cached (per process) by RepositoryRevisionConfig, saving repeat
+        rconf() calls for the same revision (and `evnadmin analyze`, which
+        keeps re-reading the same base revisions) from decoding them again.
+        The cache is emptied whenever it fills up.  Set to 0 to disable.
+        """
+        return try_int(self.get('main', 'revprop-cache-size')) or 0
+
+    @property
+    def rootmatcher_cache_size(self):
+        """
+        The maximum number of historical root matchers (snapshots of the
+        roots present at a revision, needed when processing copies from that
+        revision) kept whilst processing a revision, or, during `evnadmin
+        analyze`, consecutive revisions.  The least recently used matcher is
+        evicted once it's full.
+        """
+        return max(try_int(self.get('main', 'rootmatcher-cache-size')), 1)
+
+    @property
+    def analyze_progress_interval(self):
+        """
+        How often (in seconds) `evnadmin analyze` writes a progress record
+        (throughput, ETA, time per phase, RSS and the largest revisions seen)
+        to evn/logs/analyze.log, and summarises it on stderr.
+        """
+        return max(try_int(self.get('main', 'analyze-progress-interval')), 1)
+
+    @property
+    def streaming_analysis(self):
+        """
+        If set, file creates and modifies that don't require any further
+        analysis (i.e. those outside of copies and replacements, without
+        svn:mergeinfo changes) are checked and then dropped from the
+        changeset as each directory's replay finishes, keeping only their
+        names.  This bounds memory use by the number of directories in a
+        commit rather than the number of files, which matters for initial
+        imports and vendor drops of millions of files.
+        """
+        return bool(try_int(self.get('main', 'streaming-analysis')))
+
+    @property
+    def replay_cache(self):
+        """
+        If set, the editor callbacks made when each revision is first
+        replayed are recorded in evn/db/replay.db, and subsequent loads of
+        that revision's changeset (i.e. re-analysing it) are driven from the
+        recording instead of svn.repos.replay2().  See `evnadmin
+        show-replay-cache` and `evnadmin purge-replay-cache`.
+        """
+        return bool(try_int(self.get('main', 'replay-cache')))
+
+    @property
+    def hook_server_socket_path(self):
+        """
+        The unix socket `evnadmin serve-hooks` listens on (and the evn hook
+        script connects to) for the current repository.  Relative paths are
+        resolved against the repository's path.
+        """
+        if not self.repo_path:
+            raise RepositoryNotSet()
+        path = expanduser(self.get('main', 'hook-server-socket-filename'))
+        return join_path(self.repo_path, path)
+
     @property
     def svn_hook_syntax_for_invoking_evn_hook(self):
         return self.get(
@@ -138,6 +138,8 @@ class _Errors(Constant):
     StandardLayoutTopLevelDirectoryCreatedInMultiComponentRepo = "standard layout top-level directories must be created within a component as this is a multi-component repository (i.e. try mkdir /foo/trunk instead of mkdir /trunk)"
     BlockedFileExtension = "blocked file extension"
     RepoNotReadonly = "repo is not set readonly (see `evnadmin set-repo-readonly`)"
+    UnknownRpropsSchemaVersion = "unknown revision property schema version: %s (known versions: %s)"
+    UnknownBrpropsSchemaVersion = "unknown base revision property schema version: %s (known versions: %s)"
 
 e = _Errors()
 
@@ -152,18 +154,48 @@ EVN_RPROPS_SCHEMA = {
         'errors'    : str,
         'warnings'  : str,
     },
+    # Version 2 presents the same properties as version 1, but evn:roots is
+    # stored as per-revision deltas (evn:roots_delta) with periodic full
+    # copies (evn:roots_checkpoint); see RepositoryRevisionConfig.
+    2 : {
+        'roots'     : dict,
+        'notes'     : str,
+        'errors'    : str,
+        'warnings'  : str,
+    },
+    # Version 3 is version 2 with dict and list values written in compact
+    # form (see evn.util.encode_compact_propval()).
+    3 : {
+        'roots'     : dict,
+        'notes'     : str,
+        'errors'    : str,
+        'warnings'  : str,
+    },
 }
 assert EVN_RPROPS_SCHEMA_VERSION in EVN_RPROPS_SCHEMA
 
+# Revision property schema versions that store evn:roots as deltas, and that
+# write values in compact form, respectively.
+EVN_RPROPS_DELTA_ROOTS_VERSIONS = (2, 3)
+EVN_RPROPS_COMPACT_VERSIONS = (3,)
+
 EVN_BRPROPS_SCHEMA_VERSION = 1
 EVN_BRPROPS_SCHEMA = {
     1 : {
         'last_rev' : int,
         'version'  : int,
     },
+    # Version 2 is version 1 with dict and list values (i.e. root_hints and
+    # root_ancestor_actions) written in compact form.
+    2 : {
+        'last_rev' : int,
+        'version'  : int,
+    },
 }
 assert EVN_BRPROPS_SCHEMA_VERSION in EVN_BRPROPS_SCHEMA
 
+EVN_BRPROPS_COMPACT_VERSIONS = (2,)
+
 EVN_ERROR_CONFIRMATIONS = {
     e.RenameAffectsMultipleRoots : 'CONFIRM MULTI-ROOT RENAME',
 }
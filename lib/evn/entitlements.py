@@ -0,0 +1,86 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import os
+import marshal
+
+from evn.path import (
+    join_path,
+)
+
+from evn.util import (
+    try_remove_file,
+)
+
+#===============================================================================
+# Globals
+#===============================================================================
+# Bumped whenever the layout of the cache file changes.
+ENTITLEMENTS_CACHE_VERSION = 1
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def entitlements_cache_path(repo_path):
+    return join_path(repo_path, 'evn', 'db', 'entitlements.cache')
+
+#===============================================================================
+# Classes
+#===============================================================================
+class EntitlementsCache(object):
+    """
+    A cache (evn/db/entitlements.cache) of the parsed form of a repository's
+    entitlements file (see RepositoryRevOrTxn._init_authz_conf()): the set
+    of users with write access to it (admins) and its groups.
+
+    The file is versioned within the repository itself, so rather than its
+    contents, the cache is keyed by the file's path and the revision its
+    node was created in (i.e. svn.fs.node_created_rev()), which only changes
+    when the file does.  Only the most recently parsed version is kept.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def load(self, filename, created_rev):
+        """
+        Returns an (admins, groups) tuple if the cache holds the entitlements
+        file @filename as of @created_rev, otherwise None.
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                data = marshal.loads(f.read())
+            (version, key, admins, groups) = data
+        except (IOError, OSError, EOFError, ValueError, TypeError):
+            return
+
+        if version != ENTITLEMENTS_CACHE_VERSION:
+            return
+        if key != (filename, created_rev):
+            return
+        return (admins, groups)
+
+    def save(self, filename, created_rev, admins, groups):
+        """
+        Replaces the cache's contents with the @admins (a set of user names)
+        and @groups (a dict mapping group names to frozensets of user names)
+        parsed from @filename as of @created_rev.  Failures are ignored; the
+        file will simply be parsed again next time.
+        """
+        key = (filename, created_rev)
+        data = (ENTITLEMENTS_CACHE_VERSION, key, set(admins), dict(groups))
+
+        tmp = '%s.%d' % (self.path, os.getpid())
+        try:
+            dirname = os.path.dirname(self.path)
+            if not os.path.isdir(dirname):
+                os.makedirs(dirname)
+            with open(tmp, 'wb') as f:
+                f.write(marshal.dumps(data))
+            os.rename(tmp, self.path)
+        except (IOError, OSError):
+            try_remove_file(tmp)
+
+    def clear(self):
+        try_remove_file(self.path)
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
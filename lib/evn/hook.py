@@ -5,6 +5,10 @@ import os
 import datetime
 import cStringIO as StringIO
 
+from subprocess import (
+    Popen,
+)
+
 import svn
 import svn.repos
 
@@ -30,6 +34,10 @@ from evn.repo import (
     RepositoryRevOrTxn,
 )
 
+from evn.spool import (
+    PostCommitSpool,
+)
+
 from evn.util import (
     add_linesep_if_missing,
     implicit_context,
@@ -64,12 +72,31 @@ class RepositoryHook(RepositoryRevOrTxn):
         self.hook_type  = None
         self.rdb        = None # Remote Debugger
 
+        # Set by `evnadmin drain-post-commit-spool` when running post-commit
+        # hooks that were previously enqueued (see spool_post_commit()).
+        self.from_spool = False
+
         self.custom_hook = self.conf.custom_hook_class()
 
     @property
     def is_repository_hook(self):
         return True
 
+    @property
+    def records_txn_analysis(self):
+        if not self.conf.persist_pre_commit_analysis:
+            return False
+
+        # Root hints and exclusions are only honoured when processing revs,
+        # so the txn analysis won't match what post-commit would do if any
+        # apply to the revision this txn will become.
+        if self.root_exclusions:
+            return False
+        if self.root_hints.get(self.base_rev + 1):
+            return False
+
+        return True
+
     @implicit_context
     def run_hook(self, hook_name, hook_args):
         self.hook_name = hook_name.replace('-', '_')
@@ -150,15 +177,61 @@ class RepositoryHook(RepositoryRevOrTxn):
         pass
 
     def post_commit(self, rev, *args):
-        # XXX TODO: add support for txn_name if it's present.
+        if self.conf.async_post_commit and not self.from_spool:
+            self.spool_post_commit(rev, *args)
+            return
 
-        # The only thing we *have* to do during post-commit is to access the
-        # changeset property (which automatically creates, analyses and then
-        # post-processes it behind the scenes).
         self.process_rev_or_txn(rev)
-        cs = self.changeset
+
+        # Subversion 1.8+ passes the name of the txn that became this rev as
+        # the third argument, which lets us pick up the analysis persisted by
+        # the pre-commit hook (see save_txn_analysis()) instead of replaying
+        # the entire revision again.
+        applied = False
+        if args and args[0]:
+            applied = self.apply_txn_analysis(args[0])
+
+        if not applied:
+            # The only thing we *have* to do during post-commit is to access
+            # the changeset property (which automatically creates, analyses
+            # and then post-processes it behind the scenes).
+            cs = self.changeset
+
         self.custom_hook.post_commit(self)
 
+    def spool_post_commit(self, rev, *args):
+        # Enqueue the revision, then make sure there's a worker around to
+        # process it; either by waking the existing one, or starting a new
+        # one.  The worker is detached from us (and from our stdout/stderr,
+        # which the svn client is waiting on), so we return immediately.
+        spool = PostCommitSpool(self.path)
+        spool.enqueue(int(rev), args)
+        if spool.notify_worker():
+            return
+
+        logs = join_path(self.path, 'evn', 'logs')
+        if not os.path.isdir(logs):
+            os.makedirs(logs)
+
+        conf = self.conf
+        cmd = [
+            conf.python,
+            conf.python_evn_admin_cli_file_fullpath,
+            'drain-post-commit-spool',
+            self.path,
+        ]
+        logfile = join_path(logs, 'post-commit-spool.log')
+        with open(os.devnull, 'r') as devnull:
+            with open(logfile, 'a') as log:
+                Popen(
+                    cmd,
+                    stdin=devnull,
+                    stdout=log,
+                    stderr=log,
+                    close_fds=True,
+                    preexec_fn=os.setsid,
+                )
+
     def pre_commit(self, txn, *args):
         self.process_rev_or_txn(txn)
         self.custom_hook.pre_commit(self)
@@ -221,6 +294,13 @@ class RepositoryHook(RepositoryRevOrTxn):
                 "by the following repository admins: %s, or support staff: "
                 "%s" % (_admins(self.repo_admins), _admins(self.admins))
             )
+            return
+
+        # Errors that have been forced through are left for post-commit to
+        # rediscover; some of them (i.e. top-level directory checks) are only
+        # raised for txns, so they wouldn't match the rev's analysis anyway.
+        if self.is_journaling and not cs.has_errors:
+            self.save_txn_analysis()
 
 #===============================================================================
 # Hook File
@@ -676,12 +756,19 @@ class EvnHookFile(HookFile):
         args = ('main', 'unix-hook-force-env-vars')
         envvars += self.conf.get_csv_as_list(*args)
 
+        if self.conf.hook_server_enabled:
+            # Forward the hook to `evnadmin serve-hooks` if it's running; the
+            # client falls back to `evnadmin run-hook` if it isn't.
+            run_hook_code = self.conf.evn_run_hook_client_code
+        else:
+            run_hook_code = self.conf.evn_run_hook_code
+
         lines  = [ '#!/bin/sh', ]
         lines += envvars
         lines += [ 'export %s' % e.split('=')[0] for e in envvars ]
         lines += [
             self.conf.evn_hook_code_for_testing_if_svn_hook_is_enabled,
-            self.conf.evn_run_hook_code
+            run_hook_code,
         ]
 
         ostream.write(add_linesep_if_missing(os.linesep.join(lines)))
@@ -0,0 +1,139 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import os
+import sys
+import socket
+import struct
+import marshal
+
+from subprocess import (
+    Popen,
+    PIPE,
+)
+
+# Note: this module is executed directly by the evn hook script when the hook
+# server is enabled.  The whole point of it is to avoid paying the cost of
+# importing the Subversion bindings (and everything else hanging off the evn
+# package) on every hook invocation, so it must only ever import modules from
+# the standard library.
+
+#===============================================================================
+# Globals
+#===============================================================================
+HEADER = struct.Struct('!I')
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def send_message(sock, message):
+    data = marshal.dumps(message)
+    sock.sendall(HEADER.pack(len(data)))
+    sock.sendall(data)
+
+def recv_bytes(sock, size):
+    chunks = list()
+    remaining = size
+    while remaining:
+        chunk = sock.recv(min(remaining, 65536))
+        if not chunk:
+            return
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return ''.join(chunks)
+
+def recv_message(sock):
+    header = recv_bytes(sock, HEADER.size)
+    if header is None:
+        return
+
+    (size,) = HEADER.unpack(header)
+    data = recv_bytes(sock, size)
+    if data is None:
+        return
+
+    return marshal.loads(data)
+
+def connect(socket_path):
+    if not os.path.exists(socket_path):
+        return
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except socket.error:
+        sock.close()
+        return
+
+    return sock
+
+def run_hook_in_process(python, cli, args, stdin=None):
+    cmd = [ python, cli, 'run-hook' ] + args
+    if stdin is None:
+        # Nothing has been consumed from our stdin yet, so we can just hand
+        # over to `evnadmin run-hook` directly.
+        os.execvp(python, cmd)
+
+    p = Popen(cmd, stdin=PIPE)
+    p.communicate(stdin)
+    return p.returncode
+
+def run_hook(socket_path, python, cli, args):
+    sock = connect(socket_path)
+    if not sock:
+        return run_hook_in_process(python, cli, args)
+
+    request = dict(
+        cwd=os.getcwd(),
+        env=dict(os.environ),
+        stdin=sys.stdin.read(),
+        hook_args=args,
+    )
+
+    ack = None
+    response = None
+    try:
+        try:
+            send_message(sock, request)
+            ack = recv_message(sock)
+            if ack and ack.get('accepted'):
+                response = recv_message(sock)
+        except socket.error:
+            pass
+    finally:
+        sock.close()
+
+    if not ack or not ack.get('accepted'):
+        # The server either went away before it picked up our request or
+        # isn't serving the repository we've been invoked for; either way,
+        # nothing has been done yet, so fall back to running in-process.
+        return run_hook_in_process(python, cli, args, request['stdin'])
+
+    if not response:
+        # The server accepted the request but died before replying.  We
+        # can't safely re-run the hook as it may have already had side
+        # effects (i.e. evn:last_rev having been bumped by post-commit).
+        sys.stderr.write(
+            "error: hook server at %s failed whilst running hook "
+            "(hook args: %s)\n" % (socket_path, ', '.join(args))
+        )
+        return 1
+
+    sys.stdout.write(response['stdout'])
+    sys.stderr.write(response['stderr'])
+    return response['exit_code']
+
+#=============================================================================#
+# Main                                                                        #
+#=============================================================================#
+def main():
+    # Invoked by the evn hook script (see the 'unix-evn-run-hook-client-code'
+    # configuration option) as:
+    #   hookclient.py SOCKET_PATH PYTHON CLI HOOK_NAME REPO_PATH [ARGS ...]
+    (socket_path, python, cli) = sys.argv[1:4]
+    sys.exit(run_hook(socket_path, python, cli, sys.argv[4:]))
+
+if __name__ == '__main__':
+    main()
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
@@ -0,0 +1,355 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import os
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+import svn.fs
+
+from svn.core import (
+    svn_node_none,
+
+    SVN_PROP_MERGEINFO,
+)
+
+from evn.path import (
+    join_path,
+)
+
+from evn.change import (
+    ChangeSet,
+)
+
+from evn.util import (
+    Options,
+)
+
+#===============================================================================
+# Globals
+#===============================================================================
+MERGE_INDEX_SQL = """
+    create table if not exists merge (
+        rev integer not null,
+        target_path text not null,
+        root_path text,
+        source_path text not null,
+        ranges text not null,
+        reverse integer not null
+    );
+
+    create index if not exists merge_rev on merge (rev);
+    create index if not exists merge_source on merge (source_path);
+    create index if not exists merge_root on merge (root_path);
+
+    create table if not exists meta (
+        name text primary key,
+        value integer
+    );
+"""
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def merge_index_path(repo_path):
+    return join_path(repo_path, 'evn', 'db', 'merges.db')
+
+def parse_ranges(ranges):
+    """
+    Parses @ranges, a rangelist in the form returned by
+    svn_rangelist_to_string() (i.e. svn:mergeinfo's), into a list of
+    inclusive (start, end) revision tuples.  Non-inheritable markers are
+    ignored.
+
+    >>> parse_ranges('1-3,5,7-9*')
+    [(1, 3), (5, 5), (7, 9)]
+    """
+    results = list()
+    for r in ranges.split(','):
+        r = r.strip().rstrip('*')
+        if not r:
+            continue
+        if '-' in r:
+            (start, end) = r.split('-')
+            results.append((int(start), int(end)))
+        else:
+            results.append((int(r), int(r)))
+    return results
+
+def format_ranges(ranges):
+    """
+    >>> format_ranges([(1, 3), (5, 5)])
+    '1-3,5'
+    """
+    return ','.join(
+        str(s) if s == e else '%d-%d' % (s, e) for (s, e) in ranges
+    )
+
+def add_ranges(ranges, other):
+    """
+    Returns the union of the (start, end) tuple lists @ranges and @other.
+
+    >>> add_ranges([(1, 3), (8, 9)], [(4, 5), (7, 7)])
+    [(1, 5), (7, 9)]
+    """
+    results = list()
+    for (s, e) in sorted(ranges + other):
+        if results and s <= results[-1][1] + 1:
+            if e > results[-1][1]:
+                results[-1] = (results[-1][0], e)
+        else:
+            results.append((s, e))
+    return results
+
+def subtract_ranges(ranges, other):
+    """
+    Returns the revisions in @ranges that aren't in @other.
+
+    >>> subtract_ranges([(1, 10)], [(3, 4), (10, 12)])
+    [(1, 2), (5, 9)]
+    """
+    results = list()
+    for (s, e) in ranges:
+        for (os_, oe) in other:
+            if oe < s or os_ > e:
+                continue
+            if os_ > s:
+                results.append((s, os_-1))
+            s = oe + 1
+            if s > e:
+                break
+        if s <= e:
+            results.append((s, e))
+    return results
+
+def has_mergeinfo_changes(fs, rev, pool=None):
+    """
+    Returns True if @rev may have changed svn:mergeinfo, as far as
+    svn.fs.paths_changed() can tell, without replaying it: i.e. it modified
+    the properties of a path that has (or had) svn:mergeinfo.  Errs on the
+    side of returning True.
+    """
+    root = svn.fs.revision_root(fs, rev, pool)
+    base_root = svn.fs.revision_root(fs, rev-1, pool)
+    for (path, change) in svn.fs.paths_changed(root, pool).items():
+        if not change.prop_mod:
+            continue
+        if svn.fs.node_prop(root, path, SVN_PROP_MERGEINFO, pool):
+            return True
+        (src_rev, src_path) = svn.fs.copied_from(root, path, pool)
+        if src_path:
+            src_root = svn.fs.revision_root(fs, src_rev, pool)
+        else:
+            (src_root, src_path) = (base_root, path)
+        if svn.fs.check_path(src_root, src_path, pool) == svn_node_none:
+            # Copied along with a parent directory, most likely; we can't
+            # cheaply tell what it had before, so assume the worst.
+            return True
+        if svn.fs.node_prop(src_root, src_path, SVN_PROP_MERGEINFO, pool):
+            return True
+    return False
+
+def load_merges(repo_path, rev, find_root_path):
+    """
+    Loads the changeset for @rev of the repository at @repo_path (without
+    analysing it any further) and returns its svn:mergeinfo changes as per
+    changeset_merges().
+    """
+    cs = ChangeSet(repo_path, rev, Options())
+    try:
+        cs.load()
+        return changeset_merges(cs, find_root_path)
+    finally:
+        cs.destroy()
+
+def changeset_merges(cs, find_root_path):
+    """
+    Returns the svn:mergeinfo changes made by the loaded ChangeSet @cs, in
+    the form MergeIndex.update() expects.  @find_root_path is called with
+    each path mergeinfo was changed on, and returns the path of the root
+    it's in (or None).
+    """
+    merges = list()
+    for pc in cs.mergeinfo_propchanges:
+        target = pc.parent.path
+        root = find_root_path(target)
+        merges.append((target, root, pc.merged, pc.reverse_merged))
+    return merges
+
+#===============================================================================
+# Classes
+#===============================================================================
+class MergeIndex(object):
+    """
+    An SQLite index (evn/db/merges.db) of every svn:mergeinfo change in a
+    repository: the revision it was made in, the path it was made on (and
+    the root containing that path), and, for each merge source, the ranges
+    that were merged (or reverse merged).  This allows `evnadmin
+    find-merges` and `evnadmin show-merged-revisions` to be answered
+    without replaying any revisions.
+
+    Like the root index, the index covers revisions 1 through last_rev, is
+    updated incrementally as each revision is analysed (see update()), and
+    can be (re)built via `evnadmin backfill-merge-index`.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.__con = None
+
+    @property
+    def available(self):
+        return sqlite3 is not None
+
+    @property
+    def exists(self):
+        return self.available and os.path.isfile(self.path)
+
+    @property
+    def con(self):
+        if self.__con is None:
+            d = os.path.dirname(self.path)
+            if not os.path.isdir(d):
+                os.makedirs(d)
+            con = sqlite3.connect(self.path, timeout=30)
+            # Paths are handed straight back to code that expects str.
+            con.text_factory = str
+            con.executescript(MERGE_INDEX_SQL)
+            self.__con = con
+        return self.__con
+
+    def close(self):
+        if self.__con is not None:
+            self.__con.close()
+            self.__con = None
+
+    def _last_rev(self):
+        sql = "select value from meta where name = 'last_rev'"
+        row = self.con.execute(sql).fetchone()
+        return row[0] if row else None
+
+    def _set_last_rev(self, rev):
+        sql = "insert or replace into meta values ('last_rev', ?)"
+        self.con.execute(sql, (rev,))
+
+    @property
+    def last_rev(self):
+        """
+        The last revision the index is up to date with, or None if the index
+        is empty (or unusable).
+        """
+        if not self.exists:
+            return
+        try:
+            return self._last_rev()
+        except sqlite3.Error:
+            return
+
+    def covers(self, rev):
+        last_rev = self.last_rev
+        return last_rev is not None and rev <= last_rev
+
+    def clear(self):
+        with self.con:
+            self.con.execute("delete from merge")
+            self.con.execute("delete from meta")
+
+    def _rows(self, rev, merges):
+        rows = list()
+        for (target, root, merged, reverse_merged) in merges:
+            for (reverse, d) in ((0, merged), (1, reverse_merged)):
+                for (source, ranges) in d.items():
+                    rows.append((rev, target, root, source, ranges, reverse))
+        return rows
+
+    def update(self, rev, merges):
+        """
+        Records the svn:mergeinfo changes made in @rev, a list of (target
+        path, root path, merged, reverse merged) tuples, where the latter two
+        are dicts mapping source paths to rangelists (as per
+        MergeinfoPropertyChange), replacing anything previously recorded for
+        @rev onward.  Returns False if the index wasn't updated because it
+        doesn't cover the preceding revision.
+        """
+        if not self.available:
+            return False
+        try:
+            return self._update(rev, merges)
+        except (sqlite3.Error, OSError):
+            return False
+
+    def backfill(self, rev, merges):
+        """
+        Like update(), but without requiring the index to cover the
+        preceding revision, for rebuilding the index from only those
+        revisions that changed svn:mergeinfo.  Callers are expected to call
+        set_last_rev() once they're done.
+        """
+        return self._update(rev, merges, check=False)
+
+    def _update(self, rev, merges, check=True):
+        last_rev = self._last_rev()
+        if check and (last_rev or 0) < rev - 1:
+            return False
+
+        with self.con as con:
+            if last_rev is not None and last_rev >= rev:
+                con.execute("delete from merge where rev >= ?", (rev,))
+            sql = "insert into merge values (?, ?, ?, ?, ?, ?)"
+            con.executemany(sql, self._rows(rev, merges))
+            self._set_last_rev(rev)
+
+        return True
+
+    def set_last_rev(self, rev):
+        with self.con:
+            self._set_last_rev(rev)
+
+    def find_merges(self, start_rev, end_rev):
+        """
+        Returns a sorted list of the revisions between @start_rev and
+        @end_rev (inclusive) that changed svn:mergeinfo.
+        """
+        sql = (
+            "select distinct rev from merge "
+            " where rev between ? and ? order by rev"
+        )
+        rows = self.con.execute(sql, (start_rev, end_rev)).fetchall()
+        return [ r[0] for r in rows ]
+
+    def merges_into_root(self, source_path, root_path):
+        """
+        Returns a list of (rev, target path, source path, ranges, reverse)
+        tuples for every merge from @source_path (or any path beneath it)
+        into @root_path (or any path beneath it), in revision order.
+        """
+        source_path = source_path.rstrip('/')
+        sql = (
+            "select rev, target_path, source_path, ranges, reverse "
+            "  from merge "
+            " where (source_path = ? or source_path like ?) "
+            "   and root_path = ? "
+            " order by rev, reverse desc"
+        )
+        args = (source_path, source_path + '/%', root_path)
+        return self.con.execute(sql, args).fetchall()
+
+    def merged_revisions(self, source_path, root_path):
+        """
+        Returns the revisions of @source_path that have been merged into
+        @root_path (less any that were subsequently reverse merged), as a
+        list of inclusive (start, end) tuples.
+        """
+        merged = list()
+        for (rev, target, source, ranges, reverse) in \
+                self.merges_into_root(source_path, root_path):
+            ranges = parse_ranges(ranges)
+            if reverse:
+                merged = subtract_ranges(merged, ranges)
+            else:
+                merged = add_ranges(merged, ranges)
+        return merged
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
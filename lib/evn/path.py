@@ -4,6 +4,10 @@
 import os
 import re
 
+from collections import (
+    namedtuple,
+)
+
 from os.path import (
     join,
     abspath,
@@ -346,6 +350,26 @@ def extract_component_name(path):
 #===============================================================================
 # Path Matching
 #===============================================================================
+# Python's re module only supports 100 groups per pattern, so patterns that
+# need a group per root pattern are split into chunks of this size.
+MAX_PATTERNS_PER_REGEX = 90
+
+# Number of paths PathMatcher will remember the classification of before it
+# starts afresh.
+PATH_MATCHER_MEMO_SIZE = 65536
+
+def _strip_groups(pattern):
+    return pattern.replace('(', '').replace(')', '')
+
+CompiledPathMatcherPatterns = namedtuple(
+    'CompiledPathMatcherPatterns', [
+        'search',
+        'full',
+        'is_root',
+        'root_dirs',
+    ]
+)
+
 class PathMatcherConfig(object):
     singular    = tuple()
     plural      = tuple()
@@ -377,6 +401,13 @@ class PathMatcher(object):
         self.excluded_pattern = ''
         self.excluded_regex = None
 
+        # Compiled forms of our patterns (see _compile()), and the results of
+        # previous get_root_details_tuple() and is_unknown() calls, both of
+        # which are discarded whenever a pattern or exclusion is added.
+        self.__compiled = None
+        self.__root_details_memo = dict()
+        self.__is_unknown_memo = dict()
+
         data = zip(self.singular, self.plural, self.match, self.ending)
         for (singular, plural, match, ending) in data:
             setattr(self, plural, [])
@@ -439,6 +470,7 @@ class PathMatcher(object):
         assert plural in self.plural_to_hint
         self.plural_to_hint[plural].append(path)
         getattr(self, plural).append(path)
+        self._patterns_changed()
 
     def add_trunk(self, path):
         self.add_path(path, 'trunk')
@@ -488,6 +520,7 @@ class PathMatcher(object):
         self.plural_to_basedir[plural].append(path)
         pattern = path + '([^/]+)/'
         getattr(self, plural).append(pattern)
+        self._patterns_changed()
 
     def add_branches_basedir(self, path):
         self.add_basedir(path, 'branches')
@@ -524,6 +557,58 @@ class PathMatcher(object):
         pattern = '^(%s)' % '|'.join(self.excluded_paths)
         self.excluded_pattern = pattern
         self.excluded_regex = re.compile(pattern)
+        self._patterns_changed()
+
+    def _patterns_changed(self):
+        self.__compiled = None
+        self.__root_details_memo.clear()
+        self.__is_unknown_memo.clear()
+
+    def _compile(self):
+        """
+        Compiles every trunk, branch and tag pattern (including root hints
+        and base directories) up front, such that each lookup doesn't need
+        to build pattern strings and go through re's (small) pattern cache.
+
+        In addition to each pattern compiled individually (in its 'search'
+        form, as used by the get_xxx_path methods, and its '$'-terminated
+        form, as used by the get_xxx methods), two combined regexes are
+        built: 'is_root', which matches if any pattern matches the end of a
+        path (i.e. the path is a trunk, branch or tag), and 'root_dirs',
+        which picks out every pattern's candidate root directory for a path
+        in a single match, via an optional lookahead group per pattern.
+        """
+        search = dict()
+        full = dict()
+        patterns = list()
+        for plural in self.plural:
+            plural_patterns = getattr(self, plural)
+            search[plural] = [ re.compile(p) for p in plural_patterns ]
+            full[plural] = [ re.compile(p + '$') for p in plural_patterns ]
+            patterns += [ _strip_groups(p) for p in plural_patterns ]
+
+        root_dirs = list()
+        n = MAX_PATTERNS_PER_REGEX
+        for i in xrange(0, len(patterns), n):
+            pattern = '^' + ''.join(
+                '(?:(?=(%s).*$))?' % p for p in patterns[i:i+n]
+            )
+            root_dirs.append(re.compile(pattern))
+
+        is_root = re.compile('|'.join('(?:%s$)' % p for p in patterns))
+
+        return CompiledPathMatcherPatterns(
+            search=search,
+            full=full,
+            is_root=is_root,
+            root_dirs=root_dirs,
+        )
+
+    @property
+    def _compiled(self):
+        if self.__compiled is None:
+            self.__compiled = self._compile()
+        return self.__compiled
 
     def is_excluded(self, path):
         if self.excluded_paths and self.excluded_regex.match(path):
@@ -533,8 +618,8 @@ class PathMatcher(object):
 
     def _get_xxx(self, path, xxx):
         assert isinstance(path, str)
-        for pattern in getattr(self, xxx):
-            found = re.findall(pattern + '$', path)
+        for regex in self._compiled.full[xxx]:
+            found = regex.findall(path)
             if found and not self.is_excluded(path):
                 return found
 
@@ -543,8 +628,8 @@ class PathMatcher(object):
 
     def _get_xxx_path(self, path, xxx):
         assert isinstance(path, str)
-        for pattern in getattr(self, xxx):
-            found = re.findall(pattern, path)
+        for regex in self._compiled.search[xxx]:
+            found = regex.findall(path)
             if found and not self.is_excluded(path):
                 return found
 
@@ -554,9 +639,9 @@ class PathMatcher(object):
     def _find_xxx_paths(self, paths, xxx):
         assert isinstance(paths, (list, tuple))
         f = dict()
-        for pattern in getattr(self, xxx):
+        for regex in self._compiled.search[xxx]:
             for path in paths:
-                m = re.search(pattern, path)
+                m = regex.search(path)
                 if m and not self.is_excluded(path):
                     f.setdefault('/'.join(m.groups()), []).append(m.group(0))
         return f
@@ -576,12 +661,38 @@ class PathMatcher(object):
     def is_unknown(self, path):
         """
         Returns true if all the is_xxx methods return false.
+
+        >>> pm = PathMatcher()
+        >>> pm.is_unknown('/src/trunk/')
+        False
+        >>> pm.is_unknown('/src/trunk/foo.txt')
+        True
+        >>> pm.is_unknown('/src/1.x/')
+        True
+        >>> pm.add_path('/src/1.x/', 'branch')
+        >>> pm.is_unknown('/src/1.x/')
+        False
+        >>> pm.add_exclusions(['/src/'])
+        >>> pm.is_unknown('/src/1.x/')
+        True
         """
-        return all(
-            not getattr(self, method_name)(path)
-                for method_name in self._is_xxx_methods
+        assert isinstance(path, str)
+        memo = self.__is_unknown_memo
+        try:
+            return memo[path]
+        except KeyError:
+            pass
+
+        unknown = (
+            self.is_excluded(path) or
+            not self._compiled.is_root.search(path)
         )
 
+        if len(memo) >= PATH_MATCHER_MEMO_SIZE:
+            memo.clear()
+        memo[path] = unknown
+        return unknown
+
     def get_root_dir(self, path):
         """
         >>> pm = PathMatcher()
@@ -630,17 +741,13 @@ class PathMatcher(object):
         assert path[0] == '/' if path else True
         root = None
         min_root_length = None
-        for plural in self.plural:
-            patterns = [
-                '^(%s)(.*)$' % p.replace('(', '').replace(')', '')
-                    for p in getattr(self, plural)
-            ]
-            for pattern in patterns:
-                match = re.search(pattern, path)
-                if match and not self.is_excluded(path):
-                    groups = match.groups()
-                    assert len(groups) in (1, 2), groups
-                    r = groups[0]
+        if self.is_excluded(path):
+            return root
+        for regex in self._compiled.root_dirs:
+            # Every group is optional, so the match always succeeds; groups
+            # are None for patterns that didn't match.
+            for r in regex.match(path).groups():
+                if r is not None:
                     l = len(r)
                     if root is None:
                         root = r
@@ -704,6 +811,21 @@ class PathMatcher(object):
         """
         if path == '/':
             return ('/', 'absolute', '/')
+
+        memo = self.__root_details_memo
+        try:
+            return memo[path]
+        except KeyError:
+            pass
+
+        result = self._get_root_details_tuple(path)
+
+        if len(memo) >= PATH_MATCHER_MEMO_SIZE:
+            memo.clear()
+        memo[path] = result
+        return result
+
+    def _get_root_details_tuple(self, path):
         found = False
         matches = list()
         root_dir = self.get_root_dir(path)
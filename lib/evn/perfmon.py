@@ -1,264 +1,264 @@
 #===============================================================================
 # Imports
 #===============================================================================
-try:
-    import psutil
-except ImportError:
-    pass
+import sys
+import time
+import resource
 
-import itertools
+from itertools import (
+    chain,
+    repeat,
+)
 
 from collections import (
-    namedtuple,
+    OrderedDict,
 )
 
 from functools import (
     wraps,
 )
 
-#===============================================================================
-# Named Tuples, Decorators & Helper Methods
-#===============================================================================
-
-ResourceUsageSnapshot = namedtuple(
-    'ResourceUsageSnapshot', (
-        'rss',
-        'vms',
-        'open_files',
-        'num_threads',
-        'cpu_percent',
-        'cpu_sys_time',
-        'cpu_user_time',
-        'memory_percent',
-    )
+from evn.util import (
+    render_text_table,
+    Dict,
 )
 
-ResourceUsageDelta = namedtuple(
-    'ResourceUsageDelta', (
-        '%s_delta' % s for s in ResourceUsageSnapshot._fields
-    ),
+#===============================================================================
+# Globals
+#===============================================================================
+PHASE_FIELDS = (
+    'count',
+    'elapsed',
+    'user',
+    'sys',
+    'minflt',
+    'majflt',
 )
 
+#===============================================================================
+# Decorators & Helper Methods
+#===============================================================================
 def track_resource_usage(f):
+    """
+    Decorator for methods of objects with a _track() method (i.e. ChangeSet)
+    that records each call as a phase named after the method.
+    """
     @wraps(f)
     def wrapper(*args, **kwds):
-        obj = args[0]
-        if not obj._track_resource_usage:
+        with args[0]._track(f.func_name):
             return f(*args, **kwds)
-        else:
-            with args[0]._track(f.func_name):
-                return f(*args, **kwds)
     return wrapper
 
-def create_resource_usage_snapshot(p):
-    assert isinstance(p, psutil.Process)
-    (rss, vms) = p.get_memory_info()
-    (usr, sys) = p.get_cpu_times()
-    return ResourceUsageSnapshot(
-        rss,
-        vms,
-        len(p.get_open_files()),
-        p.get_num_threads(),
-        p.get_cpu_percent(),
-        usr,
-        sys,
-        p.get_memory_percent()
-    )
-
-def create_resource_usage_delta(name, before, after):
-    args = [
-        (getattr(after, f) - getattr(before, f))
-            for f in ResourceUsageSnapshot._fields
-    ]
-    return ResourceUsageDelta(*args)
+def _get_monotonic():
+    try:
+        return time.monotonic
+    except AttributeError:
+        pass
+
+    if not sys.platform.startswith('linux'):
+        return time.time
+
+    try:
+        import ctypes
+        import ctypes.util
+
+        class timespec(ctypes.Structure):
+            _fields_ = [
+                ('tv_sec', ctypes.c_long),
+                ('tv_nsec', ctypes.c_long),
+            ]
+
+        name = ctypes.util.find_library('rt') or ctypes.util.find_library('c')
+        clock_gettime = ctypes.CDLL(name, use_errno=True).clock_gettime
+        clock_gettime.argtypes = [ ctypes.c_int, ctypes.POINTER(timespec) ]
+        clock_gettime.restype = ctypes.c_int
+    except (ImportError, OSError, AttributeError, TypeError):
+        return time.time
+
+    CLOCK_MONOTONIC = 1
+    ts = timespec()
+    ts_ref = ctypes.byref(ts)
+
+    def monotonic():
+        if clock_gettime(CLOCK_MONOTONIC, ts_ref) != 0:
+            return time.time()
+        return ts.tv_sec + ts.tv_nsec * 1e-9
+
+    try:
+        monotonic()
+    except Exception:
+        return time.time
+
+    return monotonic
+
+# Seconds from an arbitrary starting point that never goes backwards, where
+# the platform lets us (falls back to time.time() otherwise).
+monotonic = _get_monotonic()
+
+def _snapshot():
+    r = resource.getrusage(resource.RUSAGE_SELF)
+    return (monotonic(), r.ru_utime, r.ru_stime, r.ru_minflt, r.ru_majflt)
 
 #===============================================================================
 # Classes
 #===============================================================================
-class ResourceUsageContainer(object):
-    def __init__(self, name, depth, rss, vms):
+class Phase(object):
+    """
+    A node in a PhaseTracker's tree: the cumulative wall clock time (from a
+    monotonic clock), user and system CPU time, and minor and major page
+    faults spent in all @count entries of a given phase within its parent.
+    """
+    def __init__(self, name, depth):
         self.name = name
         self.depth = depth
-        self.snapshots = list()
-        self.deltas = list()
-
-    def snapshot(self, msg, rss, vms):
-        self.snapshots.append(ResourceUsageSnapshot(msg, rss, vms))
+        self.count = 0
+        self.elapsed = 0.0
+        self.user = 0.0
+        self.sys = 0.0
+        self.minflt = 0
+        self.majflt = 0
+        self.children = OrderedDict()
+
+    def child(self, name):
+        phase = self.children.get(name)
+        if phase is None:
+            phase = Phase(name, self.depth+1)
+            self.children[name] = phase
+        return phase
+
+    def add(self, before, after):
+        self.count += 1
+        self.elapsed += after[0] - before[0]
+        self.user += after[1] - before[1]
+        self.sys += after[2] - before[2]
+        self.minflt += after[3] - before[3]
+        self.majflt += after[4] - before[4]
 
-    def enter(self, name, rss, vms):
-        self.snapshots.append(
-            ResourceUsageSnapshotContext(name, self.depth+1, rss, vms)
+    def __iter__(self):
+        """
+        Yields this phase's descendants, depth first, in the order they
+        were first entered.
+        """
+        for phase in self.children.values():
+            yield phase
+            for p in phase:
+                yield p
+
+    def __repr__(self):
+        return '<Phase %s count=%d elapsed=%0.6f>' % (
+            self.name,
+            self.count,
+            self.elapsed,
         )
 
-    def leave(self, rss, vms):
-        self.snapshots.append(ResourceUsageSnapshot('leave', rss, vms))
-
-    def __iter__(self):
-        for snapshot in self.snapshots:
-            if isinstance(snapshot, ResourceUsageSnapshot):
-                yield snapshot
-            else:
-                assert isinstance(snapshot, ResourceUsageContainer)
-                context = snapshot
-                for snapshot in context:
-                    yield snapshot
-
-class ResourceUsageContext(object):
-    def __init__(self, tracker, msg):
-        self.msg     = msg
-        self.after   = None
-        self.depth   = None
-        self.delta   = None
-        self.before  = None
+class PhaseContext(object):
+    def __init__(self, tracker, name):
         self.tracker = tracker
-        self.parent  = tracker.current_context
+        self.name = name
+        self.phase = None
+        self.parent = None
+        self.before = None
 
     def __enter__(self):
-        self.before = create_resource_usage_snapshot(self.tracker.proc)
-        self.depth = self.tracker._enter(self)
+        self.parent = self.tracker.current
+        self.phase = self.parent.child(self.name)
+        self.tracker.current = self.phase
+        self.before = _snapshot()
         return self
 
     def __exit__(self, *exc_info):
-        self.after = create_resource_usage_snapshot(self.tracker.proc)
-        args = (self.msg, self.before, self.after)
-        self.delta = create_resource_usage_delta(*args)
-        self.tracker._exit(self)
-
-class ResourceUsageResultsFormatter(object):
-    def format(self, name, value, context):
-        attempts = itertools.count(0)
-        return self._format(name, value, context, attempts)
-
-    def _format(self, name, value, context, attempts):
-        count = itertools.count(0)
-        attempt = attempts.next()
-        last_attempt = False
-        try:
-            if attempt == count.next():
-                return getattr(self, name)(value, context)
-
-            if attempt == count.next():
-                return getattr(self, type(value).__name__)(value, context)
-
-            if attempt == count.next():
-                return str(value)
-
-            last_attempt = True
-        except:
-            if not last_attempt:
-                return self._format(name, value, context, attempts)
-            else:
-                m = "conversion failed for %s: %s" % (name, str(value))
-                raise RuntimeError(m)
-
-    def rss(self, value, context):
-        return bytes_to_mb(value)
-
-    def vms(self, value, context):
-        return bytes_to_mb(value)
-
-    def float(self, value, context):
-        return '%0.3f' % value
-
-    def name(self, value, context):
-        prefix = '' if context.depth == 1 else ' ' * (context.depth * 2)
-        return prefix + value
-
-
-class ResourceUsageTracker(object):
-    def __init__(self, msg):
-        self.msg = msg
-        self.proc = psutil.Process(os.getpid())
-        self.current_depth = 0
-        self.current_context = self
-        self.previous_context = None
-        self.contexts = list()
+        self.phase.add(self.before, _snapshot())
+        self.tracker.current = self.parent
+
+class PhaseTracker(object):
+    """
+    Records a tree of nested phases (see Phase) via track(), e.g.:
+
+        tracker = PhaseTracker('r42')
+        with tracker.track('replay'):
+            with tracker.track('_close'):
+                ...
+
+    Entering a phase costs a couple of getrusage() and clock calls, so it's
+    cheap enough to leave enabled for every hook invocation, as long as
+    phases aren't entered per change (or per path).  Entering a phase with
+    the same name as a sibling accumulates into that sibling.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.root = Phase(name, 0)
+        self.current = self.root
 
-    @property
-    def deltas(self):
-        return (c.delta for c in self)
+    def track(self, name):
+        return PhaseContext(self, name)
 
     def __iter__(self):
-        return (c for c in self.contexts)
-
-    def _enter(self, ctx):
-        'Called by ResourceUsageContext.__enter__.  Returns current depth.'
-        self.current_depth += 1
-        self.previous_context = self.current_context
-        self.current_context = ctx
-        self.contexts.append(ctx)
-        return self.current_depth
-
-    def _exit(self, ctx):
-        """Called by ResourceUsageContext.__exit__."""
-        self.current_depth -= 1
-        self.current_context = self.previous_context
+        return iter(self.root)
 
-    def track(self, msg):
-        return ResourceUsageContext(self, msg)
+    @property
+    def phases(self):
+        """
+        Returns the top-level phases as an ordered dict of name -> Phase.
+        """
+        return self.root.children
 
-    def get_results_header(self, exclude=None):
-        return tuple(
-            ('name', ) + tuple(
-                f for f in ResourceUsageSnapshot._fields
-                    if not exclude or not exclude(f)
-            )
-        )
+    @property
+    def phase_times(self):
+        """
+        Returns a list of (name, elapsed seconds) tuples for each top-level
+        phase, in the form AnalysisProgress.update() expects.
+        """
+        return [ (p.name, p.elapsed) for p in self.root.children.values() ]
+
+    def find(self, *names):
+        """
+        Returns the phase reached by following @names down from the root,
+        or None if there's no such phase.
+        """
+        phase = self.root
+        for name in names:
+            phase = phase.children.get(name)
+            if phase is None:
+                return
+        return phase
 
-    def get_results(self, formatter=None, exclude=None):
-        if not formatter:
-            formatter = ResourceUsageResultsFormatter()
-
-        return ( [
-            (formatter.format(name, value, context))
-                for (name, value) in chain(
-                    (('name', context.msg),), zip(
-                        ResourceUsageSnapshot._fields,
-                        context.delta,
-                    )
-                ) if not exclude or not exclude(name)
-            ] for context in self.contexts
+    @property
+    def one_liner(self):
+        return ', '.join(
+            '%s: %0.3fs' % (name, elapsed)
+                for (name, elapsed) in self.phase_times
         )
 
-        return (
-            [ ' ' * context.msg, ] + [
-                (formatter.format(name, value))
-                    for (name, value) in zip(
-                        ResourceUsageSnapshot._fields,
-                        context.delta,
-                    ) if not exclude or not exclude(name)
-            ] for context in self.contexts
+    def get_results_header(self, exclude=None):
+        return ('name',) + tuple(
+            f for f in PHASE_FIELDS if not exclude or not exclude(f)
         )
 
-    def results_to_table(self, output=None, formatter=None, exclude=None):
+    def get_results(self, exclude=None):
+        for phase in self:
+            row = [ '  ' * (phase.depth-1) + phase.name ]
+            for f in PHASE_FIELDS:
+                if exclude and exclude(f):
+                    continue
+                value = getattr(phase, f)
+                if isinstance(value, float):
+                    value = '%0.3f' % value
+                row.append(value)
+            yield row
+
+    def results_to_table(self, output=None, exclude=None):
         if not output:
             output = sys.stdout
 
-        if not formatter:
-            formatter = ResourceUsageResultsFormatter()
-
-        if not exclude:
-            pass
-
         k = Dict()
         k.output  = output
-        k.banner  = "%s: Resource Usage Deltas" % self.msg
+        k.banner  = "%s: Phase Times" % self.name
         k.formats = lambda: chain((str.ljust,), repeat(str.rjust))
 
         results = chain(
             (self.get_results_header(exclude=exclude),),
-            self.get_results(formatter=formatter, exclude=exclude)
+            self.get_results(exclude=exclude)
         )
         render_text_table(results, **k)
 
-class DummyResourceUsageTracker(object):
-    def track(self, *args):
-        return self
-
-    def __enter__(self):
-        return self
-
-    def __exit__(self, *args):
-        pass
-
 # vim:set ts=8 sw=4 sts=4 tw=78 et:
@@ -0,0 +1,271 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import os
+import json
+import time
+import heapq
+import hashlib
+import resource
+
+from collections import (
+    deque,
+)
+
+from evn.path import (
+    join_path,
+)
+
+from evn.util import (
+    Dict,
+)
+
+#===============================================================================
+# Globals
+#===============================================================================
+# The sliding windows (in seconds) revisions per second are reported over.
+RATE_WINDOWS = (60, 600, 3600)
+
+# How many of the largest revisions seen (by change count) are reported.
+LARGEST_REVISIONS = 5
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def analyze_log_path(repo_path):
+    return join_path(repo_path, 'evn', 'logs', 'analyze.log')
+
+def analyze_checkpoint_path(repo_path):
+    return join_path(repo_path, 'evn', 'db', 'analyze.checkpoint')
+
+def rss_in_bytes():
+    """
+    Returns the current resident set size of this process, or the peak
+    resident set size if the current size can't be determined (i.e. on
+    platforms without /proc).
+    """
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            pages = int(f.read().split()[1])
+        return pages * resource.getpagesize()
+    except (IOError, OSError, ValueError, IndexError):
+        pass
+    # ru_maxrss is in kilobytes on Linux, and in bytes on OS X.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if os.uname()[0] == 'Darwin' else rss * 1024
+
+def roots_digest(roots):
+    """
+    Returns a hex digest of the paths and creation revisions of @roots (a
+    dict in the same form as evn:roots), used to verify that the roots a
+    checkpoint was taken against haven't since changed.
+    """
+    items = sorted((p, r['created']) for (p, r) in roots.items())
+    return hashlib.md5(repr(items)).hexdigest()
+
+def format_duration(seconds):
+    if seconds is None:
+        return '?'
+    seconds = int(seconds)
+    (hours, seconds) = divmod(seconds, 3600)
+    (minutes, seconds) = divmod(seconds, 60)
+    return '%d:%02d:%02d' % (hours, minutes, seconds)
+
+#===============================================================================
+# Classes
+#===============================================================================
+class AnalysisProgress(object):
+    """
+    Tracks the progress of an `evnadmin analyze` run over revisions
+    @start_rev through @end_rev, and every @interval seconds produces a
+    progress record (see record()) that is written as a line of JSON to
+    @log_path (if set) and summarised on @stream (if set).  @caches, if
+    set, maps names to caches with hits and misses counters (i.e.
+    RevPropCache), which are included in each record.
+    """
+    def __init__(self, start_rev, end_rev, interval=60,
+                 log_path=None, stream=None, caches=None):
+        self.start_rev = start_rev
+        self.end_rev = end_rev
+        self.interval = interval
+        self.log_path = log_path
+        self.stream = stream
+        self.caches = caches or dict()
+
+        self.rev = start_rev
+        self.count = 0
+        self.start_time = time.time()
+        self.last_record_time = self.start_time
+
+        # (time, revisions analyzed) samples, covering the largest window.
+        self.samples = deque([ (self.start_time, 0) ])
+        self.phase_times = dict()
+        self.largest = list()
+
+    def update(self, rev, phase_times, change_count):
+        """
+        Called after each revision @rev has been analyzed, with the time
+        spent in each phase of its analysis (a list of (phase, seconds)
+        tuples) and the number of changes it contained.  Returns the record
+        written, if one was due, otherwise None.
+        """
+        now = time.time()
+        self.rev = rev
+        self.count += 1
+
+        self.samples.append((now, self.count))
+        horizon = now - max(RATE_WINDOWS)
+        while len(self.samples) > 2 and self.samples[1][0] <= horizon:
+            self.samples.popleft()
+
+        for (phase, elapsed) in phase_times:
+            self.phase_times[phase] = self.phase_times.get(phase, 0) + elapsed
+
+        item = (change_count, rev)
+        if len(self.largest) < LARGEST_REVISIONS:
+            heapq.heappush(self.largest, item)
+        elif item > self.largest[0]:
+            heapq.heapreplace(self.largest, item)
+
+        if now - self.last_record_time < self.interval:
+            return
+        return self.flush(now)
+
+    def rate(self, window, now=None):
+        """
+        Returns the number of revisions analyzed per second over the last
+        @window seconds (or since we started, if that's more recent).
+        """
+        now = now or time.time()
+        (then, count) = self.samples[0]
+        for (t, c) in self.samples:
+            if t >= now - window:
+                break
+            (then, count) = (t, c)
+        elapsed = now - then
+        if elapsed <= 0:
+            return 0.0
+        return (self.count - count) / elapsed
+
+    def record(self, now=None):
+        now = now or time.time()
+        r = Dict()
+        r.time = now
+        r.rev = self.rev
+        r.end_rev = self.end_rev
+        r.analyzed = self.count
+        r.elapsed = now - self.start_time
+        r.rates = dict(
+            ('%ds' % w, round(self.rate(w, now), 3)) for w in RATE_WINDOWS
+        )
+        rate = self.rate(RATE_WINDOWS[1], now)
+        remaining = self.end_rev - self.rev
+        r.eta = (remaining / rate) if rate else None
+        r.phases = dict(
+            (p, round(t, 3)) for (p, t) in self.phase_times.items()
+        )
+        r.rss = rss_in_bytes()
+        r.largest = [
+            dict(rev=rev, changes=count)
+                for (count, rev) in sorted(self.largest, reverse=True)
+        ]
+        r.caches = dict(
+            (name, dict(hits=c.hits, misses=c.misses))
+                for (name, c) in self.caches.items()
+        )
+        return r
+
+    def flush(self, now=None):
+        """
+        Writes a progress record now, regardless of the interval, and
+        returns it.
+        """
+        r = self.record(now)
+        self.last_record_time = r.time
+        if self.log_path:
+            self._log(r)
+        if self.stream:
+            self.stream.write(self.format(r) + '\n')
+        return r
+
+    def _log(self, r):
+        try:
+            with open(self.log_path, 'a') as f:
+                f.write(json.dumps(dict(r), sort_keys=True) + '\n')
+        except (IOError, OSError):
+            pass
+
+    def format(self, r):
+        total = sum(r.phases.values()) or 1.0
+        phases = ', '.join(
+            '%s %d%%' % (p, 100 * t / total)
+                for (p, t) in sorted(r.phases.items())
+        )
+        largest = ', '.join(
+            'r%d (%d)' % (d['rev'], d['changes']) for d in r.largest
+        )
+        caches = ', '.join(
+            '%s %d/%d' % (name, d['hits'], d['hits'] + d['misses'])
+                for (name, d) in sorted(r.caches.items())
+        )
+        return (
+            'progress: r%d/%d, %.1f revs/s (%.1f over %s), eta %s, '
+            'rss %.1fMB, phases: %s, largest: %s, cache hits: %s' % (
+                r.rev,
+                r.end_rev,
+                r.rates['%ds' % RATE_WINDOWS[0]],
+                r.rates['%ds' % RATE_WINDOWS[1]],
+                format_duration(RATE_WINDOWS[1]),
+                format_duration(r.eta),
+                float(r.rss) / 1024.0 / 1024.0,
+                phases or '-',
+                largest or '-',
+                caches or '-',
+            )
+        )
+
+class AnalysisCheckpoint(object):
+    """
+    A checkpoint (evn/db/analyze.checkpoint) of an `evnadmin analyze` run,
+    recording the last revision known to have been analyzed completely,
+    and a digest of its roots.
+
+    evn:last_rev is written after each revision's other revprops, so it's
+    normally safe to resume from, but a crash (or kill -9) part way through
+    flushing a revision's revprops can leave evn:last_rev ahead of what was
+    actually written.  On resumption, only the revisions after the last
+    checkpoint need to be verified (see AnalyzeCommand), rather than all of
+    them.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """
+        Returns a Dict of the checkpoint's rev, digest and time, or None if
+        there's no (valid) checkpoint.
+        """
+        try:
+            with open(self.path, 'r') as f:
+                d = json.load(f)
+            return Dict(rev=int(d['rev']), digest=d['digest'], time=d['time'])
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return
+
+    def save(self, rev, roots):
+        d = dict(rev=rev, digest=roots_digest(roots), time=time.time())
+        tmp = self.path + '.tmp'
+        dirname = os.path.dirname(self.path)
+        if not os.path.isdir(dirname):
+            os.makedirs(dirname)
+        with open(tmp, 'w') as f:
+            json.dump(d, f, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
@@ -0,0 +1,460 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import os
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+from evn.path import (
+    join_path,
+)
+
+from evn.util import (
+    Options,
+)
+
+#===============================================================================
+# Globals
+#===============================================================================
+# The same tables as bitrot's RESULTS_DB_SQL (one row per editor callback in
+# `action', plus a table per callback for its arguments), keyed by revision
+# as well, plus a `revision' table recording which revisions are complete.
+REPLAY_CACHE_SQL = """
+    create table if not exists revision (
+        rev integer primary key,
+        send_deltas integer not null
+    );
+
+    create table if not exists action (
+        rev integer not null,
+        id integer not null,
+        name text not null,
+        path text not null,
+        primary key (rev, id)
+    );
+
+    create table if not exists add_entry (
+        rev integer not null,
+        id integer not null,
+        copied_from_path text,
+        copied_from_rev integer,
+        primary key (rev, id)
+    );
+
+    create table if not exists change_prop (
+        rev integer not null,
+        id integer not null,
+        name text not null,
+        value blob,
+        primary key (rev, id)
+    );
+
+    create table if not exists apply_textdelta (
+        rev integer not null,
+        id integer not null,
+        base_checksum text,
+        primary key (rev, id)
+    );
+
+    create table if not exists close_file (
+        rev integer not null,
+        id integer not null,
+        text_checksum text,
+        primary key (rev, id)
+    );
+"""
+
+REPLAY_CACHE_TABLES = (
+    'revision',
+    'action',
+    'add_entry',
+    'change_prop',
+    'apply_textdelta',
+    'close_file',
+)
+
+# Maps each recorded callback to the table holding its arguments (if any).
+ARGUMENT_TABLES = {
+    'add_directory': 'add_entry',
+    'add_file': 'add_entry',
+    'change_dir_prop': 'change_prop',
+    'change_file_prop': 'change_prop',
+    'apply_textdelta': 'apply_textdelta',
+    'close_file': 'close_file',
+}
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def replay_cache_path(repo_path):
+    return join_path(repo_path, 'evn', 'db', 'replay.db')
+
+def _parent_path(path):
+    return path.rpartition('/')[0]
+
+def replay(events, editor, pool):
+    """
+    Drives @editor (a ChangeSet) with @events, as recorded by ReplayRecorder,
+    in the same order and with the same arguments svn.repos.replay2() drove
+    the editor with originally.  Directory and file batons are whatever the
+    @editor's add_*/open_* methods return, as usual.
+    """
+    batons = dict()
+    for (name, path, a, b) in events:
+        if name == 'open_root':
+            batons[path] = editor.open_root(-1, pool)
+        elif name == 'delete_entry':
+            parent = batons[_parent_path(path)]
+            editor.delete_entry(path, -1, parent, pool)
+        elif name in ('add_directory', 'add_file'):
+            parent = batons[_parent_path(path)]
+            method = getattr(editor, name)
+            batons[path] = method(path, parent, a, b, pool)
+        elif name in ('open_directory', 'open_file'):
+            parent = batons[_parent_path(path)]
+            method = getattr(editor, name)
+            batons[path] = method(path, parent, -1, pool)
+        elif name in ('change_dir_prop', 'change_file_prop'):
+            method = getattr(editor, name)
+            method(batons[path], a, b, pool)
+        elif name == 'apply_textdelta':
+            editor.apply_textdelta(batons[path], a)
+        elif name == 'close_directory':
+            editor.close_directory(batons.pop(path))
+        elif name == 'close_file':
+            editor.close_file(batons.pop(path), a)
+        else:
+            raise ValueError("unknown replay cache action: %s" % name)
+
+def prime_replay_cache(args):
+    """
+    Loads (and discards) the changeset of every revision from @start_rev to
+    @end_rev of the repository at @repo_path that isn't already in its
+    replay cache, such that the cache holds them all afterwards.  @args is a
+    tuple of (repo_path, start_rev, end_rev, send_deltas), as this is run in
+    worker processes by `evnadmin analyze --jobs`.  Returns @end_rev.
+    """
+    from evn.change import ChangeSet
+
+    (repo_path, start_rev, end_rev, send_deltas) = args
+    cache = ReplayCache(replay_cache_path(repo_path))
+    options = Options(dict(send_deltas=send_deltas, replay_cache=cache))
+    try:
+        for rev in xrange(start_rev, end_rev+1):
+            if cache.has_rev(rev, send_deltas):
+                continue
+            cs = ChangeSet(repo_path, rev, options)
+            try:
+                cs.load()
+            finally:
+                cs.destroy()
+    finally:
+        cache.close()
+    return end_rev
+
+#===============================================================================
+# Classes
+#===============================================================================
+class ReplayRecorder(object):
+    """
+    An editor that forwards every callback made by svn.repos.replay2() to
+    @editor (a ChangeSet), recording each one in @events as a tuple of
+    (callback name, path, arg1, arg2) for ReplayCache.save().
+
+    Batons are recorded by the editor path they were opened with, which is
+    how replay() finds them again.  Property changes are recorded as the
+    properties @editor actually ended up changing, rather than the arguments
+    it was called with, so a metadata-only replay's "some properties
+    changed" placeholder is recorded as the real property changes, and the
+    proplists needed to work them out don't need to be consulted again.
+    """
+    def __init__(self, editor):
+        self.editor = editor
+        self.events = list()
+        self.__paths = dict()
+
+    def __record(self, name, path, a=None, b=None):
+        self.events.append((name, path, a, b))
+
+    def __opened(self, path, baton):
+        self.__paths[id(baton)] = path
+        return baton
+
+    def __path(self, baton):
+        return self.__paths[id(baton)]
+
+    def set_target_revision(self, rev):
+        self.editor.set_target_revision(rev)
+
+    def open_root(self, base_rev, pool):
+        self.__record('open_root', '')
+        return self.__opened('', self.editor.open_root(base_rev, pool))
+
+    def delete_entry(self, path, revision, parent, pool):
+        self.__record('delete_entry', path)
+        self.editor.delete_entry(path, revision, parent, pool)
+
+    def add_directory(self, path, parent, copied_from_path,
+                      copied_from_rev, dir_pool):
+        args = (path, copied_from_path, copied_from_rev)
+        self.__record('add_directory', *args)
+        baton = self.editor.add_directory(
+            path,
+            parent,
+            copied_from_path,
+            copied_from_rev,
+            dir_pool,
+        )
+        return self.__opened(path, baton)
+
+    def open_directory(self, path, parent, base_rev, dir_pool):
+        self.__record('open_directory', path)
+        baton = self.editor.open_directory(path, parent, base_rev, dir_pool)
+        return self.__opened(path, baton)
+
+    def __change_prop(self, name, change, prop_name, value, pool):
+        before = set(change._changed_props)
+        method = getattr(self.editor, name)
+        method(change, prop_name, value, pool)
+        path = self.__path(change)
+        changed = change._changed_props
+        for n in sorted(set(changed) - before):
+            self.__record(name, path, n, changed[n])
+
+    def change_dir_prop(self, change, name, value, pool):
+        self.__change_prop('change_dir_prop', change, name, value, pool)
+
+    def close_directory(self, change):
+        self.__record('close_directory', self.__path(change))
+        self.editor.close_directory(change)
+
+    def add_file(self, path, parent, copied_from_path,
+                 copied_from_rev, file_pool):
+        args = (path, copied_from_path, copied_from_rev)
+        self.__record('add_file', *args)
+        baton = self.editor.add_file(
+            path,
+            parent,
+            copied_from_path,
+            copied_from_rev,
+            file_pool,
+        )
+        return self.__opened(path, baton)
+
+    def open_file(self, path, parent, base_rev, file_pool):
+        self.__record('open_file', path)
+        baton = self.editor.open_file(path, parent, base_rev, file_pool)
+        return self.__opened(path, baton)
+
+    def apply_textdelta(self, change, base_checksum):
+        self.__record('apply_textdelta', self.__path(change), base_checksum)
+        return self.editor.apply_textdelta(change, base_checksum)
+
+    def change_file_prop(self, change, name, value, pool):
+        self.__change_prop('change_file_prop', change, name, value, pool)
+
+    def close_file(self, change, text_checksum):
+        self.__record('close_file', self.__path(change), text_checksum)
+        self.editor.close_file(change, text_checksum)
+
+class ReplayCache(object):
+    """
+    An SQLite cache (evn/db/replay.db) of the editor callbacks made by
+    svn.repos.replay2() when a revision's changeset is loaded, such that
+    subsequent loads of the same revision (i.e. re-analysing it, or running
+    `evnadmin show-changeset` against it) can be driven from the cache via
+    replay() instead of walking the revision's tree again.
+
+    Only revisions are cached (a transaction's tree can change until it is
+    committed), and a revision is only ever replayed from the cache by a
+    load with the same send_deltas setting it was recorded with.  Like the
+    root index, the cache is purely an optimisation: any failure to read or
+    write it results in the caller falling back to svn.repos.replay2().
+    The cache is enabled via the `replay-cache` configuration option, and
+    inspected and purged via `evnadmin show-replay-cache` and `evnadmin
+    purge-replay-cache`.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.__con = None
+
+    @property
+    def available(self):
+        return sqlite3 is not None
+
+    @property
+    def exists(self):
+        return self.available and os.path.isfile(self.path)
+
+    @property
+    def con(self):
+        if self.__con is None:
+            d = os.path.dirname(self.path)
+            if not os.path.isdir(d):
+                os.makedirs(d)
+            con = sqlite3.connect(self.path, timeout=30)
+            # Paths are handed straight back to code that expects str.
+            con.text_factory = str
+            con.executescript(REPLAY_CACHE_SQL)
+            self.__con = con
+        return self.__con
+
+    def close(self):
+        if self.__con is not None:
+            self.__con.close()
+            self.__con = None
+
+    def _has_rev(self, rev, send_deltas):
+        sql = "select send_deltas from revision where rev = ?"
+        row = self.con.execute(sql, (rev,)).fetchone()
+        return bool(row) and bool(row[0]) == bool(send_deltas)
+
+    def has_rev(self, rev, send_deltas):
+        """
+        Returns True if @rev is cached with the given @send_deltas setting.
+        """
+        if not self.exists:
+            return False
+        try:
+            return self._has_rev(rev, send_deltas)
+        except sqlite3.Error:
+            return False
+
+    def load(self, rev, send_deltas):
+        """
+        Returns the list of events recorded for @rev (suitable for passing
+        to replay()), or None if @rev isn't cached with the given
+        @send_deltas setting.
+        """
+        if not self.exists:
+            return
+        try:
+            return self._load(rev, send_deltas)
+        except sqlite3.Error:
+            return
+
+    def _load(self, rev, send_deltas):
+        if not self._has_rev(rev, send_deltas):
+            return
+
+        sql = (
+            "select a.name, a.path, "
+            "       e.copied_from_path, e.copied_from_rev, "
+            "       p.name, p.value, "
+            "       t.base_checksum, "
+            "       f.text_checksum "
+            "  from action a "
+            "  left join add_entry e on e.rev = a.rev and e.id = a.id "
+            "  left join change_prop p on p.rev = a.rev and p.id = a.id "
+            "  left join apply_textdelta t on t.rev = a.rev and t.id = a.id "
+            "  left join close_file f on f.rev = a.rev and f.id = a.id "
+            " where a.rev = ? "
+            " order by a.id"
+        )
+        events = list()
+        for row in self.con.execute(sql, (rev,)):
+            (name, path, cfp, cfr, prop_name, value, base, text) = row
+            table = ARGUMENT_TABLES.get(name)
+            if table == 'add_entry':
+                (a, b) = (cfp, cfr)
+            elif table == 'change_prop':
+                (a, b) = (prop_name, None if value is None else str(value))
+            elif table == 'apply_textdelta':
+                (a, b) = (base, None)
+            elif table == 'close_file':
+                (a, b) = (text, None)
+            else:
+                (a, b) = (None, None)
+            events.append((name, path, a, b))
+        return events
+
+    def save(self, rev, send_deltas, events):
+        """
+        Records @events (as collected by a ReplayRecorder) for @rev,
+        replacing anything previously recorded for it.  Returns False if the
+        cache couldn't be written.
+        """
+        if not self.available:
+            return False
+        try:
+            self._save(rev, send_deltas, events)
+            return True
+        except (sqlite3.Error, OSError):
+            return False
+
+    def _save(self, rev, send_deltas, events):
+        actions = list()
+        args = dict((t, list()) for t in set(ARGUMENT_TABLES.values()))
+        for (i, (name, path, a, b)) in enumerate(events):
+            actions.append((rev, i, name, path))
+            table = ARGUMENT_TABLES.get(name)
+            if table == 'add_entry':
+                args[table].append((rev, i, a, b))
+            elif table == 'change_prop':
+                value = None if b is None else sqlite3.Binary(b)
+                args[table].append((rev, i, a, value))
+            elif table:
+                args[table].append((rev, i, a))
+
+        with self.con as con:
+            self._purge(rev, rev)
+            con.executemany("insert into action values (?, ?, ?, ?)", actions)
+            for (table, rows) in args.items():
+                if not rows:
+                    continue
+                marks = ', '.join('?' * len(rows[0]))
+                sql = "insert into %s values (%s)" % (table, marks)
+                con.executemany(sql, rows)
+            sql = "insert into revision values (?, ?)"
+            con.execute(sql, (rev, int(bool(send_deltas))))
+
+    def _purge(self, start_rev, end_rev):
+        for table in REPLAY_CACHE_TABLES:
+            sql = "delete from %s where rev between ? and ?" % table
+            self.con.execute(sql, (start_rev, end_rev))
+
+    def purge(self, start_rev=None, end_rev=None, vacuum=True):
+        """
+        Discards everything cached for revisions @start_rev through @end_rev
+        (inclusive; either may be None to leave that end of the range open),
+        then, if @vacuum is True, compacts the database file.  Returns the
+        number of revisions that were purged.
+        """
+        if not self.exists:
+            return 0
+        if start_rev is None:
+            start_rev = 0
+        if end_rev is None:
+            end_rev = self.max_rev or 0
+        sql = "select count(*) from revision where rev between ? and ?"
+        with self.con as con:
+            count = con.execute(sql, (start_rev, end_rev)).fetchone()[0]
+            self._purge(start_rev, end_rev)
+        if vacuum:
+            self.con.execute("vacuum")
+        return count
+
+    @property
+    def max_rev(self):
+        row = self.con.execute("select max(rev) from revision").fetchone()
+        return row[0]
+
+    def stats(self):
+        """
+        Returns a tuple of (revision count, lowest revision, highest
+        revision, action count, size of the database file in bytes)
+        describing the cache's contents.
+        """
+        if not self.exists:
+            return (0, None, None, 0, 0)
+        sql = "select count(*), min(rev), max(rev) from revision"
+        (revisions, min_rev, max_rev) = self.con.execute(sql).fetchone()
+        sql = "select count(*) from action"
+        (actions,) = self.con.execute(sql).fetchone()
+        size = os.path.getsize(self.path)
+        return (revisions, min_rev, max_rev, actions, size)
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
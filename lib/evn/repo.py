@@ -8,6 +8,7 @@ import inspect
 import getpass
 import logging
 import datetime
+import marshal
 import itertools
 import contextlib
 import cStringIO as StringIO
@@ -45,6 +46,7 @@ from evn import logic
 from evn.path import (
     join_path,
     format_dir,
+    reduce_path,
     extract_component_name,
 
     PathMatcher,
@@ -53,9 +55,33 @@ from evn.path import (
 from evn.root import (
     Roots,
     RootPathMatcher,
+    RootMatcherCache,
     SimpleRootMatcher,
 )
 
+from evn.rootindex import (
+    RootIndex,
+    root_index_path,
+)
+
+from evn.replaycache import (
+    ReplayCache,
+    replay_cache_path,
+)
+
+from evn.mergeindex import (
+    MergeIndex,
+    load_merges,
+    changeset_merges,
+    merge_index_path,
+    has_mergeinfo_changes,
+)
+
+from evn.entitlements import (
+    EntitlementsCache,
+    entitlements_cache_path,
+)
+
 from evn.change import (
     ChangeSet,
     ChangeType,
@@ -63,15 +89,24 @@ from evn.change import (
     ExtendedPropertyChangeType,
 )
 
+from evn.perfmon import (
+    PhaseTracker,
+)
+
 from evn.util import (
     one,
     none,
     is_int,
     try_int,
     memoize,
-    pid_exists,
     literal_eval,
+    plain_value,
+    decode_propval,
+    try_remove_file,
     implicit_context,
+    encode_compact_propval,
+    create_locked_pid_file,
+    wait_for_pid_file_release,
     strip_linesep_if_present,
     Pool,
     Dict,
@@ -85,8 +120,11 @@ from evn.util import (
 from evn.constants import (
     EVN_BRPROPS_SCHEMA,
     EVN_BRPROPS_SCHEMA_VERSION,
+    EVN_BRPROPS_COMPACT_VERSIONS,
     EVN_RPROPS_SCHEMA,
     EVN_RPROPS_SCHEMA_VERSION,
+    EVN_RPROPS_COMPACT_VERSIONS,
+    EVN_RPROPS_DELTA_ROOTS_VERSIONS,
     EVN_ERROR_CONFIRMATIONS,
     n,  # Notes
     w,  # Warnings
@@ -94,6 +132,14 @@ from evn.constants import (
     format_file_exceeds_max_size_error,
 )
 
+#===============================================================================
+# Globals
+#===============================================================================
+# Bounds (in seconds) of the interval used when polling for the base rev's
+# lock file in _init_evn_v1().
+REVLOCK_POLL_MIN = 0.01
+REVLOCK_POLL_MAX = 0.25
+
 #===============================================================================
 # Change Attributes
 #===============================================================================
@@ -367,7 +413,6 @@ _load_change_attributes()
 #===============================================================================
 # Repository-related Configuration Classes
 #===============================================================================
-
 class AbstractRepositoryConfig(dict):
     __metaclass__ = ABCMeta
 
@@ -376,6 +421,11 @@ class AbstractRepositoryConfig(dict):
         self.__conf = k.conf
         k.assert_empty(self)
 
+        # Batching state (see batch()).  Pending values are kept as-is and
+        # only converted and written when the batch is flushed.
+        self._batch_depth = 0
+        self._pending = dict()
+
     @property
     def conf(self):
         return self.__conf
@@ -430,7 +480,10 @@ class AbstractRepositoryConfig(dict):
         self._set(name, None, default=default, skip_reload=skip_reload)
 
     def __contains__(self, key):
-        return self._format_propname(key) in self._proplist
+        name = self._format_propname(key)
+        if name in self._pending:
+            return self._pending[name] is not None
+        return name in self._proplist
 
     def _format_propname(self, name):
         assert name and name[0] != '_'
@@ -458,11 +511,64 @@ class AbstractRepositoryConfig(dict):
     def _set(self, name, value, default=False, skip_reload=False):
         name = self._format_propname(name)
 
+        if self._batch_depth:
+            self._pending[name] = value
+        else:
+            self._store(name, value)
+
+        if not skip_reload:
+            self._reload()
+
+    def _store(self, name, value):
         if value is not None:
-            value = self._try_convert(value, name, itertools.count(0))
+            value = self._encode(name, value)
         self._write(name, value)
 
-        if not skip_reload:
+    def _encode(self, name, value):
+        return self._try_convert(value, name, itertools.count(0))
+
+    def _decode(self, name, value):
+        return decode_propval(value)
+
+    @property
+    def is_batching(self):
+        return bool(self._batch_depth)
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Context manager that defers writing any properties modified within
+        it until it exits, at which point each modified property is written
+        exactly once, with its final value.  Whilst batching, the in-memory
+        values reflect any pending modifications.  Batches can be nested;
+        only the outermost one writes.  If the block raises, the pending
+        modifications are discarded.
+        """
+        self._begin_batch()
+        try:
+            yield self
+        except:
+            self._end_batch(flush=False)
+            raise
+        else:
+            self._end_batch()
+
+    def _begin_batch(self):
+        self._batch_depth += 1
+
+    def _end_batch(self, flush=True):
+        assert self._batch_depth > 0
+        self._batch_depth -= 1
+        if self._batch_depth:
+            return
+
+        pending = self._pending
+        self._pending = dict()
+        if flush:
+            for (name, value) in pending.items():
+                self._store(name, value)
+        elif pending:
+            # Bring our in-memory values back in line with what's stored.
             self._reload()
 
     def _try_convert(self, orig_value, propname, attempts):
@@ -540,7 +646,7 @@ class AbstractRepositoryConfig(dict):
                 continue
 
             try:
-                v = literal_eval(value)
+                v = self._decode(key, value)
             except:
                 m = e.PropertyValueLiteralEvalFailed % (key, value)
                 raise ValueError(m)
@@ -549,15 +655,121 @@ class AbstractRepositoryConfig(dict):
             d[self._unformat_propname(key)] = v
 
         self._reload_complete(d)
+
+        for (name, value) in self._pending.items():
+            if value is not None:
+                value = self._reload_value(name, plain_value(value))
+            d[self._unformat_propname(name)] = value
+
         self.clear()
         self.update(d)
 
+class RevPropCache(dict):
+    """
+    Maps (fs, rev) tuples to a dict of the decoded revision properties of
+    rev, as seen by RepositoryRevisionConfig._reload().  Each property is
+    kept as a (raw value, marshalled decoded value) tuple, and a decoded
+    value is only handed out if the raw value it was decoded from matches
+    the one just read from the repository, so entries never need to be
+    trusted across processes (i.e. whilst _init_evn_v1() polls for another
+    process's evn:last_rev); all they save is the literal_eval() (or
+    marshal.loads()) of unchanged values.  Each value is unmarshalled
+    afresh, so callers are free to modify it.
+
+    Writes made via RepositoryRevisionConfig._write() update the raw value
+    of the cached entry, if any (see write()).  Like ProplistCache, the
+    cache is simply emptied once it reaches @max_size entries.
+
+    >>> c = RevPropCache(max_size=2)
+    >>> c.decode('fs', 1, 'evn:roots', "{'/trunk/': {}}")
+    {'/trunk/': {}}
+    >>> c.decode('fs', 1, 'evn:roots', "{'/trunk/': {}}")
+    {'/trunk/': {}}
+    >>> (c.hits, c.misses)
+    (1, 1)
+    >>> c.write('fs', 1, 'evn:roots', "{}")
+    >>> c.decode('fs', 1, 'evn:roots', "{}")
+    {}
+    >>> (c.hits, c.misses)
+    (1, 2)
+    """
+    def __init__(self, max_size=256):
+        dict.__init__(self)
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, fs, rev):
+        # Keying on the fs object's id (rather than the object itself) saves
+        # us from keeping the fs (and its pool) alive; a recycled id can't
+        # do any harm given every value is checked against its raw value.
+        return (id(fs), rev)
+
+    def decode(self, fs, rev, name, value):
+        """
+        Returns decode_propval(@value), @value being the raw value of the
+        property @name of @rev in @fs.
+        """
+        key = self._key(fs, rev)
+        props = self.get(key)
+        if props is not None:
+            (raw, data) = props.get(name, (None, None))
+            if data is not None and raw == value:
+                self.hits += 1
+                return marshal.loads(data)
+
+        self.misses += 1
+        decoded = decode_propval(value)
+        try:
+            data = marshal.dumps(decoded)
+        except ValueError:
+            return decoded
+
+        if props is None:
+            if len(self) >= self.max_size:
+                self.clear()
+            props = self[key] = dict()
+        props[name] = (value, data)
+        return decoded
+
+    def write(self, fs, rev, name, value):
+        """
+        Called after the property @name of @rev in @fs has been set to the
+        raw @value (None if it was deleted).
+        """
+        props = self.get(self._key(fs, rev))
+        if props is None:
+            return
+        if value is None:
+            props.pop(name, None)
+        else:
+            props[name] = (value, None)
+
+    def invalidate(self, fs, rev):
+        self.pop(self._key(fs, rev), None)
+
+    @property
+    def stats(self):
+        return Dict(
+            hits=self.hits,
+            misses=self.misses,
+            entries=len(self),
+            max_size=self.max_size,
+        )
+
+# Shared by every RepositoryRevisionConfig in the process (unless disabled
+# via the 'revprop-cache-size' config option), so that revisions re-read by
+# successive rconf() calls, and successive RepositoryRevOrTxn instances
+# (i.e. `evnadmin analyze`), are only decoded once.
+revprop_cache = RevPropCache()
+
 class RepositoryRevisionConfig(AbstractRepositoryConfig):
     def __init__(self, **kwds):
         k = DecayDict(kwds)
         AbstractRepositoryConfig.__init__(self, conf=k.conf)
         self.__fs = k.fs
         self.__rev = k.get('rev')
+        self.__journal = k.get('journal')
         self.__readonly = False
         self.__is_txn = False
         if self.rev is None:
@@ -578,17 +790,77 @@ class RepositoryRevisionConfig(AbstractRepositoryConfig):
         self.__saw_roots_modification = False
         self.__updated_roots_modified_at = False
 
+        # Internal state helpers for delta-encoded roots (see _set()).
+        self.__rprop_schema_version = None
+        self.__brprop_schema_version = None
+        self.__roots_index = None
+        self.__roots_delta = None
+        self.__roots_checkpoint = None
+        self.__has_full_roots = False
+        self.__base_roots_index = None
+
+        # Decoded values are shared via the process-wide revprop cache.
+        self.__revprop_cache = None
+        size = self.conf.revprop_cache_size
+        if size:
+            revprop_cache.max_size = size
+            self.__revprop_cache = revprop_cache
+
         assert self.rev >= 0
 
         self._reload()
 
     @property
     def rprop_schema_version(self):
-        return 1
+        """
+        The schema version used when writing revision properties, as recorded
+        in the evn:rprops_version property of r0.  (Reading is always driven
+        by whichever properties are actually present on a revision, so a
+        repository can be read mid-migration.)
+        """
+        if self.__rprop_schema_version is None:
+            name = self._format_propname('rprops_version')
+            value = self._rev_proplist(0).get(name)
+            version = try_int(value) or EVN_RPROPS_SCHEMA_VERSION
+            if version not in EVN_RPROPS_SCHEMA:
+                known = ', '.join(str(v) for v in sorted(EVN_RPROPS_SCHEMA))
+                raise ValueError(e.UnknownRpropsSchemaVersion % (value, known))
+            self.__rprop_schema_version = version
+        return self.__rprop_schema_version
 
     @property
     def brprop_schema_version(self):
-        return 1
+        """
+        The schema version of the base revision properties (i.e. r0), as
+        recorded in the evn:version property of r0.
+        """
+        if self.__brprop_schema_version is None:
+            name = self._format_propname('version')
+            value = self._rev_proplist(0).get(name)
+            version = try_int(value) or EVN_BRPROPS_SCHEMA_VERSION
+            self.__brprop_schema_version = version
+        return self.__brprop_schema_version
+
+    @property
+    def writes_compact_values(self):
+        if self.rev == 0:
+            return self.brprop_schema_version in EVN_BRPROPS_COMPACT_VERSIONS
+        else:
+            return self.rprop_schema_version in EVN_RPROPS_COMPACT_VERSIONS
+
+    def _encode(self, name, value):
+        if self.writes_compact_values and isinstance(value, (dict, list)):
+            return encode_compact_propval(value)
+        return AbstractRepositoryConfig._encode(self, name, value)
+
+    def _decode(self, name, value):
+        return self._decode_at(self.rev, name, value)
+
+    def _decode_at(self, rev, name, value):
+        cache = self.__revprop_cache
+        if cache is None:
+            return decode_propval(value)
+        return cache.decode(self.fs, rev, name, value)
 
     @property
     def pool(self):
@@ -606,6 +878,10 @@ class RepositoryRevisionConfig(AbstractRepositoryConfig):
     def is_txn(self):
         return self.__is_txn
 
+    @property
+    def journal(self):
+        return self.__journal
+
     @property
     def readonly(self):
         return self.__readonly
@@ -620,40 +896,262 @@ class RepositoryRevisionConfig(AbstractRepositoryConfig):
 
     def __reload_brprop_value(self, name, value):
         args = (self, name, value)
-        if self.brprop_schema_version == 1:
+        if self.brprop_schema_version in EVN_BRPROPS_SCHEMA:
             return AbstractRepositoryConfig._reload_value(*args)
         else:
             raise UnexpectedCodePath()
 
     def __reload_rprop_value(self, name, value):
         args = (self, name, value)
-        if self.rprop_schema_version == 1:
-            if name == self._format_propname('roots'):
-                return Roots(self, value)
-            else:
-                return AbstractRepositoryConfig._reload_value(*args)
+        if name == self._format_propname('roots'):
+            return Roots(self, value)
+        elif name in self.__roots_delta_propnames:
+            # Raw storage for delta-encoded roots; see __reload_roots().
+            return value
         else:
-            raise UnexpectedCodePath()
+            return AbstractRepositoryConfig._reload_value(*args)
 
     def _reload_complete(self, d):
         if self.rev == 0:
+            # Pick up any changes to our version (i.e. via migrate-rprops).
+            version = d.get('version')
+            if version in EVN_BRPROPS_SCHEMA:
+                self.__brprop_schema_version = version
             default = EVN_BRPROPS_SCHEMA[self.brprop_schema_version]
         else:
-            default = EVN_RPROPS_SCHEMA[self.rprop_schema_version]
+            self.__reload_roots(d)
+            default = EVN_RPROPS_SCHEMA[EVN_RPROPS_SCHEMA_VERSION]
         keys = (self._unformat_propname(k) for k in default.keys())
         d.update((k, None) for k in keys if k not in d)
 
+    @property
+    def __roots_delta_propnames(self):
+        return (
+            self._format_propname('roots_delta'),
+            self._format_propname('roots_checkpoint'),
+        )
+
+    @staticmethod
+    def _index_roots(roots):
+        """
+        Returns a dict mapping each root path in @roots to the revision it
+        was created in.
+        """
+        return dict((p, r['created']) for (p, r) in dict.items(roots))
+
+    @staticmethod
+    def _apply_roots_delta(index, delta):
+        for path in delta['removed']:
+            index.pop(path, None)
+        for (path, root) in delta['added'].items():
+            index[path] = root['created']
+
+    def _rev_proplist(self, rev):
+        if rev == self.rev:
+            return self._proplist
+        if self.journal is not None:
+            return self.journal.proplist(rev)
+        with self.pool as pool:
+            return svn.fs.revision_proplist(self.fs, rev, pool)
+
+    def _roots_index_at(self, rev):
+        """
+        Returns the roots index (see _index_roots()) for @rev, or None if @rev
+        doesn't have any roots recorded.  Works for both full and delta-encoded
+        roots; for the latter, we walk back to the nearest revision holding a
+        checkpoint (or full roots) and apply the deltas from there forward.
+        """
+        (roots_name, delta_name, checkpoint_name) = (
+            self._format_propname('roots'),
+            self._format_propname('roots_delta'),
+            self._format_propname('roots_checkpoint'),
+        )
+
+        index = None
+        deltas = list()
+        while rev > 0:
+            props = self._rev_proplist(rev)
+            if delta_name in props:
+                if checkpoint_name in props:
+                    value = props[checkpoint_name]
+                    index = self._decode_at(rev, checkpoint_name, value)
+                    break
+                value = props[delta_name]
+                deltas.append(self._decode_at(rev, delta_name, value))
+            elif roots_name in props:
+                value = props[roots_name]
+                roots = self._decode_at(rev, roots_name, value)
+                index = self._index_roots(roots)
+                break
+            else:
+                return
+            rev -= 1
+
+        if index is None:
+            # We walked all the way back to r0, which never has roots.
+            index = dict()
+
+        for delta in reversed(deltas):
+            self._apply_roots_delta(index, delta)
+
+        return index
+
+    @property
+    def _base_roots_index(self):
+        if self.__base_roots_index is None:
+            self.__base_roots_index = self._roots_index_at(self.rev - 1)
+        return self.__base_roots_index
+
+    @_base_roots_index.setter
+    def _base_roots_index(self, index):
+        # Allows callers that already know the previous revision's roots
+        # (i.e. when walking a range of revisions) to avoid rebuilding them.
+        self.__base_roots_index = index
+
+    def __reload_roots(self, d):
+        delta = d.pop('roots_delta', None)
+        checkpoint = d.pop('roots_checkpoint', None)
+
+        self.__roots_index = None
+        self.__roots_delta = None
+        self.__roots_checkpoint = None
+        self.__has_full_roots = False
+
+        if delta is None:
+            roots = d.get('roots')
+            if roots is not None:
+                self.__has_full_roots = True
+                self.__roots_index = self._index_roots(roots)
+            return
+
+        if checkpoint is not None:
+            index = dict(checkpoint)
+        else:
+            index = self._base_roots_index
+            if index is None:
+                # The delta is useless without the previous revision's roots;
+                # treat the revision as having no roots at all.
+                d['roots'] = None
+                return
+            index = dict(index)
+            self._apply_roots_delta(index, delta)
+
+        # Present the roots exactly as they'd appear had they been stored in
+        # full: roots inherited from prior revisions only carry their created
+        # revision, roots created in this revision carry everything.
+        roots = dict((p, { 'created': c }) for (p, c) in index.items())
+        roots.update(delta['added'])
+
+        self.__roots_index = index
+        self.__roots_delta = delta
+        self.__roots_checkpoint = checkpoint
+        d['roots'] = Roots(self, roots)
+
+    def _store(self, name, value):
+        if self.rev == 0 or self._unformat_propname(name) != 'roots':
+            return AbstractRepositoryConfig._store(self, name, value)
+
+        if self.readonly:
+            return
+
+        if self.rprop_schema_version in EVN_RPROPS_DELTA_ROOTS_VERSIONS:
+            self.__write_roots_delta(value)
+        else:
+            self.__write_roots(value)
+
+    def __write_roots(self, roots):
+        (delta_name, checkpoint_name) = self.__roots_delta_propnames
+        if self.__roots_delta is not None:
+            self._write(delta_name, None)
+            self.__roots_delta = None
+        if self.__roots_checkpoint is not None:
+            self._write(checkpoint_name, None)
+            self.__roots_checkpoint = None
+
+        name = self._format_propname('roots')
+        AbstractRepositoryConfig._store(self, name, roots)
+        self.__has_full_roots = roots is not None
+        if roots is not None:
+            self.__roots_index = self._index_roots(roots)
+
+    def __write_roots_delta(self, roots):
+        (delta_name, checkpoint_name) = self.__roots_delta_propnames
+
+        if self.__has_full_roots:
+            self._write(self._format_propname('roots'), None)
+            self.__has_full_roots = False
+
+        if roots is None:
+            self._write(delta_name, None)
+            if self.__roots_checkpoint is not None:
+                self._write(checkpoint_name, None)
+            self.__roots_index = None
+            self.__roots_delta = None
+            self.__roots_checkpoint = None
+            return
+
+        index = self._index_roots(roots)
+        stored_checkpoint = self.__roots_checkpoint
+        checkpoint = (
+            stored_checkpoint is not None or
+            self.rev % self.conf.roots_checkpoint_interval == 0
+        )
+
+        if self.__roots_delta is not None and index == self.__roots_index:
+            # Only the details of existing roots have changed (i.e. a root
+            # has been marked as removed or copied), which is by far the
+            # most common case, and doesn't require the base revision's
+            # roots in order to work out what was added and removed.
+            added = self.__roots_delta['added'].keys()
+            removed = self.__roots_delta['removed']
+        else:
+            base = self._base_roots_index
+            if base is None:
+                # The previous revision has no roots (which shouldn't happen
+                # during normal processing), so we can't encode a delta
+                # against it; a checkpoint suffices on its own.
+                base = dict()
+                checkpoint = True
+            added = [ p for (p, c) in index.items() if base.get(p) != c ]
+            removed = sorted(p for (p, c) in base.items() if index.get(p) != c)
+
+        delta = dict(
+            added=dict((p, dict.__getitem__(roots, p)) for p in added),
+            removed=removed,
+        )
+        self._write(delta_name, self._encode(delta_name, delta))
+
+        if checkpoint:
+            if stored_checkpoint != index:
+                value = self._encode(checkpoint_name, index)
+                self._write(checkpoint_name, value)
+            stored_checkpoint = index
+
+        self.__roots_index = index
+        self.__roots_delta = delta
+        self.__roots_checkpoint = stored_checkpoint
+
     @property
     def _proplist(self):
+        if self.journal is not None:
+            return self.journal.proplist(self.rev)
         with self.pool as pool:
             return svn.fs.revision_proplist(self.fs, self.rev, pool)
 
     def _write(self, name, value):
-        if not self.readonly:
-            with self.pool as pool:
-                svn.fs.change_rev_prop(self.fs, self.rev, name, value, pool)
+        if self.readonly:
+            return
+        if self.journal is not None:
+            self.journal.write(self.rev, name, value)
+            return
+        with self.pool as pool:
+            svn.fs.change_rev_prop(self.fs, self.rev, name, value, pool)
+        if self.__revprop_cache is not None:
+            self.__revprop_cache.write(self.fs, self.rev, name, value)
 
     def _read(self, name):
+        if self.journal is not None:
+            return self.journal.read(self.rev, name)
         with self.pool as pool:
             return svn.fs.revision_prop(self.fs, self.rev, name, pool)
 
@@ -683,6 +1181,97 @@ class RepositoryRevisionConfig(AbstractRepositoryConfig):
             self._roots_modified()
         AbstractRepositoryConfig._save(self, name, value)
 
+class RevPropJournal(object):
+    """
+    Records revision property writes instead of applying them.
+
+    A journal is attached to RepositoryRevisionConfig instances via the
+    'journal' keyword; reads are served from the underlying revision with
+    any pending writes overlaid, so the usual root processing logic can run
+    unmodified against a revision that hasn't been committed yet (i.e. the
+    revision a pre-commit transaction will become).  Revisions greater than
+    `base_rev` are treated as empty.
+
+    The first value seen for each property is remembered, which allows the
+    journal to be replayed later (see `apply_changes()`) only if nothing
+    else has modified the properties in the interim.
+    """
+    def __init__(self, fs, base_rev):
+        self.fs = fs
+        self.base_rev = base_rev
+        self.__pending = dict()
+        self.__original = dict()
+        self.__order = list()
+
+    def __revision_proplist(self, rev):
+        if rev > self.base_rev:
+            return dict()
+        with Pool() as pool:
+            return svn.fs.revision_proplist(self.fs, rev, pool)
+
+    def proplist(self, rev):
+        props = self.__revision_proplist(rev)
+        pending = self.__pending.get(rev)
+        if not pending:
+            return props
+
+        props = dict(props)
+        for (name, value) in pending.items():
+            if value is None:
+                props.pop(name, None)
+            else:
+                props[name] = value
+        return props
+
+    def read(self, rev, name):
+        pending = self.__pending.get(rev, {})
+        if name in pending:
+            return pending[name]
+        return self.__revision_proplist(rev).get(name)
+
+    def write(self, rev, name, value):
+        key = (rev, name)
+        if key not in self.__original:
+            self.__original[key] = self.read(rev, name)
+            self.__order.append(key)
+
+        if rev not in self.__pending:
+            self.__pending[rev] = dict()
+        self.__pending[rev][name] = value
+
+    @property
+    def changes(self):
+        """
+        Returns a list of (rev, name, old_value, new_value) tuples, ordered
+        by when each property was first written.  Properties that ended up
+        with the same value they started with are omitted.
+        """
+        changes = list()
+        for (rev, name) in self.__order:
+            old_value = self.__original[(rev, name)]
+            new_value = self.__pending[rev][name]
+            if old_value != new_value:
+                changes.append((rev, name, old_value, new_value))
+        return changes
+
+def apply_changes(fs, changes):
+    """
+    Applies the (rev, name, old_value, new_value) tuples in @changes (see
+    RevPropJournal.changes) to the revision properties of @fs.  Returns False
+    without changing anything if any of the properties no longer hold their
+    old_value, True otherwise.
+    """
+    with Pool() as pool:
+        for (rev, name, old_value, new_value) in changes:
+            if svn.fs.revision_prop(fs, rev, name, pool) != old_value:
+                return False
+
+        for (rev, name, old_value, new_value) in changes:
+            svn.fs.change_rev_prop(fs, rev, name, new_value, pool)
+            revprop_cache.write(fs, rev, name, new_value)
+
+    return True
+
 #===============================================================================
 # Fatal Errors
 #===============================================================================
@@ -739,6 +1328,21 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
         self.__changeset                        = None
         self.__changeset_initialised            = False
 
+        # (phase, seconds) tuples for each top-level phase of the changeset's
+        # analysis, in the order they ran, and the perfmon.PhaseTracker with
+        # the full (nested) breakdown; see changeset.
+        self.phase_times                        = list()
+        self.tracker                            = None
+
+        self.__journal                          = None
+
+        self.__root_index                       = None
+        self.__rootmatcher_cache                = None
+        self.__merge_index                      = None
+
+        self.__batched                          = None
+        self.__batched_rconfs                   = None
+
         self.__rootchangeset                    = None
         self.__rootchangeset_initialised        = False
 
@@ -750,6 +1354,7 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
         self.__last_rev                         = int()
         self.__revlock_file                     = str()
         self.__base_revlock_file                = str()
+        self.__rev_lock                         = None
         self.__base_rev_roots                   = dict()
 
         self.__closed                           = False
@@ -784,6 +1389,18 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
             self.conf.exempt_symlinks_from_blocked_file_extensions
         )
 
+        if self.conf.replay_text_deltas:
+            self.options.send_deltas = True
+
+        if self.conf.streaming_analysis:
+            self.options.spill_files = True
+
+        # The cache is shared (via our options) by every RepositoryRevOrTxn
+        # an evnadmin command creates, so they share one connection, too.
+        if self.conf.replay_cache and not self.options.replay_cache:
+            path = replay_cache_path(self.path)
+            self.options.replay_cache = ReplayCache(path)
+
     def __enter__(self):
         assert self.entered is False
         self.entered = True
@@ -792,9 +1409,22 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
         return self
 
     def __exit__(self, *exc_info):
+        if self.__batched_rconfs is not None:
+            self._end_revprop_batch(flush=exc_info[0] is None)
         if self.__changeset_initialised:
             self.__changeset.destroy()
             self.__changeset = None
+        if self.__rev_lock is not None:
+            # Releasing the lock wakes anyone blocked on our rev's lock file
+            # in _init_evn_v1().
+            self.__rev_lock.close()
+            self.__rev_lock = None
+        if self.__root_index is not None:
+            self.__root_index.close()
+            self.__root_index = None
+        if self.__merge_index is not None:
+            self.__merge_index.close()
+            self.__merge_index = None
         self.pool.destroy()
         RepositoryRevOrTxn.active = None
         self.exited = True
@@ -915,6 +1545,40 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
     def is_repository_hook(self):
         return False
 
+    @property
+    def records_txn_analysis(self):
+        """
+        Returns True if the evn:* revprop changes that would be made for a
+        transaction (had it already been committed) should be recorded in a
+        journal whilst it is being processed.  See save_txn_analysis().
+        """
+        return False
+
+    @property
+    def is_journaling(self):
+        return self.__journal is not None
+
+    @property
+    def updates_roots(self):
+        return self.is_rev or self.is_journaling
+
+    @property
+    def roots_rev(self):
+        """
+        The revision whose evn:roots we're updating.  When journaling a txn,
+        this is the revision the txn will become if it's committed cleanly.
+        """
+        if self.is_rev:
+            return self.rev
+        assert self.is_journaling
+        return self.base_rev + 1
+
+    def _start_journal(self, base_rev):
+        self.__journal = RevPropJournal(self.fs, base_rev)
+        self.r0_revprop_conf = self.rconf(rev=0)
+        self.__revprop_conf_initialised = False
+        self.__base_revprop_conf_initialised = False
+
     def _init_evn(self):
         self.is_rev_for_empty_repo = self.is_rev and self.rev == 0
         self.is_rev_for_first_commit = self.is_rev and self.rev == 1
@@ -953,11 +1617,13 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
             rc0.version = EVN_BRPROPS_SCHEMA_VERSION
 
         version = self._load_evn_revprop_int('version', 1)
-        if version != EVN_BRPROPS_SCHEMA_VERSION:
-            m = e.VersionMismatch % (EVN_BRPROPS_SCHEMA_VERSION, version)
+        if version not in EVN_BRPROPS_SCHEMA:
+            m = e.VersionMismatch % (max(EVN_BRPROPS_SCHEMA), version)
             self.die(m)
 
-        if version == 1:
+        # Version 2 only differs from version 1 in how values are encoded,
+        # which RepositoryRevisionConfig takes care of.
+        if version in (1, 2):
             self._init_evn_v1()
         else:
             raise UnexpectedCodePath
@@ -1015,14 +1681,15 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
         except:
             pass
 
+        if self.is_txn and self.records_txn_analysis:
+            self._start_journal(self.base_rev)
+
         brc = self.base_revprop_conf
         assert isinstance(brc.roots, Roots)
-        if self.is_txn:
+        if not self.updates_roots:
             self.__roots = (brc, brc.roots)
             return
 
-        assert self.is_rev
-
         rc = self.revprop_conf
 
         # XXX force override for now.
@@ -1064,7 +1731,7 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
         else:
             assert self.base_rev >= 1
 
-        max_revlock_waits = self.conf.get('main', 'max-revlock-waits')
+        max_revlock_waits = self.conf.max_revlock_waits
 
         # Quick sanity check of last_rev to make sure it's not higher than the
         # highest rev of the repository.
@@ -1074,10 +1741,11 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
             self.die(e.LastRevTooHigh % (self.last_rev, highest_rev))
 
         if self.is_rev and self.is_repository_hook:
-            with open(self.rev_lockfile, 'w') as f:
-                f.write(str(os.getpid()))
-                f.flush()
-                f.close()
+            self.__rev_lock = create_locked_pid_file(self.rev_lockfile)
+
+        if self.is_txn and self.conf.async_post_commit:
+            if self.last_rev < self.base_rev and self._init_from_last_rev():
+                return
 
         if self.good_last_rev and self.good_base_rev_roots:
             self._last_rev_and_base_rev_roots_are_good()
@@ -1086,8 +1754,14 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
         a = (str(self.rev_or_txn), self.base_rev, self.last_rev)
         self._dbg('rev_or_txn: %s, base_rev: %d, last_rev: %d' % a)
 
+        # The base rev's post-commit creates its lock file as soon as it
+        # starts (see create_locked_pid_file()); until then, there's nothing
+        # to block on, so poll for it, backing off from REVLOCK_POLL_MIN to
+        # REVLOCK_POLL_MAX seconds, for up to max-revlock-waits seconds.
         found = False
         fn = self.base_rev_lockfile
+        delay = REVLOCK_POLL_MIN
+        deadline = time.time() + max_revlock_waits
         count = itertools.count()
         while True:
             c = count.next()
@@ -1096,37 +1770,27 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
                 found = True
                 self._dbg('found revlock after %d attempts' % c)
                 break
-            time.sleep(1)
-            if c == max_revlock_waits:
+            if self.good_last_rev:
+                break
+            if time.time() >= deadline:
                 self._dbg('no revlock found after %d attempts' % c)
                 break
+            time.sleep(delay)
+            delay = min(delay * 2, REVLOCK_POLL_MAX)
 
         if self.good_last_rev and self.good_base_rev_roots:
             self._last_rev_and_base_rev_roots_are_good()
             return
 
         if found:
-            s = None
-            try:
-                s = open(fn, 'r').read()
-            except:
-                pass
-            if not s:
+            # Block until the base rev's post-commit releases its lock file,
+            # which happens when it finishes or dies.
+            self._dbg('waiting for release of lock file %s' % fn)
+            pid = wait_for_pid_file_release(fn)
+            if not pid:
                 self._dbg('failed to open/read lock file %s' % fn)
             else:
-                try:
-                    pid = int(s)
-                    self._dbg("pid for lock file %s: %d" % (fn, pid))
-                except:
-                    self._dbg("invalid pid for lock file %s: %s" % (fn, s))
-                else:
-                    count = itertools.count()
-                    still_running = pid_exists(pid)
-                    while still_running:
-                        a = (count.next(), pid)
-                        self._dbg("[%d] pid %d is still running" % a)
-                        time.sleep(1)
-                        still_running = pid_exists(pid)
+                self._dbg('lock file %s released by pid %d' % (fn, pid))
 
         good_last_rev = self.good_last_rev
         good_base_rev_roots = self.good_base_rev_roots
@@ -1142,6 +1806,74 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
 
         raise UnexpectedCodePath
 
+    def _init_from_last_rev(self):
+        """
+        When post-commit processing is asynchronous, the txn's base rev may
+        not have been processed yet, in which case we'd normally have to wait
+        for its evn:roots to be finalised.  That's only necessary if the txn
+        touches paths that have been touched by any of the pending revs,
+        though; if it doesn't, the roots of the last processed rev are just
+        as good.  Returns True if that was the case and our roots have been
+        initialised accordingly, False if we need to wait.
+        """
+        lrc = self.rconf(base_rev=self.last_rev)
+        if not isinstance(lrc.roots, Roots):
+            return False
+
+        if self._txn_depends_on_pending_revs():
+            return False
+
+        self.__roots = (lrc, lrc.roots)
+        return True
+
+    def _txn_depends_on_pending_revs(self):
+        # Changes to '/' don't have any bearing on roots, so it's excluded.
+        lineage = lambda path: [
+            p for p in reduce_path(path.rstrip('/') + '/') if p != '/'
+        ]
+
+        def changed_paths(root):
+            # Returns a list of (path, copyfrom_rev) tuples for all paths
+            # changed in @root (copy sources included), or None if the copy
+            # details can't be determined cheaply.
+            paths = list()
+            changes = svn.fs.paths_changed2(root, self.pool)
+            for (path, change) in changes.items():
+                if not change.copyfrom_known:
+                    return
+                paths.append((path, None))
+                if change.copyfrom_path:
+                    paths.append((change.copyfrom_path, change.copyfrom_rev))
+            return paths
+
+        changes = changed_paths(self.root)
+        if changes is None:
+            return True
+
+        txn_paths = set()
+        txn_lineage = set()
+        for (path, copyfrom_rev) in changes:
+            if copyfrom_rev is not None and copyfrom_rev > self.last_rev:
+                return True
+            paths = lineage(path)
+            if paths:
+                txn_paths.add(paths[0])
+                txn_lineage.update(paths)
+
+        for rev in xrange(self.last_rev+1, self.base_rev+1):
+            root = svn.fs.revision_root(self.fs, rev, self.pool)
+            changes = changed_paths(root)
+            if changes is None:
+                return True
+            for (path, copyfrom_rev) in changes:
+                paths = lineage(path)
+                if paths and paths[0] in txn_lineage:
+                    return True
+                if any(p in txn_paths for p in paths):
+                    return True
+
+        return False
+
     def _dbg(self, msg):
         pass
 
@@ -1187,7 +1919,7 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
         (c, d) = self.__roots
         assert isinstance(c, RepositoryRevisionConfig)
         assert isinstance(d, dict)
-        if self.is_txn:
+        if not self.updates_roots:
             assert c.readonly
             paths = d.keys()
         else:
@@ -1195,7 +1927,8 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
             # It's important we only initialise our rootmatcher with paths
             # that weren't created in the same rev as us, otherwise, all the
             # root matching logic in the _process_*() methods will break.
-            paths = (k for (k, v) in d.items() if v['created'] != self.rev)
+            rev = self.roots_rev
+            paths = (k for (k, v) in d.items() if v['created'] != rev)
 
         self.rootmatcher = SimpleRootMatcher(set(paths))
         if self.is_txn_for_first_commit:
@@ -1207,9 +1940,9 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
 
     def __init_evn_dir_v1(self):
         self.__evn_dir = join_path(self.path, 'evn')
-        self.__evn_db_dir = join_path(self.path, 'db')
-        self.__evn_logs_dir = join_path(self.path, 'logs')
-        self.__evn_locks_dir = join_path(self.path, 'locks')
+        self.__evn_db_dir = join_path(self.__evn_dir, 'db')
+        self.__evn_logs_dir = join_path(self.__evn_dir, 'logs')
+        self.__evn_locks_dir = join_path(self.__evn_dir, 'locks')
 
         dirs = (
             self.__evn_dir,
@@ -1229,7 +1962,8 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
         self.__base_rev_lockfile = f
 
         if self.is_rev:
-            self.__rev_lockfile = join_path(d, str(self.rev))
+            f = join_path(self.__evn_locks_dir, str(self.rev))
+            self.__rev_lockfile = f
 
     @property
     def lockdir(self):
@@ -1331,29 +2065,29 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
         if not svn.fs.is_file(self.root, ef, self.pool):
             return
 
-        length = svn.fs.file_length(self.root, ef, self.pool)
-        stream = svn.fs.file_contents(self.root, ef, self.pool)
-        buf = StringIO.StringIO()
-        buf.write(svn.core.svn_stream_read(stream, int(length)))
-        buf.seek(0)
-        c = ConfigParser()
-        try:
-            c.readfp(buf)
+        # The entitlements file rarely changes, so rather than reading and
+        # parsing it for every commit, its parsed form is cached, keyed by
+        # the revision its node was created in.  (That's -1 if the file is
+        # being modified by the txn we're processing, so it isn't cached.)
+        cache = EntitlementsCache(entitlements_cache_path(self.path))
+        created_rev = svn.fs.node_created_rev(self.root, ef, self.pool)
+        cached = cache.load(ef, created_rev)
+        if not cached:
+            length = svn.fs.file_length(self.root, ef, self.pool)
+            stream = svn.fs.file_contents(self.root, ef, self.pool)
+            buf = StringIO.StringIO()
+            buf.write(svn.core.svn_stream_read(stream, int(length)))
+            buf.seek(0)
 
-            g = dict(
-                (k, frozenset(n for n in v.replace(' ', '').split(',')))
-                    for (k, v) in c.items('groups')
-            )
-
-            a = set()
-            for (name, perm) in c.items(ef):
-                if 'w' in perm:
-                    if name.startswith('@'):
-                        a.update(g[name[1:]])
-                    else:
-                        a.add(name)
+        try:
+            if cached:
+                (a, g) = cached
+            else:
+                (c, a, g) = self.__parse_authz_conf(ef, buf)
+                self.authz_conf = c
+                if created_rev >= 0:
+                    cache.save(ef, created_rev, a, g)
 
-            self.authz_conf = c
             self.authz_admins = a
             self.authz_groups = g
 
@@ -1365,6 +2099,25 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
             # section
             pass
 
+    def __parse_authz_conf(self, ef, buf):
+        c = ConfigParser()
+        c.readfp(buf)
+
+        g = dict(
+            (k, frozenset(n for n in v.replace(' ', '').split(',')))
+                for (k, v) in c.items('groups')
+        )
+
+        a = set()
+        for (name, perm) in c.items(ef):
+            if 'w' in perm:
+                if name.startswith('@'):
+                    a.update(g[name[1:]])
+                else:
+                    a.add(name)
+
+        return (c, a, g)
+
     @property
     def repo_admins(self):
         return self.conf.repo_admins
@@ -1390,9 +2143,9 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
 
     @property
     def revprop_conf(self):
-        assert self.is_rev
+        assert self.updates_roots
         if not self.__revprop_conf_initialised:
-            self.__revprop_conf = self.rconf(rev=self.rev)
+            self.__revprop_conf = self.rconf(rev=self.roots_rev)
             self.__revprop_conf_initialised = True
         return self.__revprop_conf
 
@@ -1404,9 +2157,69 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
         return self.__base_revprop_conf
 
     def rconf(self, **kwds):
+        rconfs = self.__batched_rconfs
+        if rconfs is not None and kwds.keys() == ['rev']:
+            # Whilst batching, every writable config for a given revision
+            # must be the same instance, otherwise modifications pending in
+            # one wouldn't be visible to the others.
+            rev = kwds['rev']
+            if rev not in rconfs:
+                rc = self.__new_rconf(**kwds)
+                rc._begin_batch()
+                rconfs[rev] = rc
+                self.__batched[id(rc)] = rc
+            return rconfs[rev]
+        return self.__new_rconf(**kwds)
+
+    def __new_rconf(self, **kwds):
         k = dict(fs=self.fs, conf=self.conf, **kwds)
+        if self.__journal is not None and 'journal' not in k:
+            k['journal'] = self.__journal
         return RepositoryRevisionConfig(**k)
 
+    def _begin_revprop_batch(self):
+        """
+        Starts batching modifications to revision properties (see
+        AbstractRepositoryConfig.batch()) made via the r0, revision and roots
+        configs, as well as any config subsequently obtained via rconf(rev=N),
+        until _end_revprop_batch() is called.
+        """
+        assert self.__batched_rconfs is None
+        configs = [ self.r0_revprop_conf ]
+        if self.__roots is not None:
+            configs.append(self.__roots[0])
+        if self.updates_roots:
+            configs.append(self.revprop_conf)
+
+        # The roots and revprop configs may be distinct instances for the
+        # same revision (i.e. r1), so everything that needs flushing is
+        # tracked separately from what rconf() hands out.
+        batched = dict()
+        rconfs = dict()
+        for rc in configs:
+            if rc.readonly or id(rc) in batched:
+                continue
+            rc._begin_batch()
+            batched[id(rc)] = rc
+            rconfs.setdefault(rc.rev, rc)
+
+        self.__batched = batched
+        self.__batched_rconfs = rconfs
+
+    def _end_revprop_batch(self, flush=True):
+        rconfs = self.__batched_rconfs
+        if rconfs is None:
+            return
+        self.__batched_rconfs = None
+
+        configs = self.__batched.values()
+        self.__batched = None
+
+        # Flush r0 (and thus evn:last_rev) last, so that it never refers to
+        # a revision whose roots haven't been written yet.
+        for rc in sorted(configs, key=lambda rc: rc.rev, reverse=True):
+            rc._end_batch(flush=flush)
+
     def __create_root(self, change):
         c = change
         assert c.is_create
@@ -1414,12 +2227,11 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
         rm.add_root_path(c.path)
         c.root_details = rm.get_root_details(c.path)
 
-        if self.is_txn:
+        if not self.updates_roots:
             return
 
-        assert self.is_rev
         d = Dict()
-        d.created = c.changeset.rev
+        d.created = self.roots_rev
         d.creation_method = 'created'
         d.copies = {}
         if c.errors:
@@ -1434,13 +2246,13 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
         rm.add_root_path(c.path)
         c.root_details = rm.get_root_details(c.path)
 
-        if self.is_txn:
+        if not self.updates_roots:
             return
 
         method = 'copied' if c.is_copy else 'renamed'
 
         d = Dict()
-        d.created = c.changeset.rev
+        d.created = self.roots_rev
         d.creation_method = method
         d.copies = {}
         setattr(d, '%s_from' % method, (src_path, src_rev))
@@ -1454,12 +2266,12 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
         rm = self.rootmatcher
         rm.remove_root_path(c.path)
 
-        if self.is_txn:
+        if not self.updates_roots:
             return
 
         # Mark the evn:roots entry for the root as removed/replaced.
         root = self.__get_root(c.path)
-        root.removed = c.changeset.rev
+        root.removed = self.roots_rev
         root.removal_method = 'replaced'
 
         # And remove it from our roots.
@@ -1475,11 +2287,11 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
         assert c.is_remove
         assert not c.is_replace
 
-        if self.is_txn:
+        if not self.updates_roots:
             return
 
         root = self.__get_root(c.path)
-        root.removed = c.changeset.rev
+        root.removed = self.roots_rev
         root.removal_method = 'removed'
 
         del self.roots[c.path]
@@ -1514,7 +2326,7 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
         ra = rc0.root_ancestor_actions[c.path]
         assert isinstance(ra, ConfigDict)
 
-        rev = c.changeset.rev
+        rev = self.roots_rev
         if not rc0.root_ancestor_actions[c.path].get(rev):
             rc0.root_ancestor_actions[c.path][rev] = []
 
@@ -1532,12 +2344,12 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
 
             rm.remove_root_path(root_path)
 
-            if self.is_txn:
+            if not self.updates_roots:
                 continue
 
             del self.roots[root_path]
 
-        if self.is_txn:
+        if not self.updates_roots:
             return
 
         raa = Dict()
@@ -1554,11 +2366,11 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
         assert not c.is_remove
         assert c.is_replace
 
-        if self.is_txn:
+        if not self.updates_roots:
             return
 
         root = self.__get_root(c.path)
-        root.removed = c.changeset.rev
+        root.removed = self.roots_rev
         root.removal_method = 'replaced'
         root.replaced_by = c.path
 
@@ -1566,29 +2378,95 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
 
         c.note(e.RootReplaced)
 
+    @property
+    def rootmatcher_cache(self):
+        """
+        The RootMatcherCache historical root matchers are kept in; shared by
+        successive revisions via the 'rootmatcher_cache' option if set (see
+        AnalyzeCommand), otherwise private to this instance.
+        """
+        if self.__rootmatcher_cache is None:
+            cache = self.options.get('rootmatcher_cache')
+            if cache is None:
+                size = self.conf.rootmatcher_cache_size
+                cache = RootMatcherCache(max_size=size)
+            self.__rootmatcher_cache = cache
+        return self.__rootmatcher_cache
+
     def __get_historical_rootmatcher(self, rev):
         if self.is_txn and rev == self.base_rev:
             return self.rootmatcher
 
-        roots = self.rconf(rev=rev).roots
-        return SimpleRootMatcher(set(roots.keys()))
+        # Revisions that didn't create or remove any roots share the
+        # snapshot of the last revision that did.
+        key = self.root_index.modified_rev(rev)
+        if key is None:
+            key = rev
+
+        cache = self.rootmatcher_cache
+        rm = cache.get(key)
+        if rm is not None:
+            return rm
+
+        roots = self.root_index.roots_at(rev)
+        if roots is None:
+            roots = self.rconf(rev=rev).roots
+        rm = SimpleRootMatcher(set(roots.keys()))
+        cache.add(key, rm)
+        return rm
 
     def __get_copied_root_configdict(self, change):
         c = change
-        cfr = c.copied_from_rev
-        rc = self.rconf(rev=cfr)
-        rev = rc.roots[c.copied_from_path]['created']
-        rc = self.rconf(rev=rev)
-        return rc.roots[c.copied_from_path]
+        return self.__get_root(c.copied_from_path, c.copied_from_rev)
 
     def __get_root(self, path, rev=None):
         if not rev:
             rev = self.base_rev
-        rc = self.rconf(rev=rev)
-        created_rev = rc.roots[path]['created']
+        created_rev = self.root_index.created_rev(path, rev)
+        if created_rev is None:
+            rc = self.rconf(rev=rev)
+            created_rev = rc.roots[path]['created']
         rc = self.rconf(rev=created_rev)
         return rc.roots[path]
 
+    @property
+    def root_index(self):
+        if self.__root_index is None:
+            self.__root_index = RootIndex(root_index_path(self.path))
+        return self.__root_index
+
+    def _update_root_index(self, roots):
+        """
+        Updates the root index (see evn.rootindex) with the roots present at
+        our revision, once they've been finalised.
+        """
+        assert self.is_rev
+        brc = self.base_revprop_conf
+        base_roots = brc.get('roots') or dict()
+        pm = self.pathmatcher
+        root_types = dict(
+            (p, pm.get_root_details(p).root_type)
+                for (p, r) in roots.items()
+                    if r['created'] == self.rev
+        )
+        self.root_index.update(self.rev, roots, base_roots, root_types)
+
+    @property
+    def merge_index(self):
+        if self.__merge_index is None:
+            self.__merge_index = MergeIndex(merge_index_path(self.path))
+        return self.__merge_index
+
+    def _update_merge_index(self, cs):
+        """
+        Records the svn:mergeinfo changes made by our revision in the merge
+        index (see evn.mergeindex).
+        """
+        assert self.is_rev
+        find_root_path = self.rootmatcher.find_root_path
+        merges = changeset_merges(cs, find_root_path)
+        self.merge_index.update(self.rev, merges)
+
     def __process_mergeinfo(self, change):
         c = change
         has_mergeinfo = False
@@ -1766,19 +2644,20 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
         self.__last_rev = self._load_evn_revprop_int('last_rev', 0)
 
     def __finalise_changeset(self, cs):
-        if self.is_rev:
+        if self.updates_roots:
             dbg = self._dbg
+            rev = self.roots_rev
             self._reload_last_rev()
             dbg('entered __finalise_changeset()')
             dbg('last_rev: %d, self.rev: %d, self.base_rev: %d' % (
                     self.last_rev,
-                    self.rev,
+                    rev,
                     self.base_rev,
                 )
             )
-            if self.last_rev < self.rev:
-                dbg('updating last rev to %d' % self.rev)
-                self.r0_revprop_conf.last_rev = self.rev
+            if self.last_rev < rev:
+                dbg('updating last rev to %d' % rev)
+                self.r0_revprop_conf.last_rev = rev
 
             c = self.revprop_conf
             # Use the _save() shortcut here, otherwise _reload() is going to
@@ -1804,6 +2683,14 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
             elif 'warnings' in c:
                 c._del('warnings', skip_reload=True)
 
+        self._end_revprop_batch()
+
+        if self.is_rev and not self.is_journaling:
+            self._update_root_index(self.roots)
+            self._update_merge_index(cs)
+            if self.updates_roots:
+                self.rootmatcher_cache.invalidate(self.rev)
+
     def __known_subtree_to_other_known_subtree(self, change, **kwds):
         k = DecayDict(kwds)
         src_rev = k.src_rev
@@ -2056,17 +2943,41 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
         self._check_blocked_file(c)
         return
 
+    def _resolve_links(self, cs):
+        # Only _check_blocked_file() cares whether or not a file is a link,
+        # and only for blocked files when symlinks are exempt, so resolve
+        # those (and only those) up front in one batch.
+        if not self.exempt_symlinks_from_blocked_file_extensions:
+            return
+
+        is_blocked_file = self.conf.is_blocked_file
+        cs.resolve_links(
+            c for c in cs.get_all_changes().values()
+                if c.is_file and not c.is_remove and is_blocked_file(c.path)
+        )
+
+    def _is_blocked_file(self, c):
+        if not self.conf.is_blocked_file(c.path):
+            return False
+        if self.exempt_symlinks_from_blocked_file_extensions:
+            if c.is_symlink:
+                return False
+        return True
+
     def _check_blocked_file(self, c):
-        if self.conf.is_blocked_file(c.path):
-            blocked = True
-            if self.exempt_symlinks_from_blocked_file_extensions:
-                if c.is_symlink:
-                    blocked = False
-            if blocked:
-                c.error(e.BlockedFileExtension)
+        if self._is_blocked_file(c):
+            c.error(e.BlockedFileExtension)
 
         return
 
+    def _check_spilled_file(self, c):
+        # Called by the changeset (whilst the replay is still in progress)
+        # for each file create it's about to spill, in lieu of the call to
+        # _check_blocked_file() that _process_create() would have made.  The
+        # errors returned are added by __process_spilled_files().
+        if self._is_blocked_file(c):
+            return [ e.BlockedFileExtension ]
+
     def _check_component_depth(self, c):
         standard = self.conf.standard_layout
         if not standard:
@@ -2471,11 +3382,46 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
                 if not self.__valid_subdirs(c):
                     return
 
+            if c.has_spilled_files:
+                self.__process_spilled_files(c)
+
             for child in c:
                 self.__process_change(child)
 
         return
 
+    def __process_spilled_files(self, d):
+        # Files spilled by streaming analysis are creates and text-only
+        # modifies outside of any copy or replacement (see ChangeSet's
+        # __spill_files()).  For those, _process_create() and
+        # _process_modify() boil down to the checks below, which we perform
+        # by path (in the same order) as the changes no longer exist.
+        cs = d.changeset
+        rd = d.root_details
+        if rd.is_absolute:
+            return
+
+        rm = self.rootmatcher
+        errors = d.spilled_file_errors
+        for (change_type, names) in d.spilled_files.items():
+            for name in names:
+                path = d.path + name
+                change_type_name = ChangeType[change_type]
+                self.__processed_changes.append((change_type_name, path))
+
+                if change_type == ChangeType.Modify:
+                    if rd.is_tag:
+                        cs.error(path, e.TagModified)
+                    continue
+
+                assert change_type == ChangeType.Create
+                known = rm.get_root_details(path)
+                if not known.is_unknown and known.is_tag:
+                    cs.error(path, e.TagModified)
+
+                for error in errors.get(name, ()):
+                    cs.error(path, error)
+
     def _process_copy_or_rename(self, c):
         # I've gone back and forward a few times on whether or not to deal
         # with copy and renames in separate methods or one combined method.
@@ -2734,12 +3680,12 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
                     # add_root_path() as we're effectively removing the
                     # '/branches/1.x' branch then adding it back.  Which
                     # means we don't have anything to do if we're a txn.
-                    if self.is_txn:
+                    if not self.updates_roots:
                         raise logic.Break
 
                     # Find the evn:roots entry for /branches/1.x.
                     root = self.__get_root(dst_path)
-                    root.removed = cs.rev
+                    root.removed = self.roots_rev
                     root.removal_method = 'replaced'
                     root.replaced_by = (src_path, src_rev)
 
@@ -2749,7 +3695,7 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
 
                     # Create a new entry from the copied/renamed path.
                     d = Dict()
-                    d.created = cs.rev
+                    d.created = self.roots_rev
                     d.copies = {}
                     d.errors = c.errors
                     if c.is_copy:
@@ -2768,11 +3714,11 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
                     # with the rename/removal details.
                     root = self.__get_root(src_path, src_rev)
                     if c.is_copy:
-                        root._add_copy(src_rev, dst_path, cs.rev)
+                        root._add_copy(src_rev, dst_path, self.roots_rev)
                     else:
-                        root.removed = cs.rev
+                        root.removed = self.roots_rev
                         root.removal_method = 'renamed_via_replace'
-                        root.renamed = (dst_path, cs.rev)
+                        root.renamed = (dst_path, self.roots_rev)
 
                 elif dst.known_root_subtree:
                     # A known root is being copied/renamed to an existing
@@ -2797,11 +3743,11 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
 
                         rm.remove_root_path(src_path)
 
-                        if self.is_txn:
+                        if not self.updates_roots:
                             raise logic.Break
 
                         root = self.__get_root(src_path, src_rev)
-                        root.removed = cs.rev
+                        root.removed = self.roots_rev
                         root.removal_method = 'removed_indirectly_via_rename'
 
                         del self.roots[src_path]
@@ -2850,7 +3796,7 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
 
                     # The rest of the stuff we need to do affects evn:roots,
                     # which we only do if we're a rev.
-                    if self.is_txn:
+                    if not self.updates_roots:
                         raise logic.Break
 
                     if c.is_rename:
@@ -2859,7 +3805,7 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
 
                     # Create a new entry from the copied/renamed path.
                     d = Dict()
-                    d.created = cs.rev
+                    d.created = self.roots_rev
                     d.copies = {}
                     d.errors = c.errors
                     if c.is_copy:
@@ -2879,11 +3825,11 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
                     # with the rename/removal details.
                     root = self.__get_root(src_path, src_rev)
                     if c.is_copy:
-                        root._add_copy(src_rev, dst_path, cs.rev)
+                        root._add_copy(src_rev, dst_path, self.roots_rev)
                     else:
-                        root.removed = cs.rev
+                        root.removed = self.roots_rev
                         root.removal_method = 'renamed'
-                        root.renamed = (dst_path, cs.rev)
+                        root.renamed = (dst_path, self.roots_rev)
 
                 elif dst.root_ancestor:
                     CopyOrRename.KnownRootToRootAncestor(c)
@@ -3044,9 +3990,9 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
                     rp = (sp, dp)
                     dst_root = known_dst_root_details.root_path
                     rm.remove_root_path(dst_root)
-                    if self.is_rev:
+                    if self.updates_roots:
                         root = self.__get_root(dst_root)
-                        root.removed = cs.rev
+                        root.removed = self.roots_rev
                         root.removal_method = 'removed_indirectly'
                         root.removed_indirectly = rp
 
@@ -3123,7 +4069,7 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
                         if not excluded:
                             rm.add_root_path(new_root)
 
-                    if self.is_txn or action != 'keep':
+                    if not self.updates_roots or action != 'keep':
                         continue
 
                     if c.is_rename:
@@ -3135,7 +4081,7 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
 
                     # Prepare the new root entry...
                     d = Dict()
-                    d.created = cs.rev
+                    d.created = self.roots_rev
                     d.copies = {}
                     if c.errors:
                         d.errors = c.errors
@@ -3151,7 +4097,7 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
                     roots_created.append(new_root)
                     self.roots[new_root] = d
 
-                if self.is_txn:
+                if not self.updates_roots:
                     raise logic.Break
 
                 # Finally, make a note on the r0 revprop that a root ancestor
@@ -3249,6 +4195,106 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
         if not self.__base_revlock_filename_initialised:
             pass
 
+    @property
+    def txn_analysis_dir(self):
+        return join_path(self.__evn_db_dir, 'txns')
+
+    def _txn_analysis_filename(self, base_rev, txn_name):
+        name = '%d.%s' % (base_rev, txn_name)
+        return join_path(self.txn_analysis_dir, name)
+
+    def save_txn_analysis(self):
+        """
+        Persists the evn:* revprop changes journaled whilst analysing our
+        txn to evn/db, such that the post-commit hook for the resulting
+        revision can apply them directly via apply_txn_analysis() instead of
+        replaying and analysing the entire changeset again.
+        """
+        assert self.is_txn and self.is_journaling
+        assert self.__changeset_initialised
+
+        record = dict(
+            txn_name=self.txn_name,
+            base_rev=self.base_rev,
+            changes=self.__journal.changes,
+        )
+
+        d = self.txn_analysis_dir
+        if not os.path.isdir(d):
+            os.makedirs(d)
+
+        path = self._txn_analysis_filename(self.base_rev, self.txn_name)
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(pformat(record))
+        os.rename(tmp, path)
+
+    def __purge_stale_txn_analyses(self):
+        d = self.txn_analysis_dir
+        if not os.path.isdir(d):
+            return
+
+        for name in os.listdir(d):
+            base_rev = try_int(name.split('.')[0])
+            if base_rev is None or base_rev < self.base_rev:
+                try_remove_file(join_path(d, name))
+
+    def apply_txn_analysis(self, txn_name):
+        """
+        Applies the analysis persisted by save_txn_analysis() for the txn
+        named @txn_name to our revision.  Returns True if it was applied, or
+        False if the revision needs to be analysed the normal way (i.e. via
+        the changeset property), which will be the case if the txn wasn't
+        analysed, was based on a different revision than the one preceding
+        ours, or any of the revprops it would change have since changed.
+        """
+        assert self.is_rev
+
+        self.__purge_stale_txn_analyses()
+
+        path = self._txn_analysis_filename(self.base_rev, txn_name)
+        if not os.path.isfile(path):
+            return False
+
+        try:
+            with open(path, 'r') as f:
+                record = literal_eval(f.read())
+        except:
+            record = None
+        finally:
+            try_remove_file(path)
+
+        valid = (
+            isinstance(record, dict) and
+            record.get('txn_name') == txn_name and
+            record.get('base_rev') == self.base_rev
+        )
+        if not valid:
+            return False
+
+        if not apply_changes(self.fs, record['changes']):
+            return False
+
+        roots = self.rconf(rev=self.rev).roots
+        self._update_root_index(roots)
+
+        # We've no changeset to get svn:mergeinfo changes from, so only load
+        # one if the revision looks like it changed any.
+        merges = list()
+        if has_mergeinfo_changes(self.fs, self.rev, self.pool):
+            rm = SimpleRootMatcher(set(roots))
+            merges = load_merges(self.path, self.rev, rm.find_root_path)
+        self.merge_index.update(self.rev, merges)
+
+        # The changes have been applied, but a custom hook may still access
+        # the changeset property (which would analyse the revision again).
+        # Send any revprop changes made by that analysis to a journal that
+        # is discarded, as they've already been applied above.
+        self._start_journal(self.rev)
+        brc = self.base_revprop_conf
+        self.__roots = (self.revprop_conf, self._inherit_roots(brc.roots))
+        return True
+
     @property
     def _changeset_kwds(self):
         k = Dict()
@@ -3274,11 +4320,24 @@ class RepositoryRevOrTxn(ImplicitContextSensitiveObject):
             self.die(e.ChangeSetOnlyApplicableForRev1AndHigher)
 
         if not self.__changeset_initialised:
-            self._init_rootmatcher()
+            tracker = PhaseTracker('r%s' % str(self.rev_or_txn))
+            with tracker.track('setup'):
+                self._begin_revprop_batch()
+                self._init_rootmatcher()
             cs = ChangeSet(self.path, self.rev_or_txn, self.options)
-            cs.load()
-            self.__process_changeset(cs)
-            self.__finalise_changeset(cs)
+            cs.tracker = tracker
+            if cs.spill_files:
+                cs.spilled_file_check = self._check_spilled_file
+            with tracker.track('replay'):
+                cs.load()
+                self._resolve_links(cs)
+            with tracker.track('roots'):
+                self.__process_changeset(cs)
+            with tracker.track('revprops'):
+                self.__finalise_changeset(cs)
+            self.tracker = tracker
+            self.phase_times = tracker.phase_times
+            self._dbg('phases: %s' % tracker.one_liner)
             self.__changeset = cs
             self.__changeset_initialised = True
         return self.__changeset
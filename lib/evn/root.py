@@ -2,6 +2,9 @@
 #===============================================================================
 # Imports
 #===============================================================================
+from collections import (
+    OrderedDict,
+)
 
 from evn.path import (
     format_dir,
@@ -74,16 +77,41 @@ class RootPathMatcher(PathMatcher):
         return root_details
 
 class SimpleRootMatcher(object):
+    """
+    Keeps track of a set of root paths (e.g. '/trunk/', '/branches/1.x/'),
+    and answers "which root is @path in?" and "which roots are under @path?"
+    queries.  The former is answered by probing a set of roots per path
+    depth, deepest first, and the latter by walking a trie of the roots
+    keyed by path component (built on demand, as many revisions never need
+    it), so neither is proportional to the number of roots.
+
+        >>> rm = SimpleRootMatcher(set(['/trunk/', '/src/branches/foo/']))
+        >>> rm.find_root_path('/src/branches/foo/bar/moo.txt')
+        '/src/branches/foo/'
+        >>> rm.find_root_path('/src/branches/foo')
+        >>> rm.find_roots_under_path('/src/')
+        ['/src/branches/foo/']
+        >>> rm.remove_root_path('/src/branches/foo/')
+        >>> rm.find_roots_under_path('/src/')
+        []
+    """
     def __init__(self, roots):
         assert isinstance(roots, set)
 
         self.__version = 0
+        self.__frozen = False
         self.__roots = set()
         self.__roots_removed = set()
         self.__root_details = dict()
         self.__root_dirs_by_length = dict()
         self.__reversed_root_dir_lengths = None
 
+        # Each trie node is a dict mapping path components to child nodes;
+        # nodes that correspond to a root additionally map None to the root's
+        # path.  Only used by find_roots_under_path(), which builds it the
+        # first time it's called; it's kept up to date from then on.
+        self.__trie = None
+
         self.__pathmatcher = RootPathMatcher()
 
         for p in roots:
@@ -117,6 +145,24 @@ class SimpleRootMatcher(object):
             self.__reversed_root_dir_lengths = [ l+1 for l in lengths ]
         return self.__reversed_root_dir_lengths
 
+    @property
+    def frozen(self):
+        return self.__frozen
+
+    def freeze(self):
+        """
+        Prevents any further roots from being added or removed, allowing the
+        matcher to be shared as a snapshot (see RootMatcherCache).
+
+        >>> rm = SimpleRootMatcher(set(['/trunk/']))
+        >>> rm.freeze()
+        >>> rm.remove_root_path('/trunk/')
+        Traceback (most recent call last):
+            ...
+        AssertionError
+        """
+        self.__frozen = True
+
     def add_root_path(self, path):
         """
         >>> rm = SimpleRootMatcher(set(['/trunk/']))
@@ -148,6 +194,7 @@ class SimpleRootMatcher(object):
         """
 
         p = path
+        assert not self.__frozen
         assert (
             p == format_dir(p) and
             p not in self.__roots and
@@ -165,42 +212,41 @@ class SimpleRootMatcher(object):
         for i in range(length, 0, -1):
             roots = self.__root_dirs_by_length.get(i)
             if roots:
-                s = '/%s/' % '/'.join(dirs[:i])
-                #if s in self.__root_dirs_by_length[i]:
-                #    import ipdb
-                #    ipdb.set_trace()
-                assert s not in self.__root_dirs_by_length[i]
+                assert '/%s/' % '/'.join(dirs[:i]) not in roots
+
+        assert p not in self.__root_details
+
+        if self.__trie is not None:
+            self.__add_to_trie(p, dirs)
 
         roots = self.__root_dirs_by_length.get(length)
         if roots is None:
             # Force reversed lengths to be recalculated when the property is
             # next accessed by get_root_details().
             self.__reversed_root_dir_lengths = None
-            self.__root_dirs_by_length[length] = set()
-        else:
-            # Force a __nonzero__ test to catch if we're an empty set().
-            assert roots
-            assert p not in roots
-            assert p not in self.__root_details
+            roots = self.__root_dirs_by_length[length] = set()
 
-        self.__root_dirs_by_length[length].add(p)
+        roots.add(p)
         self.__roots.add(p)
         self.__version += 1
 
     def remove_root_path(self, path):
         p = path
+        assert not self.__frozen
         assert p in self.__roots
         length = p.count('/')-1
         assert length >= 1
 
         roots = self.__root_dirs_by_length[length]
-        assert roots and p in roots
         roots.remove(p)
         if not roots:
             # Do extra cleanup if that was the last root at this length.
             del self.__root_dirs_by_length[length]
             self.__reversed_root_dir_lengths = None
 
+        if self.__trie is not None:
+            self.__remove_from_trie(p, p.split('/')[1:-1])
+
         self.__roots.remove(p)
         if p in self.__root_details:
             del self.__root_details[p]
@@ -208,6 +254,46 @@ class SimpleRootMatcher(object):
         self.__roots_removed.add(p)
         self.__version += 1
 
+    def __add_to_trie(self, path, dirs):
+        node = self.__trie
+        for d in dirs:
+            node = node.setdefault(d, dict())
+        node[None] = path
+
+    def __remove_from_trie(self, path, dirs):
+        nodes = [ self.__trie ]
+        for d in dirs:
+            nodes.append(nodes[-1][d])
+        assert nodes[-1].get(None) == path
+        del nodes[-1][None]
+
+        # Prune any nodes that no longer lead to a root.
+        for i in xrange(len(dirs)-1, -1, -1):
+            if nodes[i+1]:
+                break
+            del nodes[i][dirs[i]]
+
+    def find_root_path(self, path):
+        """
+        Returns the path of the root @path lives in, or None if @path isn't
+        in a root.
+        """
+        # See get_root_details() for an explanation of the probing logic
+        # (which is repeated here, rather than factored out, as it's on the
+        # hot path of every change processed).
+        parts = path.split('/')[1:]
+        parts_length = len(parts)
+        roots = self.__roots
+        lengths = self.__reversed_root_dir_lengths
+        if lengths is None:
+            lengths = self.reversed_root_dir_lengths
+        for r in lengths:
+            if r > parts_length:
+                continue
+            root_path = '/%s/' % '/'.join(parts[:r-1])
+            if root_path in roots:
+                return root_path
+
     def get_root_details(self, path):
         assert path and path[0] == '/'
         # The first element in the split will be '' because our path starts
@@ -219,14 +305,24 @@ class SimpleRootMatcher(object):
         if parts_length == 1:
             return AbsoluteRootDetails
 
-        reversed_root_dir_lengths = self.reversed_root_dir_lengths
-
-        use_unknown_root_details = (
-            not self.__roots or
-            parts_length < reversed_root_dir_lengths[-1]
-        )
-
-        if use_unknown_root_details:
+        # The last element of @parts is either '' (for directories) or a file
+        # name, neither of which can form part of a root path.  Roots can be
+        # nested (add_root_path() only guards against adding a root beneath
+        # an existing one), so probe the deepest lengths first, such that the
+        # longest match wins.
+        roots = self.__roots
+        lengths = self.__reversed_root_dir_lengths
+        if lengths is None:
+            lengths = self.reversed_root_dir_lengths
+        for r in lengths:
+            if r > parts_length:
+                continue
+            root_path = '/%s/' % '/'.join(parts[:r-1])
+            if root_path in roots:
+                break
+        else:
+            # The path doesn't match any of our known roots, so return
+            # unknown.
             return RootDetails(
                 root_type='unknown',
                 root_path=path,
@@ -234,47 +330,32 @@ class SimpleRootMatcher(object):
                 rootmatcher=self,
             )
 
-        root_name = parts[-1]
-        if root_name == '':
-            root_name = parts[-2]
+        root_details = self.__root_details.get(root_path)
+        if not root_details:
+            root_name = parts[-1]
+            if root_name == '':
+                root_name = parts[-2]
 
-        for r in reversed_root_dir_lengths:
-            if r > parts_length:
-                continue
+            # The only thing PathMatcher will definitely get right is the
+            # root type, which is tricky when you've got ambiguous paths like
+            # /branches/trunk/ or /trunk/foo/tags/1.0 etc.
+            pm = self.pathmatcher
+            root_type = pm.get_root_details(root_path).root_type
 
-            root_path = '/%s/' % '/'.join(parts[:r-1])
-            if root_path in self.__roots:
-                root_details = self.__root_details.get(root_path)
-                if not root_details:
-                    # The only thing PathMatcher will definitely get right is
-                    # the root type, which is tricky when you've got ambiguous
-                    # paths like /branches/trunk/ or /trunk/foo/tags/1.0 etc.
-                    pm = self.pathmatcher
-                    root_type = pm.get_root_details(root_path).root_type
-
-                    # Treat unknown roots as branches.
-                    if root_type == 'unknown':
-                        root_type = 'branch'
-
-                    root_details = RootDetails(
-                        root_name=root_name,
-                        root_path=root_path,
-                        root_type=root_type,
-                        version=self.version,
-                        rootmatcher=self,
-                    )
-                    self.__root_details[root_path] = root_details
-
-                return root_details
-
-        # If we get this far, the path doesn't match any of our known root
-        # base dirs, so return unknown.
-        return RootDetails(
-            root_type='unknown',
-            root_path=path,
-            version=self.version,
-            rootmatcher=self,
-        )
+            # Treat unknown roots as branches.
+            if root_type == 'unknown':
+                root_type = 'branch'
+
+            root_details = RootDetails(
+                root_name=root_name,
+                root_path=root_path,
+                root_type=root_type,
+                version=self.version,
+                rootmatcher=self,
+            )
+            self.__root_details[root_path] = root_details
+
+        return root_details
 
     def find_roots_under_path(self, path):
         """
@@ -282,7 +363,29 @@ class SimpleRootMatcher(object):
         """
         p = path
         assert p and p[0] == '/' and p[-1] == '/'
-        return [ r for r in self.__roots if r != p and r.startswith(p) ]
+
+        if self.__trie is None:
+            self.__trie = dict()
+            for r in self.__roots:
+                self.__add_to_trie(r, r.split('/')[1:-1])
+
+        node = self.__trie
+        for d in p.split('/')[1:-1]:
+            node = node.get(d)
+            if node is None:
+                return []
+
+        roots = list()
+        stack = [ node ]
+        while stack:
+            node = stack.pop()
+            for (d, child) in node.iteritems():
+                if d is None:
+                    if child != p:
+                        roots.append(child)
+                else:
+                    stack.append(child)
+        return roots
 
     def __repr__(self):
         return repr(self.__roots)
@@ -315,4 +418,58 @@ class Root(ConfigDict):
                 { copied_from_rev : [ (copied_to_path, rev), ] }
             )
 
+class RootMatcherCache(object):
+    """
+    An LRU cache of frozen SimpleRootMatcher snapshots of the roots present
+    at a given revision, used for the historical root matchers needed when
+    processing copies (see RepositoryRevOrTxn).  Snapshots are keyed by the
+    last revision the roots were modified in (see RootIndex.modified_rev())
+    where known, so every revision between two root modifications shares
+    the same snapshot.  Once @max_size snapshots are held, the least
+    recently used one is evicted.
+
+        >>> c = RootMatcherCache(max_size=2)
+        >>> for rev in (1, 2, 3):
+        ...     c.add(rev, SimpleRootMatcher(set(['/trunk/'])))
+        >>> c.get(1)
+        >>> c.get(2).frozen
+        True
+        >>> c.add(4, SimpleRootMatcher(set()))
+        >>> c.get(3)
+        >>> (c.hits, c.misses)
+        (1, 2)
+    """
+    def __init__(self, max_size=64):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.__matchers = OrderedDict()
+
+    def __len__(self):
+        return len(self.__matchers)
+
+    def get(self, rev):
+        rm = self.__matchers.pop(rev, None)
+        if rm is None:
+            self.misses += 1
+            return
+        self.hits += 1
+        self.__matchers[rev] = rm
+        return rm
+
+    def add(self, rev, rm):
+        rm.freeze()
+        self.__matchers.pop(rev, None)
+        self.__matchers[rev] = rm
+        while len(self.__matchers) > self.max_size:
+            self.__matchers.popitem(last=False)
+
+    def invalidate(self, rev):
+        """
+        Discards any snapshots of @rev onward, i.e. once the roots of @rev
+        have been (re)written.
+        """
+        for r in [ r for r in self.__matchers if r >= rev ]:
+            del self.__matchers[r]
+
 # vim:set ts=8 sw=4 sts=4 tw=78 et:
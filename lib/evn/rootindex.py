@@ -0,0 +1,254 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import os
+
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+from evn.path import (
+    join_path,
+)
+
+#===============================================================================
+# Globals
+#===============================================================================
+ROOT_INDEX_SQL = """
+    create table if not exists root (
+        path text not null,
+        created integer not null,
+        removed integer,
+        root_type text,
+        creation_method text,
+        copied_from_path text,
+        copied_from_rev integer,
+        primary key (path, created)
+    );
+
+    create index if not exists root_created on root (created);
+    create index if not exists root_removed on root (removed);
+
+    create table if not exists meta (
+        name text primary key,
+        value integer
+    );
+"""
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def root_index_path(repo_path):
+    return join_path(repo_path, 'evn', 'db', 'roots.db')
+
+#===============================================================================
+# Classes
+#===============================================================================
+class RootIndex(object):
+    """
+    An SQLite index (evn/db/roots.db) of every root a repository has ever
+    had, with the revisions each root was created and removed in, such that
+    questions like "which roots existed at rN?" or "when was the root at
+    path X (as of rN) created?" can be answered without reading and
+    evaluating evn:roots revision properties.
+
+    The revision properties remain the source of truth; the index is
+    updated incrementally as each revision is analysed (see update()), and
+    can be rebuilt from scratch via `evnadmin rebuild-root-index`.  Lookups
+    for revisions the index doesn't cover (or any lookup at all, if the
+    index can't be used for whatever reason) return None, and callers are
+    expected to fall back to the revision properties.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.__con = None
+
+    @property
+    def available(self):
+        return sqlite3 is not None
+
+    @property
+    def exists(self):
+        return self.available and os.path.isfile(self.path)
+
+    @property
+    def con(self):
+        if self.__con is None:
+            d = os.path.dirname(self.path)
+            if not os.path.isdir(d):
+                os.makedirs(d)
+            con = sqlite3.connect(self.path, timeout=30)
+            # Paths are handed straight back to code that expects str.
+            con.text_factory = str
+            con.executescript(ROOT_INDEX_SQL)
+            self.__con = con
+        return self.__con
+
+    def close(self):
+        if self.__con is not None:
+            self.__con.close()
+            self.__con = None
+
+    def _last_rev(self):
+        sql = "select value from meta where name = 'last_rev'"
+        row = self.con.execute(sql).fetchone()
+        return row[0] if row else None
+
+    def _set_last_rev(self, rev):
+        sql = "insert or replace into meta values ('last_rev', ?)"
+        self.con.execute(sql, (rev,))
+
+    @property
+    def last_rev(self):
+        """
+        The last revision the index is up to date with, or None if the index
+        is empty (or unusable).
+        """
+        if not self.exists:
+            return
+        try:
+            return self._last_rev()
+        except sqlite3.Error:
+            return
+
+    def _query(self, rev, sql, args):
+        if not self.exists:
+            return
+        try:
+            last_rev = self._last_rev()
+            if last_rev is None or rev > last_rev:
+                return
+            return self.con.execute(sql, args).fetchall()
+        except sqlite3.Error:
+            return
+
+    def roots_at(self, rev):
+        """
+        Returns a dict mapping the path of each root present at @rev to the
+        revision it was created in, or None if @rev isn't indexed.
+        """
+        sql = (
+            "select path, created from root "
+            " where created <= ? and (removed is null or removed > ?)"
+        )
+        rows = self._query(rev, sql, (rev, rev))
+        if rows is None:
+            return
+        return dict(rows)
+
+    def created_rev(self, path, rev):
+        """
+        Returns the revision the root at @path (as of @rev) was created in,
+        or None if @rev isn't indexed, or @path wasn't a root at @rev.
+        """
+        sql = (
+            "select created from root "
+            " where path = ? and created <= ? "
+            "   and (removed is null or removed > ?)"
+        )
+        rows = self._query(rev, sql, (path, rev, rev))
+        if not rows:
+            return
+        return rows[0][0]
+
+    def modified_rev(self, rev):
+        """
+        Returns the last revision (at or before @rev) in which a root was
+        created or removed, i.e. the revision whose roots @rev's are the
+        same as, 0 if there isn't one, or None if @rev isn't indexed.
+        """
+        sql = (
+            "select max(created) from root where created <= ? "
+            "union all "
+            "select max(removed) from root where removed <= ?"
+        )
+        rows = self._query(rev, sql, (rev, rev))
+        if rows is None:
+            return
+        return max([ r[0] for r in rows if r[0] is not None ] or [ 0 ])
+
+    def _rewind(self, rev):
+        self.con.execute("delete from root where created > ?", (rev,))
+        sql = "update root set removed = null where removed > ?"
+        self.con.execute(sql, (rev,))
+        self._set_last_rev(rev)
+
+    def rewind(self, rev):
+        """
+        Discards everything the index knows about revisions after @rev.
+        """
+        if not self.exists:
+            return
+        with self.con:
+            last_rev = self._last_rev()
+            if last_rev is not None and last_rev > rev:
+                self._rewind(rev)
+
+    def clear(self):
+        with self.con:
+            self.con.execute("delete from root")
+            self.con.execute("delete from meta")
+
+    def update(self, rev, roots, base_roots, root_types=None):
+        """
+        Updates the index with the roots present at @rev, given the roots
+        present at the preceding revision (@base_roots).  Both are dicts in
+        the same form as evn:roots.  @root_types, if provided, maps the paths
+        of roots created in @rev to their type (trunk, branch or tag).
+
+        If @rev has already been indexed (i.e. it's being re-analysed), the
+        index is rewound first.  Returns False if the index wasn't updated
+        because it doesn't cover the preceding revision.
+        """
+        if not self.available:
+            return False
+        try:
+            return self._update(rev, roots, base_roots, root_types)
+        except (sqlite3.Error, OSError):
+            return False
+
+    def _update(self, rev, roots, base_roots, root_types):
+        root_types = root_types or dict()
+        last_rev = self._last_rev()
+        if last_rev is None:
+            if rev != 1:
+                return False
+        elif last_rev < rev - 1:
+            return False
+
+        added = list()
+        for (path, root) in roots.items():
+            if root['created'] != rev:
+                continue
+            source = root.get('copied_from') or root.get('renamed_from')
+            (src_path, src_rev) = source if source else (None, None)
+            added.append((
+                path,
+                rev,
+                None,
+                root_types.get(path),
+                root.get('creation_method'),
+                src_path,
+                src_rev,
+            ))
+
+        removed = list()
+        for (path, root) in base_roots.items():
+            created = root['created']
+            other = roots.get(path)
+            if not other or other['created'] != created:
+                removed.append((rev, path, created))
+
+        with self.con as con:
+            if last_rev is not None and last_rev >= rev:
+                self._rewind(rev - 1)
+            sql = "insert or replace into root values (?, ?, ?, ?, ?, ?, ?)"
+            con.executemany(sql, added)
+            sql = "update root set removed = ? where path = ? and created = ?"
+            con.executemany(sql, removed)
+            self._set_last_rev(rev)
+
+        return True
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
@@ -0,0 +1,190 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import os
+import sys
+import errno
+import signal
+import socket
+import traceback
+import cStringIO as StringIO
+
+from evn.hookclient import (
+    connect,
+    send_message,
+    recv_message,
+)
+
+from evn.util import (
+    try_remove_file,
+    DecayDict,
+)
+
+#===============================================================================
+# Exceptions
+#===============================================================================
+class HookServerError(Exception):
+    pass
+
+class HookServerAlreadyRunning(HookServerError):
+    pass
+
+#===============================================================================
+# Classes
+#===============================================================================
+class HookServer(object):
+    """
+    Serves hook invocations forwarded by `evn.hookclient` over a local unix
+    socket for a single repository.
+
+    The process running the server has already paid for importing the
+    Subversion bindings, loading the configuration and opening the repo, so
+    each request is handled by a forked child that inherits all of that warm
+    state.  The child runs `handler` with the hook's stdin and captured
+    stdout/stderr, then sends the exit code and output back to the client.
+    Forking per request also means hooks can run concurrently (pre-commits
+    for different transactions, for example), and that any state mutated by
+    a hook run (os.environ, cwd, sys.exit() calls etc) dies with the child.
+    """
+    def __init__(self, **kwds):
+        k = DecayDict(**kwds)
+        self.path = k.path
+        self.handler = k.handler
+        self.socket_path = k.socket_path
+        k.assert_empty(self)
+
+        self.sock = None
+        self.children = set()
+        self.realpath = os.path.realpath(self.path)
+
+    def serves(self, repo_path):
+        return os.path.realpath(repo_path) == self.realpath
+
+    def _bind(self):
+        existing = connect(self.socket_path)
+        if existing:
+            existing.close()
+            raise HookServerAlreadyRunning(self.socket_path)
+
+        # If the socket file exists but nothing answered, it's stale.
+        try_remove_file(self.socket_path)
+
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        sock.listen(socket.SOMAXCONN)
+        self.sock = sock
+
+    def _unbind(self):
+        if not self.sock:
+            return
+        self.sock.close()
+        self.sock = None
+        try_remove_file(self.socket_path)
+
+    def _reap(self, *args):
+        while self.children:
+            try:
+                (pid, status) = os.waitpid(-1, os.WNOHANG)
+            except OSError as exc:
+                if exc.errno == errno.ECHILD:
+                    self.children.clear()
+                    return
+                raise
+            if pid == 0:
+                return
+            self.children.discard(pid)
+
+    def _shutdown(self, *args):
+        raise SystemExit(0)
+
+    def serve_forever(self):
+        self._bind()
+        signal.signal(signal.SIGCHLD, self._reap)
+        signal.signal(signal.SIGTERM, self._shutdown)
+        try:
+            while True:
+                try:
+                    (conn, address) = self.sock.accept()
+                except socket.error as exc:
+                    if exc.args[0] == errno.EINTR:
+                        continue
+                    raise
+
+                pid = os.fork()
+                if pid == 0:
+                    self.__child(conn)
+                    # __child() never returns.
+
+                conn.close()
+                self.children.add(pid)
+        finally:
+            self._unbind()
+
+    def __child(self, conn):
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        self.sock.close()
+        exit_code = 1
+        try:
+            self._handle(conn)
+            exit_code = 0
+        except:
+            traceback.print_exc()
+        finally:
+            conn.close()
+            os._exit(exit_code)
+
+    def _handle(self, conn):
+        request = recv_message(conn)
+        if not request:
+            return
+
+        args = list(request['hook_args'])
+        if len(args) < 2 or not self.serves(args[1]):
+            send_message(conn, dict(declined=True))
+            return
+
+        send_message(conn, dict(accepted=True))
+
+        # Hook args are received in the same form as `evnadmin run-hook`
+        # expects them: HOOK_NAME REPO_PATH [HOOK_ARGS ...].
+        hook_name = args[0]
+        hook_args = args[2:]
+
+        os.environ.clear()
+        os.environ.update(request['env'])
+        os.chdir(request['cwd'])
+
+        istream = StringIO.StringIO(request['stdin'])
+        ostream = StringIO.StringIO()
+        estream = StringIO.StringIO()
+        (sys.stdin, sys.stdout, sys.stderr) = (istream, ostream, estream)
+
+        try:
+            exit_code = self.handler(
+                hook_name,
+                hook_args,
+                istream,
+                ostream,
+                estream,
+            )
+        except SystemExit as exc:
+            exit_code = exc.code
+            if exit_code is None:
+                exit_code = 0
+            elif not isinstance(exit_code, int):
+                estream.write('%s\n' % str(exit_code))
+                exit_code = 1
+        except:
+            traceback.print_exc(file=estream)
+            exit_code = 1
+
+        response = dict(
+            stdout=ostream.getvalue(),
+            stderr=estream.getvalue(),
+            exit_code=exit_code,
+        )
+        send_message(conn, response)
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
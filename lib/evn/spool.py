@@ -0,0 +1,190 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import os
+import errno
+import select
+import signal
+
+from pprint import (
+    pformat,
+)
+
+from evn.path import (
+    join_path,
+)
+
+from evn.util import (
+    literal_eval,
+    try_int,
+    try_remove_file,
+)
+
+#===============================================================================
+# Classes
+#===============================================================================
+class PostCommitSpool(object):
+    """
+    A durable queue of post-commit hook invocations for a repository, kept in
+    evn/spool.  Each entry is a file named after the revision it was queued
+    for, so entries can always be drained in revision order, regardless of
+    the order they were enqueued in.
+
+    A single worker drains the spool at any one time; workers coordinate via
+    an advisory lock on evn/spool/worker.pid, which also records the worker's
+    pid so it can be woken (via SIGUSR1) when new entries are enqueued.
+    """
+    def __init__(self, repo_path):
+        self.path = join_path(repo_path, 'evn', 'spool')
+        self.lockfile = join_path(self.path, 'worker.pid')
+        self.__lock = None
+        self.__wakeup_fd = None
+
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+    def _entry_path(self, rev):
+        return join_path(self.path, str(rev))
+
+    def enqueue(self, rev, args):
+        entry = dict(rev=rev, args=list(args))
+        path = self._entry_path(rev)
+        tmp = join_path(self.path, '.%d.tmp' % rev)
+        with open(tmp, 'w') as f:
+            f.write(pformat(entry))
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp, path)
+
+    def pending(self):
+        """
+        Returns a list of (rev, args) tuples for each queued entry, ordered
+        by revision.
+        """
+        entries = list()
+        for name in os.listdir(self.path):
+            rev = try_int(name)
+            if rev is None:
+                continue
+            with open(self._entry_path(rev), 'r') as f:
+                entry = literal_eval(f.read())
+            entries.append((rev, entry['args']))
+        return sorted(entries)
+
+    def remove(self, rev):
+        try_remove_file(self._entry_path(rev))
+
+    def lock(self, blocking=False):
+        """
+        Attempts to become the spool's worker.  Returns True if successful,
+        False if another worker holds the lock (only if @blocking is False).
+        """
+        import fcntl
+        assert self.__lock is None
+
+        f = open(self.lockfile, 'a+')
+        flags = fcntl.LOCK_EX
+        if not blocking:
+            flags |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(f.fileno(), flags)
+        except IOError as e:
+            f.close()
+            if e.errno in (errno.EAGAIN, errno.EACCES):
+                return False
+            raise
+
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()))
+        f.flush()
+        self.__lock = f
+        return True
+
+    def unlock(self):
+        if self.__lock is None:
+            return
+        self.__lock.close()
+        self.__lock = None
+
+    def listen(self):
+        """
+        Arranges for the calling process to be woken from wait() whenever
+        notify_worker() is called.  Must be called before lock().
+        """
+        import fcntl
+        (r, w) = os.pipe()
+        for fd in (r, w):
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+        # The signal handler itself doesn't need to do anything; the wakeup
+        # fd takes care of interrupting wait(), even if the signal arrives
+        # before we've started waiting.
+        signal.signal(signal.SIGUSR1, lambda *args: None)
+        signal.set_wakeup_fd(w)
+        self.__wakeup_fd = r
+
+    def wait(self, timeout=None):
+        """
+        Blocks until we're notified via notify_worker(), or @timeout seconds
+        have elapsed.
+        """
+        fd = self.__wakeup_fd
+        assert fd is not None
+        try:
+            select.select([fd], [], [], timeout)
+        except select.error as e:
+            if e.args[0] != errno.EINTR:
+                raise
+
+        try:
+            while os.read(fd, 4096):
+                pass
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                raise
+
+    @property
+    def worker_pid(self):
+        """
+        Returns the pid of the process currently draining the spool, or None
+        if there's no such process.
+        """
+        import fcntl
+
+        try:
+            f = open(self.lockfile, 'r')
+        except IOError:
+            return
+
+        with f:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_SH | fcntl.LOCK_NB)
+            except IOError as e:
+                if e.errno not in (errno.EAGAIN, errno.EACCES):
+                    raise
+                return try_int(f.read())
+            else:
+                # Nobody holds the lock, so there's no worker.
+                return
+
+    def notify_worker(self):
+        """
+        Wakes the spool's worker (if there is one) so that it picks up any
+        newly enqueued entries.  Returns True if a worker was notified.
+        """
+        pid = self.worker_pid
+        if not pid:
+            return False
+
+        try:
+            os.kill(pid, signal.SIGUSR1)
+        except OSError as e:
+            if e.errno == errno.ESRCH:
+                return False
+            raise
+
+        return True
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
@@ -0,0 +1,105 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import os
+import sys
+import json
+import unittest
+
+import svn.fs
+import svn.repos
+
+from evn.progress import (
+    analyze_log_path,
+    analyze_checkpoint_path,
+
+    AnalysisProgress,
+    AnalysisCheckpoint,
+)
+
+from evn.test import (
+    EnversionTest,
+)
+
+from evn.config import (
+    get_or_create_config,
+)
+
+from evn.test.dot import (
+    dot,
+)
+
+#===============================================================================
+# Globals
+#===============================================================================
+conf = get_or_create_config()
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def suite():
+    module = sys.modules[__name__]
+    return unittest.defaultTestLoader.loadTestsFromModule(module)
+
+#===============================================================================
+# Test Classes
+#===============================================================================
+class TestAnalysisProgress(unittest.TestCase):
+    def test_01_record(self):
+        p = AnalysisProgress(0, 100, interval=3600)
+        p.start_time -= 10
+        p.samples[0] = (p.start_time, 0)
+        for rev in xrange(1, 11):
+            self.assertIsNone(p.update(rev, [('replay', 0.5)], rev * 10))
+
+        r = p.record()
+        self.assertEqual(r.rev, 10)
+        self.assertEqual(r.analyzed, 10)
+        self.assertEqual(r.phases, { 'replay': 5.0 })
+        self.assertTrue(0.5 < r.rates['60s'] <= 1.0)
+        self.assertTrue(r.eta > 0)
+        self.assertTrue(r.rss > 0)
+        self.assertEqual(
+            [ d['rev'] for d in r.largest ],
+            [ 10, 9, 8, 7, 6 ],
+        )
+
+class TestAnalyzeCheckpoints(EnversionTest, unittest.TestCase):
+    def test_01_resume_verifies_since_checkpoint(self):
+        repo = self.create_repo()
+        evnadmin = repo.evnadmin
+
+        dot()
+        evnadmin.disable(repo.name)
+        for i in xrange(2, 7):
+            path = '/branches/%d.x/' % i
+            repo.svn.cp(repo.ra('/trunk/'), repo.ra(path), m='Branching')
+
+        dot()
+        evnadmin.analyze(repo.name, checkpoint_every='4')
+        checkpoint = AnalysisCheckpoint(analyze_checkpoint_path(repo.path))
+        self.assertEqual(checkpoint.load().rev, 4)
+
+        with open(analyze_log_path(repo.path), 'r') as f:
+            records = [ json.loads(l) for l in f ]
+        self.assertEqual(records[-1]['rev'], 6)
+        self.assertIn('replay', records[-1]['phases'])
+
+        # Simulate r6's roots not making it to disk before a crash.
+        dot()
+        expected = repo.roots_at(6)
+        fs = svn.repos.fs(svn.repos.open(repo.path))
+        svn.fs.change_rev_prop(fs, 6, 'evn:roots', None)
+
+        evnadmin.analyze(repo.name)
+        self.assertEqual(repo.roots_at(6), expected)
+        evnadmin.enable(repo.name)
+
+def main():
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite())
+
+if __name__ == '__main__':
+    main()
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
@@ -0,0 +1,85 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import os
+import sys
+import time
+import unittest
+
+from evn.test import (
+    EnversionTest,
+)
+
+from evn.path import (
+    join_path,
+)
+
+from evn.config import (
+    get_or_create_config,
+)
+
+from evn.test.dot import (
+    dot,
+)
+
+#===============================================================================
+# Globals
+#===============================================================================
+conf = get_or_create_config()
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def suite():
+    module = sys.modules[__name__]
+    return unittest.defaultTestLoader.loadTestsFromModule(module)
+
+def wait_for_empty_spool(repo, timeout=30):
+    spool = join_path(repo.path, 'evn', 'spool')
+    end = time.time() + timeout
+    while time.time() < end:
+        pending = [ n for n in os.listdir(spool) if n.isdigit() ]
+        if not pending:
+            return True
+        time.sleep(0.1)
+    return False
+
+#===============================================================================
+# Test Classes
+#===============================================================================
+class TestAsyncPostCommit(EnversionTest, unittest.TestCase):
+    def test_01_spooled_revs_processed_in_order(self):
+        repo = self.create_repo()
+        conf = repo.conf
+        conf.set('main', 'async-post-commit', '1')
+        conf.save()
+        svn = repo.svn
+
+        dot()
+        svn.cp(repo.ra('/trunk/'), repo.ra('/branches/1.x/'), m='Branching')
+        svn.cp(repo.ra('/branches/1.x/'), repo.ra('/tags/1.0/'), m='Tagging')
+        svn.mkdir(repo.ra('/trunk/foo/'), m='Adding foo')
+        svn.cp(repo.ra('/trunk/'), repo.ra('/branches/2.x/'), m='Branching')
+
+        dot()
+        self.assertTrue(wait_for_empty_spool(repo))
+        repo.evnadmin.drain_post_commit_spool(repo.path)
+
+        dot()
+        expected = set((
+            '/trunk/',
+            '/branches/1.x/',
+            '/branches/2.x/',
+            '/tags/1.0/',
+        ))
+        self.assertEqual(set(repo.roots.keys()), expected)
+        self.assertEqual(repo.revprops_at(0)['evn']['last_rev'], 5)
+
+def main():
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite())
+
+if __name__ == '__main__':
+    main()
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
@@ -193,6 +193,23 @@ class TestSymlinkBlockExemption(EnversionTest, unittest.TestCase):
             with ensure_blocked(self, error):
                 svn.ci('target.so', m='Adding symlink.')
 
+    def test_03_exempt_link_lookalike(self):
+        # Files that lack svn:special but whose contents look like a link
+        # (i.e. 'link <target>') have always been treated as symlinks.
+        repo = self.create_repo()
+        svn = repo.svn
+
+        dot()
+        tree = { 'target': bulk_chargen(100) }
+        repo.build(tree, prefix='trunk')
+        trunk = join_path(repo.wc, 'trunk')
+        with chdir(trunk):
+            dot()
+            with open('target.so', 'w') as f:
+                f.write('link target')
+            svn.add('target.so')
+            svn.ci('target.so', m='Adding symlink lookalike.')
+
 def main():
     runner = unittest.TextTestRunner(verbosity=2)
     runner.run(suite())
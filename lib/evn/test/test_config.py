@@ -163,6 +163,36 @@ class TestRepoOverride(EnversionTest, unittest.TestCase):
         self.assertEqual(actual, expected)
         dot()
 
+class TestConfigSnapshot(EnversionTest, unittest.TestCase):
+    def test_01_snapshot_rebuilt_when_conf_changes(self):
+        repo = self.create_repo(checkout=False)
+        conf = repo.reload_conf()
+        path = conf.snapshot_filename
+        self.assertTrue(os.path.isfile(path))
+        dot()
+
+        # A snapshot that's current is used instead of the conf files.
+        conf = Config()
+        conf.load(repo_path=repo.path)
+        conf.read = None
+        conf.load_repo(repo.path)
+        self.assertFalse(conf.replay_cache)
+        dot()
+
+        conf = repo.reload_conf()
+        conf.set('main', 'replay-cache', '1')
+        conf.save()
+        self.assertTrue(repo.reload_conf().replay_cache)
+        dot()
+
+        with open(path, 'w') as f:
+            f.write('garbage')
+        conf = repo.reload_conf()
+        self.assertTrue(conf.replay_cache)
+        self.assertEqual(
+            conf.modifications,
+            { 'main': { 'replay-cache': '1' } },
+        )
 
 def main():
     runner = unittest.TextTestRunner(verbosity=2)
@@ -0,0 +1,67 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+
+from evn.entitlements import (
+    EntitlementsCache,
+    entitlements_cache_path,
+)
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def suite():
+    module = sys.modules[__name__]
+    return unittest.defaultTestLoader.loadTestsFromModule(module)
+
+#===============================================================================
+# Test Classes
+#===============================================================================
+class TestEntitlementsCache(unittest.TestCase):
+    def setUp(self):
+        self.repo_path = tempfile.mkdtemp()
+        path = entitlements_cache_path(self.repo_path)
+        self.cache = EntitlementsCache(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.repo_path, ignore_errors=True)
+
+    def test_01_keyed_by_path_and_created_rev(self):
+        c = self.cache
+        ef = '/admin/entitlements'
+        groups = { 'admins': frozenset(('alice', 'bob')) }
+        self.assertIsNone(c.load(ef, 5))
+
+        c.save(ef, 5, set(('alice', 'bob')), groups)
+        self.assertEqual(c.load(ef, 5), (set(('alice', 'bob')), groups))
+        self.assertIsNone(c.load(ef, 6))
+        self.assertIsNone(c.load('/admin/other', 5))
+
+        # Only the most recently parsed version is kept.
+        c.save(ef, 6, set(), dict())
+        self.assertIsNone(c.load(ef, 5))
+        self.assertEqual(c.load(ef, 6), (set(), dict()))
+
+    def test_02_corrupt_cache_ignored(self):
+        c = self.cache
+        c.save('/admin/entitlements', 5, set(), dict())
+        with open(c.path, 'wb') as f:
+            f.write('garbage')
+        self.assertIsNone(c.load('/admin/entitlements', 5))
+
+        c.clear()
+        self.assertFalse(os.path.exists(c.path))
+
+def main():
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite())
+
+if __name__ == '__main__':
+    main()
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
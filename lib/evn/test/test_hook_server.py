@@ -0,0 +1,348 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import os
+import sys
+import time
+import shlex
+import shutil
+import signal
+import socket
+import tempfile
+import unittest
+import threading
+
+from subprocess import (
+    Popen,
+    PIPE,
+)
+
+from evn.test import (
+    ensure_blocked,
+
+    EnversionTest,
+)
+
+from evn.path import (
+    join_path,
+)
+
+from evn.util import (
+    chdir,
+)
+
+import evn.hookclient
+
+from evn.hookclient import (
+    send_message,
+    recv_message,
+)
+
+from evn.constants import (
+    e,
+)
+
+from evn.config import (
+    get_or_create_config,
+
+    Config,
+)
+
+from evn.test.dot import (
+    dot,
+)
+
+#===============================================================================
+# Globals
+#===============================================================================
+conf = get_or_create_config()
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def suite():
+    module = sys.modules[__name__]
+    return unittest.defaultTestLoader.loadTestsFromModule(module)
+
+def enable_hook_server(repo):
+    conf = repo.conf
+    conf.set('main', 'hook-server-enabled', '1')
+    conf.save()
+    repo.evnadmin.fix_hooks(repo.name)
+    return repo.reload_conf()
+
+def evn_hook_file_path(repo):
+    return join_path(repo.path, 'hooks', repo.conf.evn_hook_file_name)
+
+def start_hook_server(repo, timeout=30):
+    conf = repo.conf
+    cmd = [
+        conf.python,
+        conf.python_evn_admin_cli_file_fullpath,
+        'serve-hooks',
+        repo.path,
+    ]
+    p = Popen(cmd, stdout=PIPE, stderr=PIPE)
+    socket_path = conf.hook_server_socket_path
+    end = time.time() + timeout
+    while time.time() < end:
+        if p.poll() is not None:
+            raise RuntimeError(p.stderr.read())
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(socket_path)
+            return p
+        except socket.error:
+            time.sleep(0.1)
+        finally:
+            sock.close()
+    p.kill()
+    raise RuntimeError("hook server didn't start within %ds" % timeout)
+
+def run_hook_script(repo, hook_args, cli=None, socket_path=None):
+    """
+    Runs the evn hook script installed in @repo (i.e. what Subversion runs,
+    via the individual hook scripts) for the hook @hook_args (i.e. HOOK_NAME
+    [HOOK_ARGS ...]), and returns a tuple of (exit code, stdout, stderr).
+
+    A bogus @cli (the `evnadmin` script the hook client falls back to) can
+    be used to ensure a hook is, or isn't, handled by the server, and
+    @socket_path redirects the client to a different socket.  Either one
+    results in a copy of the hook script being run, with just that path
+    substituted.
+    """
+    conf = repo.conf
+    path = evn_hook_file_path(repo)
+    with open(path, 'r') as f:
+        script = f.read()
+
+    substitutions = (
+        (conf.python_evn_admin_cli_file_fullpath, cli),
+        (conf.hook_server_socket_path, socket_path),
+    )
+    for (old, new) in substitutions:
+        if not new:
+            continue
+        (old, new) = ('"%s"' % old, '"%s"' % new)
+        assert old in script, (old, script)
+        script = script.replace(old, new)
+        path = join_path(os.path.dirname(path), 'evn-test.sh')
+
+    if path != evn_hook_file_path(repo):
+        with open(path, 'w') as f:
+            f.write(script)
+
+    cmd = [ '/bin/sh', path, hook_args[0], repo.path ]
+    p = Popen(cmd + list(hook_args[1:]), stdin=PIPE, stdout=PIPE, stderr=PIPE)
+    (stdout, stderr) = p.communicate('')
+    return (p.returncode, stdout, stderr)
+
+#===============================================================================
+# Test Classes
+#===============================================================================
+class TestHookClientArgs(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp(prefix='evn-test-')
+        self.conf = Config()
+        self.conf.load()
+        self.conf.load_repo(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+
+    def test_01_hook_script_args_match_client(self):
+        conf = self.conf
+        hook_args = [ 'start-commit', self.path, 'test.user', 'depth' ]
+        code = conf.evn_run_hook_client_code
+        argv = shlex.split(code.replace('$*', ' '.join(hook_args)))
+        self.assertEqual(argv[0], conf.python)
+        self.assertEqual(argv[1], conf.python_evn_hook_client_file_fullpath)
+
+        calls = list()
+
+        def run_hook(*args):
+            calls.append(args)
+            return 0
+
+        (argv_, run_hook_) = (sys.argv, evn.hookclient.run_hook)
+        (sys.argv, evn.hookclient.run_hook) = (argv[1:], run_hook)
+        try:
+            with self.assertRaises(SystemExit) as cm:
+                evn.hookclient.main()
+        finally:
+            (sys.argv, evn.hookclient.run_hook) = (argv_, run_hook_)
+
+        self.assertEqual(cm.exception.code, 0)
+        self.assertEqual(calls, [(
+            conf.hook_server_socket_path,
+            conf.python,
+            conf.python_evn_admin_cli_file_fullpath,
+            hook_args,
+        )])
+
+class TestHookServer(EnversionTest, unittest.TestCase):
+    def test_01_hooks_forwarded_then_fallback(self):
+        repo = self.create_repo()
+        conf = enable_hook_server(repo)
+        svn = repo.svn
+        bogus_cli = join_path(repo.path, 'no-such-evnadmin.py')
+
+        with open(evn_hook_file_path(repo)) as f:
+            self.assertIn('hookclient.py', f.read())
+
+        dot()
+        server = start_hook_server(repo)
+        try:
+            # The bogus fallback means these can only succeed (or be
+            # rejected by evn) if the server ran them.
+            args = ('start-commit', 'test.user', 'depth')
+            (code, out, err) = run_hook_script(repo, args, cli=bogus_cli)
+            self.assertEqual((code, err), (0, ''))
+
+            args = ('pre-revprop-change', '1', 'test.user', 'svn:log', 'D')
+            (code, out, err) = run_hook_script(repo, args, cli=bogus_cli)
+            self.assertEqual(code, 1)
+            self.assertIn("deleting 'svn:log' is not permitted", err)
+
+            dot()
+            svn.mkdir(repo.ra('/trunk/foo/'), m='Adding foo')
+            with chdir(repo.wc):
+                svn.up()
+                with open('trunk/test.dll', 'w') as f:
+                    f.write('dll')
+                svn.add('trunk/test.dll')
+                with ensure_blocked(self, e.BlockedFileExtension):
+                    svn.ci('trunk/test.dll', m='Adding test.dll...')
+                svn.revert('trunk/test.dll')
+            self.assertEqual(repo.revprops_at(0)['evn']['last_rev'], 2)
+        finally:
+            # SIGKILL leaves the socket file behind, so subsequent clients
+            # have their connections refused rather than finding no socket.
+            server.send_signal(signal.SIGKILL)
+            server.wait()
+
+        dot()
+        self.assertTrue(os.path.exists(conf.hook_server_socket_path))
+        args = ('start-commit', 'test.user', 'depth')
+        (code, out, err) = run_hook_script(repo, args, cli=bogus_cli)
+        self.assertNotEqual(code, 0)
+        (code, out, err) = run_hook_script(repo, args)
+        self.assertEqual((code, err), (0, ''))
+
+        dot()
+        svn.mkdir(repo.ra('/trunk/bar/'), m='Adding bar')
+        with chdir(repo.wc):
+            svn.up()
+            svn.add('trunk/test.dll')
+            with ensure_blocked(self, e.BlockedFileExtension):
+                svn.ci('trunk/test.dll', m='Adding test.dll...')
+        self.assertEqual(repo.revprops_at(0)['evn']['last_rev'], 3)
+
+    def test_02_fallback_when_socket_missing(self):
+        repo = self.create_repo()
+        conf = enable_hook_server(repo)
+        svn = repo.svn
+
+        dot()
+        self.assertFalse(os.path.exists(conf.hook_server_socket_path))
+        args = ('pre-revprop-change', '1', 'test.user', 'svn:log', 'D')
+        (code, out, err) = run_hook_script(repo, args)
+        self.assertEqual(code, 1)
+        self.assertIn("deleting 'svn:log' is not permitted", err)
+
+        dot()
+        svn.mkdir(repo.ra('/trunk/foo/'), m='Adding foo')
+        self.assertEqual(repo.revprops_at(0)['evn']['last_rev'], 2)
+
+    def test_03_fallback_when_server_dies_before_accepting(self):
+        repo = self.create_repo()
+        conf = enable_hook_server(repo)
+
+        # Stand in for a server that dies after reading the request, but
+        # before acknowledging it.
+        socket_path = join_path(repo.path, 'evn', 'dying.sock')
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(socket_path)
+        listener.listen(1)
+        listener.settimeout(30)
+
+        def serve():
+            (conn, address) = listener.accept()
+            recv_message(conn)
+            conn.close()
+            listener.close()
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+
+        dot()
+        args = ('pre-revprop-change', '1', 'test.user', 'svn:log', 'D')
+        k = dict(socket_path=socket_path)
+        (code, out, err) = run_hook_script(repo, args, **k)
+        thread.join()
+        self.assertEqual(code, 1)
+        self.assertIn("deleting 'svn:log' is not permitted", err)
+        self.assertNotIn('hook server', err)
+
+    def test_04_server_dies_after_accepting(self):
+        repo = self.create_repo()
+        conf = enable_hook_server(repo)
+
+        # Once a request has been accepted, the hook may have already had
+        # side effects, so the client must report an error rather than run
+        # the hook again in-process.
+        socket_path = join_path(repo.path, 'evn', 'dying.sock')
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        listener.bind(socket_path)
+        listener.listen(1)
+        listener.settimeout(30)
+
+        def serve():
+            (conn, address) = listener.accept()
+            recv_message(conn)
+            send_message(conn, dict(accepted=True))
+            conn.close()
+            listener.close()
+
+        thread = threading.Thread(target=serve)
+        thread.start()
+
+        dot()
+        args = ('start-commit', 'test.user', 'depth')
+        k = dict(socket_path=socket_path)
+        (code, out, err) = run_hook_script(repo, args, **k)
+        thread.join()
+        self.assertEqual(code, 1)
+        self.assertIn('failed whilst running hook', err)
+
+    def test_05_disabled(self):
+        repo = self.create_repo()
+        conf = repo.conf
+        svn = repo.svn
+        self.assertFalse(conf.hook_server_enabled)
+
+        with open(evn_hook_file_path(repo)) as f:
+            self.assertNotIn('hookclient.py', f.read())
+
+        dot()
+        server = start_hook_server(repo)
+        try:
+            line = server.stdout.readline()
+            self.assertIn('hook server is not enabled', line)
+            svn.mkdir(repo.ra('/trunk/foo/'), m='Adding foo')
+            self.assertEqual(repo.revprops_at(0)['evn']['last_rev'], 2)
+        finally:
+            server.terminate()
+            server.wait()
+
+        dot()
+        self.assertFalse(os.path.exists(conf.hook_server_socket_path))
+
+def main():
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite())
+
+if __name__ == '__main__':
+    main()
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
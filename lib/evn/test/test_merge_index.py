@@ -0,0 +1,119 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import os
+import sys
+import unittest
+
+from evn.mergeindex import (
+    MergeIndex,
+    merge_index_path,
+)
+
+from evn.test import (
+    ensure_fails,
+    EnversionTest,
+)
+
+from evn.util import (
+    chdir,
+)
+
+from evn.config import (
+    get_or_create_config,
+)
+
+from evn.test.dot import (
+    dot,
+)
+
+#===============================================================================
+# Globals
+#===============================================================================
+conf = get_or_create_config()
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def suite():
+    module = sys.modules[__name__]
+    return unittest.defaultTestLoader.loadTestsFromModule(module)
+
+#===============================================================================
+# Test Classes
+#===============================================================================
+class TestMergeIndex(EnversionTest, unittest.TestCase):
+    def test_01_find_merges(self):
+        repo = self.create_repo()
+        svn = repo.svn
+        evnadmin = repo.evnadmin
+
+        dot()
+        svn.cp(repo.ra('/trunk/'), repo.ra('/branches/1.x/'), m='Branching')
+        svn.mkdir(repo.ra('/trunk/foo/'), m='Adding foo')
+        svn.mkdir(repo.ra('/trunk/bar/'), m='Adding bar')
+
+        dot()
+        with chdir(repo.wc):
+            svn.up()
+            svn.propset('svn:mergeinfo', '/trunk:3-4', 'branches/1.x')
+            svn.ci(m='Merging trunk')
+
+        dot()
+        with chdir(repo.wc):
+            svn.up()
+            svn.propset('svn:mergeinfo', '/trunk:3', 'branches/1.x')
+            svn.ci(m='Reverse merging r4')
+
+        dot()
+        self.assertEqual(evnadmin.find_merges(repo.name).split(), ['5', '6'])
+        self.assertEqual(
+            evnadmin.find_merges(repo.name, r='1:5').split(),
+            ['5'],
+        )
+
+        dot()
+        args = ('/trunk', '/branches/1.x', repo.name)
+        self.assertEqual(evnadmin.show_merged_revisions(*args).strip(), '3')
+
+        index = MergeIndex(merge_index_path(repo.path))
+        self.assertEqual(index.last_rev, 6)
+        self.assertEqual(
+            index.merges_into_root('/trunk', '/branches/1.x/'),
+            [
+                (5, '/branches/1.x/', '/trunk', '3-4', 0),
+                (6, '/branches/1.x/', '/trunk', '4', 1),
+            ],
+        )
+        index.close()
+
+    def test_02_backfill(self):
+        repo = self.create_repo()
+        svn = repo.svn
+        evnadmin = repo.evnadmin
+
+        dot()
+        svn.cp(repo.ra('/trunk/'), repo.ra('/branches/1.x/'), m='Branching')
+        svn.mkdir(repo.ra('/trunk/foo/'), m='Adding foo')
+        with chdir(repo.wc):
+            svn.up()
+            svn.propset('svn:mergeinfo', '/trunk:3', 'branches/1.x')
+            svn.ci(m='Merging trunk')
+
+        dot()
+        os.unlink(merge_index_path(repo.path))
+        with ensure_fails(self, "merge index doesn't cover r4"):
+            evnadmin.find_merges(repo.name)
+
+        dot()
+        evnadmin.backfill_merge_index(repo.name)
+        self.assertEqual(evnadmin.find_merges(repo.name).split(), ['4'])
+
+def main():
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite())
+
+if __name__ == '__main__':
+    main()
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
@@ -0,0 +1,162 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import os
+import sys
+import unittest
+
+from evn.change import (
+    ChangeSet,
+)
+
+from evn.test import (
+    EnversionTest,
+)
+
+from evn.util import (
+    chdir,
+    Options,
+)
+
+from evn.config import (
+    get_or_create_config,
+)
+
+from evn.test.dot import (
+    dot,
+)
+
+#===============================================================================
+# Globals
+#===============================================================================
+conf = get_or_create_config()
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def suite():
+    module = sys.modules[__name__]
+    return unittest.defaultTestLoader.loadTestsFromModule(module)
+
+def summarise_changeset(repo, rev, send_deltas):
+    options = Options(dict(send_deltas=send_deltas))
+    cs = ChangeSet(repo.path, rev, options)
+    cs.load()
+    changes = dict()
+    for (path, c) in cs._all_changes.items():
+        propchanges = sorted(
+            (p.name, p.old_value, p.new_value)
+                for p in c.propchanges.values()
+        )
+        changes[path] = (
+            c.change_type,
+            c.is_file and c.has_text_changed,
+            c.is_file and c.base_checksum,
+            propchanges,
+        )
+    return changes
+
+def replay_time(repo, rev, send_deltas, repeat=3):
+    """
+    Returns the best time, in seconds, spent in svn.repos.replay2() over
+    @repeat loads of @rev's changeset, as recorded by its phase tracker.
+    """
+    best = None
+    options = Options(dict(send_deltas=send_deltas))
+    for i in xrange(repeat):
+        cs = ChangeSet(repo.path, rev, options)
+        cs.load()
+        elapsed = cs.tracker.find('load', 'replay2').elapsed
+        cs.destroy()
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+#===============================================================================
+# Test Classes
+#===============================================================================
+class TestMetadataOnlyReplay(EnversionTest, unittest.TestCase):
+    def test_01_matches_full_replay(self):
+        repo = self.create_repo()
+        svn = repo.svn
+
+        dot()
+        with chdir(repo.wc):
+            svn.mkdir('trunk/src')
+            with open('trunk/src/foo.c', 'w') as f:
+                f.write('int foo;\n')
+            with open('trunk/src/bar.c', 'w') as f:
+                f.write('int bar;\n')
+            svn.add('trunk/src/foo.c', 'trunk/src/bar.c')
+            svn.propset('test:keep', 'yes', 'trunk/src/foo.c')
+            svn.propset('test:drop', 'yes', 'trunk/src/foo.c')
+            svn.ci(m='Adding src')
+
+        dot()
+        with chdir(repo.wc):
+            svn.up()
+            svn.cp('trunk', 'branches/1.x')
+            with open('branches/1.x/src/foo.c', 'w') as f:
+                f.write('int foo = 1;\n')
+            svn.propset('test:keep', 'no', 'branches/1.x/src/foo.c')
+            svn.propdel('test:drop', 'branches/1.x/src/foo.c')
+            svn.propset('test:dir', 'yes', 'branches/1.x/src')
+            svn.ci(m='Branching with modifications')
+
+        dot()
+        with chdir(repo.wc):
+            svn.up()
+            with open('trunk/src/bar.c', 'w') as f:
+                f.write('int bar = 2;\n')
+            svn.propset('test:new', 'yes', 'trunk/src/bar.c')
+            svn.ci(m='Modifying bar')
+
+        for rev in (2, 3, 4):
+            dot()
+            self.assertEqual(
+                summarise_changeset(repo, rev, send_deltas=False),
+                summarise_changeset(repo, rev, send_deltas=True),
+            )
+
+    def test_02_large_file_modify(self):
+        repo = self.create_repo()
+        svn = repo.svn
+
+        # Sending text deltas means libsvn has to read both versions of the
+        # file and compute a delta between them, only for us to discard it;
+        # metadata-only replay should be cheaper by a wide margin.
+        dot()
+        size = 16 * 1024 * 1024
+        data = bytearray(os.urandom(size))
+        with chdir(repo.wc):
+            with open('trunk/big.dat', 'wb') as f:
+                f.write(data)
+            svn.add('trunk/big.dat')
+            svn.ci(m='Adding big.dat')
+
+        dot()
+        data[size // 2:size // 2 + 4096] = os.urandom(4096)
+        with chdir(repo.wc):
+            with open('trunk/big.dat', 'wb') as f:
+                f.write(data)
+            svn.ci(m='Modifying big.dat')
+
+        dot()
+        self.assertEqual(
+            summarise_changeset(repo, 3, send_deltas=False),
+            summarise_changeset(repo, 3, send_deltas=True),
+        )
+
+        dot()
+        metadata = replay_time(repo, 3, send_deltas=False)
+        deltas = replay_time(repo, 3, send_deltas=True)
+        self.assertLess(metadata, deltas)
+
+def main():
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite())
+
+if __name__ == '__main__':
+    main()
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
@@ -0,0 +1,94 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import sys
+import unittest
+
+from evn.replaycache import (
+    ReplayCache,
+    replay_cache_path,
+)
+
+from evn.test import (
+    EnversionTest,
+)
+
+from evn.util import (
+    chdir,
+)
+
+from evn.config import (
+    get_or_create_config,
+)
+
+from evn.test.dot import (
+    dot,
+)
+
+#===============================================================================
+# Globals
+#===============================================================================
+conf = get_or_create_config()
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def suite():
+    module = sys.modules[__name__]
+    return unittest.defaultTestLoader.loadTestsFromModule(module)
+
+#===============================================================================
+# Test Classes
+#===============================================================================
+class TestParallelAnalyze(EnversionTest, unittest.TestCase):
+    def test_01_matches_serial_analysis(self):
+        repo = self.create_repo()
+        svn = repo.svn
+        evnadmin = repo.evnadmin
+
+        dot()
+        evnadmin.disable(repo.name)
+        svn.cp(repo.ra('/trunk/'), repo.ra('/branches/1.x/'), m='Branching')
+        with chdir(repo.wc):
+            svn.up()
+            with open('branches/1.x/foo.c', 'w') as f:
+                f.write('int foo;\n')
+            svn.add('branches/1.x/foo.c')
+            svn.ci(m='Adding foo')
+        svn.cp(repo.ra('/branches/1.x/'), repo.ra('/tags/1.0/'), m='Tagging')
+        svn.mv(repo.ra('/branches/1.x/'), repo.ra('/branches/2.x/'), m='Mv')
+        svn.rm(repo.ra('/branches/2.x/foo.c'), m='Removing foo')
+
+        dot()
+        evnadmin.analyze(repo.name, jobs='2', window='2')
+        evnadmin.enable(repo.name)
+
+        expected = {
+            2: ['/branches/1.x/', '/trunk/'],
+            3: ['/branches/1.x/', '/trunk/'],
+            4: ['/branches/1.x/', '/tags/1.0/', '/trunk/'],
+            5: ['/branches/2.x/', '/tags/1.0/', '/trunk/'],
+            6: ['/branches/2.x/', '/tags/1.0/', '/trunk/'],
+        }
+        for (rev, roots) in expected.items():
+            self.assertEqual(sorted(repo.roots_at(rev)), roots)
+
+        roots = repo.roots_at(5)
+        self.assertEqual(roots['/tags/1.0/']['created'], 4)
+        self.assertEqual(roots['/branches/2.x/']['created'], 5)
+
+        # The replay cache isn't enabled, so each window is purged from it
+        # once it has been analyzed.
+        dot()
+        cache = ReplayCache(replay_cache_path(repo.path))
+        self.assertEqual(cache.stats()[0], 0)
+        cache.close()
+
+def main():
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite())
+
+if __name__ == '__main__':
+    main()
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
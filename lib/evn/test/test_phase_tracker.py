@@ -0,0 +1,119 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import sys
+import unittest
+
+import cStringIO as StringIO
+
+from evn.perfmon import (
+    PhaseTracker,
+)
+
+from evn.test import (
+    EnversionTest,
+)
+
+from evn.config import (
+    get_or_create_config,
+)
+
+from evn.test.dot import (
+    dot,
+)
+
+#===============================================================================
+# Globals
+#===============================================================================
+conf = get_or_create_config()
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def suite():
+    module = sys.modules[__name__]
+    return unittest.defaultTestLoader.loadTestsFromModule(module)
+
+#===============================================================================
+# Test Classes
+#===============================================================================
+class TestPhaseTracker(unittest.TestCase):
+    def test_01_nesting(self):
+        t = PhaseTracker('r1')
+        with t.track('setup'):
+            pass
+        with t.track('replay'):
+            with t.track('_close'):
+                with t.track('_load_propchanges'):
+                    pass
+        with t.track('replay'):
+            with t.track('_close'):
+                pass
+
+        self.assertEqual(t.current, t.root)
+        self.assertEqual(list(t.phases), ['setup', 'replay'])
+        self.assertEqual([ p for (p, e) in t.phase_times ], list(t.phases))
+        self.assertEqual(
+            [ (p.name, p.depth, p.count) for p in t ],
+            [
+                ('setup', 1, 1),
+                ('replay', 1, 2),
+                ('_close', 2, 2),
+                ('_load_propchanges', 3, 1),
+            ],
+        )
+
+        replay = t.find('replay')
+        close = t.find('replay', '_close')
+        self.assertTrue(replay.elapsed >= close.elapsed >= 0)
+        self.assertIsNone(t.find('replay', 'roots'))
+
+    def test_02_exception(self):
+        t = PhaseTracker('r1')
+        try:
+            with t.track('replay'):
+                raise ValueError()
+        except ValueError:
+            pass
+
+        self.assertEqual(t.current, t.root)
+        self.assertEqual(t.find('replay').count, 1)
+
+    def test_03_results_to_table(self):
+        t = PhaseTracker('r1')
+        with t.track('replay'):
+            with t.track('_close'):
+                pass
+
+        output = StringIO.StringIO()
+        t.results_to_table(output=output)
+        text = output.getvalue()
+        self.assertIn('r1: Phase Times', text)
+        self.assertIn('  _close', text)
+        self.assertIn('majflt', text)
+
+        output = StringIO.StringIO()
+        t.results_to_table(output=output, exclude=lambda f: f == 'majflt')
+        self.assertNotIn('majflt', output.getvalue())
+
+class TestChangeSetPhases(EnversionTest, unittest.TestCase):
+    def test_01_show_changeset_phases(self):
+        repo = self.create_repo()
+        svn = repo.svn
+        evnadmin = repo.evnadmin
+
+        dot()
+        svn.mkdir(repo.ra('/trunk/foo/'), m='Adding foo')
+        text = evnadmin.show_changeset_phases(repo.name, r='2')
+        self.assertIn('r2: Phase Times', text)
+        for phase in ('load', 'replay2', '_close', '_load_propchanges'):
+            self.assertIn(phase, text)
+
+def main():
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite())
+
+if __name__ == '__main__':
+    main()
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
@@ -0,0 +1,92 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import os
+import sys
+import unittest
+
+from evn.test import (
+    TestRepo,
+    EnversionTest,
+)
+
+from evn.path import (
+    join_path,
+)
+
+from evn.util import (
+    chdir,
+)
+
+from evn.config import (
+    get_or_create_config,
+)
+
+from evn.test.dot import (
+    dot,
+)
+
+#===============================================================================
+# Globals
+#===============================================================================
+conf = get_or_create_config()
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def suite():
+    module = sys.modules[__name__]
+    return unittest.defaultTestLoader.loadTestsFromModule(module)
+
+#===============================================================================
+# Test Classes
+#===============================================================================
+class TestPreCommitAnalysis(EnversionTest, unittest.TestCase):
+    def _make_commits(self, repo):
+        svn = repo.svn
+        svn.cp(repo.ra('/trunk/'), repo.ra('/branches/1.x/'), m='Branching')
+        svn.cp(repo.ra('/branches/1.x/'), repo.ra('/tags/1.0/'), m='Tagging')
+        svn.mv(repo.ra('/branches/1.x/'), repo.ra('/branches/2.x/'), m='Mv')
+        svn.rm(repo.ra('/branches/2.x/'), m='Removing branch')
+        with chdir(repo.wc):
+            svn.up()
+            svn.cp('trunk', 'branches/3.x')
+            svn.cp('trunk', 'branches/4.x')
+            svn.ci(m='Branching and tagging')
+        dot()
+
+    def test_01_rev_analysis_matches_replay(self):
+        repo = self.create_repo()
+        self._make_commits(repo)
+
+        # Any persisted txn analysis should have been consumed by the
+        # corresponding post-commit.
+        txns = join_path(repo.path, 'evn', 'db', 'txns')
+        if os.path.isdir(txns):
+            self.assertEqual(os.listdir(txns), [])
+
+        name = self.repo_name + '_replay'
+        other = TestRepo(name)
+        other.create()
+        other.checkout()
+        other.conf.set('main', 'persist-pre-commit-analysis', '0')
+        other.conf.save()
+        self._make_commits(other)
+
+        dot()
+        self.assertEqual(repo.roots, other.roots)
+        self.assertEqual(
+            repo.revprops_at(0)['evn'],
+            other.revprops_at(0)['evn'],
+        )
+        for rev in range(1, 7):
+            self.assertEqual(repo.roots_at(rev), other.roots_at(rev))
+
+def main():
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite())
+
+if __name__ == '__main__':
+    main()
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
@@ -0,0 +1,84 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import sys
+import unittest
+
+from evn.change import (
+    ChangeSet,
+    ProplistCache,
+)
+
+from evn.test import (
+    EnversionTest,
+)
+
+from evn.util import (
+    chdir,
+    Options,
+)
+
+from evn.config import (
+    get_or_create_config,
+)
+
+from evn.test.dot import (
+    dot,
+)
+
+#===============================================================================
+# Globals
+#===============================================================================
+conf = get_or_create_config()
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def suite():
+    module = sys.modules[__name__]
+    return unittest.defaultTestLoader.loadTestsFromModule(module)
+
+#===============================================================================
+# Test Classes
+#===============================================================================
+class TestProplistCache(EnversionTest, unittest.TestCase):
+    def test_01_shared_between_changesets(self):
+        repo = self.create_repo()
+        svn = repo.svn
+
+        dot()
+        with chdir(repo.wc):
+            svn.mkdir('trunk/src')
+            svn.propset('test:dir', 'yes', 'trunk/src')
+            svn.ci(m='Adding src')
+
+        dot()
+        svn.cp(repo.ra('/trunk/'), repo.ra('/branches/1.x/'), m='Branching')
+        svn.rm(repo.ra('/branches/1.x/'), m='Removing branch')
+
+        cache = ProplistCache()
+        options = Options(dict(proplist_cache=cache))
+
+        dot()
+        cs = ChangeSet(repo.path, 3, options)
+        cs.load()
+        copy = cs['/branches/1.x/']
+        self.assertEqual(copy.copied_from_proplist, {})
+        self.assertIn((2, '/trunk/'), cache)
+
+        dot()
+        cs = ChangeSet(repo.path, 4, options)
+        cs.load()
+        remove = cs['/branches/1.x/']
+        self.assertEqual(remove.removed_from_proplist, {})
+        self.assertIn((3, '/branches/1.x/'), cache)
+        self.assertIn((2, '/trunk/'), cache)
+
+def main():
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite())
+
+if __name__ == '__main__':
+    main()
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
@@ -0,0 +1,153 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import sys
+import unittest
+
+import svn.fs
+import svn.repos
+
+from evn.change import (
+    ChangeSet,
+)
+
+from evn.test import (
+    EnversionTest,
+)
+
+from evn.util import (
+    chdir,
+    Options,
+)
+
+from evn.config import (
+    get_or_create_config,
+)
+
+from evn.test.dot import (
+    dot,
+)
+
+#===============================================================================
+# Globals
+#===============================================================================
+conf = get_or_create_config()
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def suite():
+    module = sys.modules[__name__]
+    return unittest.defaultTestLoader.loadTestsFromModule(module)
+
+class ScanCountingDict(dict):
+    """
+    A dict that counts how many times it's been scanned in its entirety.
+    """
+    scans = 0
+
+    def __iter__(self):
+        self.scans += 1
+        return dict.__iter__(self)
+
+    def _scanned(name):
+        def method(self):
+            self.scans += 1
+            return getattr(dict, name)(self)
+        return method
+
+    keys = _scanned('keys')
+    items = _scanned('items')
+    values = _scanned('values')
+    iterkeys = _scanned('iterkeys')
+    iteritems = _scanned('iteritems')
+    itervalues = _scanned('itervalues')
+
+    del _scanned
+
+def commit_moves(repo, count):
+    """
+    Commits two revisions: the first creates @count directories under
+    /trunk/moves-COUNT/a/ (and every second one of them under b/ too), and
+    the second moves each of them to b/, replacing the ones that exist.
+    Returns the revision of the moves.
+    """
+    client = repo.svn
+    base = 'trunk/moves-%d' % count
+    with chdir(repo.wc):
+        client.up()
+        dirs = [ base, base + '/a', base + '/b' ]
+        for i in xrange(count):
+            dirs.append('%s/a/d%d' % (base, i))
+            if i % 2 == 0:
+                dirs.append('%s/b/d%d' % (base, i))
+        client.mkdir(*dirs)
+        client.ci(m='Creating %d directories' % count)
+
+        client.up()
+        for i in xrange(count):
+            if i % 2 == 0:
+                client.rm('%s/b/d%d' % (base, i))
+            client.mv('%s/a/d%d' % (base, i), '%s/b/d%d' % (base, i))
+        client.ci(m='Moving %d directories' % count)
+
+    fs = svn.repos.fs(svn.repos.open(repo.path))
+    return svn.fs.youngest_rev(fs)
+
+def load_counting(repo, rev):
+    """
+    Loads @rev's changeset and returns a tuple of (the number of times its
+    removes were scanned in their entirety, the number of calls made to
+    __removes_for_path(), and the number of renames detected).
+    """
+    calls = [ 0 ]
+    original = ChangeSet._ChangeSet__removes_for_path
+
+    def removes_for_path(self, path):
+        calls[0] += 1
+        return original(self, path)
+
+    ChangeSet._ChangeSet__removes_for_path = removes_for_path
+    try:
+        cs = ChangeSet(repo.path, rev, Options())
+        cs._remove = ScanCountingDict()
+        cs.load()
+        result = (cs._remove.scans, calls[0], len(cs._rename))
+        cs.destroy()
+    finally:
+        ChangeSet._ChangeSet__removes_for_path = original
+    return result
+
+#===============================================================================
+# Test Classes
+#===============================================================================
+class TestRenameDetection(EnversionTest, unittest.TestCase):
+    def test_01_removes_not_scanned_per_copy(self):
+        repo = self.create_repo()
+
+        dot()
+        small = commit_moves(repo, 4)
+        (small_scans, small_calls, small_renames) = load_counting(repo, small)
+        self.assertEqual(small_renames, 4)
+
+        dot()
+        large = commit_moves(repo, 40)
+        (large_scans, large_calls, large_renames) = load_counting(repo, large)
+        self.assertEqual(large_renames, 40)
+
+        # Each move's copy looks up the removes at its source and, having
+        # found one, at its destination: at most two lookups per move, and
+        # the number of full scans of the removes doesn't grow with the
+        # number of moves.
+        self.assertTrue(small_calls <= 2 * 4)
+        self.assertTrue(large_calls <= 2 * 40)
+        self.assertEqual(large_scans, small_scans)
+
+def main():
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite())
+
+if __name__ == '__main__':
+    main()
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
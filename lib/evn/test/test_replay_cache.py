@@ -0,0 +1,167 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import os
+import sys
+import unittest
+
+import svn.repos
+
+from evn.change import (
+    ChangeSet,
+)
+
+from evn.replaycache import (
+    ReplayCache,
+    replay_cache_path,
+)
+
+from evn.test import (
+    EnversionTest,
+)
+
+from evn.util import (
+    chdir,
+    Options,
+)
+
+from evn.config import (
+    get_or_create_config,
+)
+
+from evn.test.dot import (
+    dot,
+)
+
+#===============================================================================
+# Globals
+#===============================================================================
+conf = get_or_create_config()
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def suite():
+    module = sys.modules[__name__]
+    return unittest.defaultTestLoader.loadTestsFromModule(module)
+
+def summarise_changeset(repo, rev, send_deltas, cache=None):
+    options = Options(dict(send_deltas=send_deltas, replay_cache=cache))
+    cs = ChangeSet(repo.path, rev, options)
+    cs.load()
+    changes = dict()
+    for (path, c) in cs._all_changes.items():
+        propchanges = sorted(
+            (p.name, p.old_value, p.new_value)
+                for p in c.propchanges.values()
+        )
+        changes[path] = (
+            c.change_type,
+            c.is_file and c.has_text_changed,
+            propchanges,
+        )
+    return (cs.change_type, changes)
+
+def _no_replay2(*args):
+    raise AssertionError("replay2() called for a cached revision")
+
+#===============================================================================
+# Test Classes
+#===============================================================================
+class TestReplayCache(EnversionTest, unittest.TestCase):
+    def _populate(self, repo):
+        svn = repo.svn
+
+        dot()
+        with chdir(repo.wc):
+            svn.mkdir('trunk/src')
+            with open('trunk/src/foo.c', 'w') as f:
+                f.write('int foo;\n')
+            svn.add('trunk/src/foo.c')
+            svn.propset('test:keep', 'yes', 'trunk/src/foo.c')
+            svn.propset('test:drop', 'yes', 'trunk/src/foo.c')
+            svn.ci(m='Adding src')
+
+        dot()
+        with chdir(repo.wc):
+            svn.up()
+            svn.cp('trunk', 'branches/1.x')
+            with open('branches/1.x/src/foo.c', 'w') as f:
+                f.write('int foo = 1;\n')
+            svn.propset('test:keep', 'no', 'branches/1.x/src/foo.c')
+            svn.propdel('test:drop', 'branches/1.x/src/foo.c')
+            svn.propset('test:dir', 'yes', 'branches/1.x/src')
+            svn.ci(m='Branching with modifications')
+
+        dot()
+        with chdir(repo.wc):
+            svn.up()
+            svn.rm('trunk/src/foo.c')
+            svn.ci(m='Removing foo')
+
+        return (2, 3, 4)
+
+    def test_01_cached_load_matches_replay(self):
+        repo = self.create_repo()
+        revs = self._populate(repo)
+
+        cache = ReplayCache(replay_cache_path(repo.path))
+        self.assertFalse(cache.exists)
+
+        for send_deltas in (False, True):
+            for rev in revs:
+                dot()
+                expected = summarise_changeset(repo, rev, send_deltas)
+                actual = summarise_changeset(repo, rev, send_deltas, cache)
+                self.assertEqual(actual, expected)
+                self.assertTrue(cache.load(rev, send_deltas))
+                # Only the most recent send_deltas setting is cached.
+                self.assertIsNone(cache.load(rev, not send_deltas))
+
+                replay2 = svn.repos.replay2
+                svn.repos.replay2 = _no_replay2
+                try:
+                    actual = summarise_changeset(repo, rev, send_deltas, cache)
+                finally:
+                    svn.repos.replay2 = replay2
+                self.assertEqual(actual, expected)
+
+        (revisions, min_rev, max_rev, actions, size) = cache.stats()
+        self.assertEqual((revisions, min_rev, max_rev), (3, 2, 4))
+        self.assertTrue(actions > 0)
+        self.assertEqual(size, os.path.getsize(cache.path))
+        cache.close()
+
+    def test_02_purge(self):
+        repo = self.create_repo()
+        revs = self._populate(repo)
+        evnadmin = repo.evnadmin
+
+        dot()
+        cache = ReplayCache(replay_cache_path(repo.path))
+        for rev in revs:
+            summarise_changeset(repo, rev, False, cache)
+        self.assertTrue(all(cache.load(rev, False) for rev in revs))
+        cache.close()
+
+        dot()
+        evnadmin.purge_replay_cache(repo.name, r='3:4')
+        self.assertTrue(cache.load(2, False))
+        self.assertIsNone(cache.load(3, False))
+        self.assertIsNone(cache.load(4, False))
+        cache.close()
+
+        dot()
+        evnadmin.purge_replay_cache(repo.name)
+        evnadmin.show_replay_cache(repo.name)
+        self.assertEqual(cache.stats()[0], 0)
+        cache.close()
+
+def main():
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite())
+
+if __name__ == '__main__':
+    main()
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
@@ -0,0 +1,250 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import os
+import sys
+import time
+import shutil
+import signal
+import tempfile
+import textwrap
+import unittest
+import threading
+
+from subprocess import (
+    Popen,
+    PIPE,
+)
+
+import evn
+
+from evn.path import (
+    join_path,
+)
+
+from evn.util import (
+    create_locked_pid_file,
+    wait_for_pid_file_release,
+)
+
+from evn.constants import (
+    e,
+)
+
+from evn.test import (
+    crude_error_message_test,
+
+    EnversionTest,
+)
+
+from evn.config import (
+    get_or_create_config,
+)
+
+from evn.test.dot import (
+    dot,
+)
+
+#===============================================================================
+# Globals
+#===============================================================================
+conf = get_or_create_config()
+
+# Holds a lock file (see create_locked_pid_file()) until its stdin is closed.
+HOLD_LOCK_SCRIPT = textwrap.dedent("""\
+    import sys
+    sys.path.insert(0, sys.argv[1])
+    from evn.util import create_locked_pid_file
+    f = create_locked_pid_file(sys.argv[2])
+    sys.stdout.write('locked\\n')
+    sys.stdout.flush()
+    sys.stdin.read()
+    f.close()
+""")
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def suite():
+    module = sys.modules[__name__]
+    return unittest.defaultTestLoader.loadTestsFromModule(module)
+
+def hold_lock(path):
+    """
+    Starts a process that holds a lock on @path (created via
+    create_locked_pid_file()), returning once the lock has been acquired.
+    Closing the process's stdin releases the lock.
+    """
+    lib = os.path.dirname(os.path.dirname(os.path.abspath(evn.__file__)))
+    cmd = [ sys.executable, '-c', HOLD_LOCK_SCRIPT, lib, path ]
+    p = Popen(cmd, stdin=PIPE, stdout=PIPE)
+    assert p.stdout.readline() == 'locked\n'
+    return p
+
+class wait_in_thread(object):
+    """
+    Calls wait_for_pid_file_release(@path) in a separate thread, making the
+    result available via the 'pid' attribute once the thread has finished.
+    """
+    def __init__(self, path):
+        self.pid = None
+        self.thread = threading.Thread(target=self._wait, args=(path,))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def _wait(self, path):
+        self.pid = wait_for_pid_file_release(path)
+
+    @property
+    def waiting(self):
+        return self.thread.is_alive()
+
+    def join(self, timeout=10):
+        self.thread.join(timeout)
+
+def revlock_path(repo, rev):
+    d = join_path(repo.path, 'evn', 'locks')
+    if not os.path.isdir(d):
+        os.makedirs(d)
+    return join_path(d, str(rev))
+
+def run_hook(repo, hook_name, *args):
+    """
+    Starts `evnadmin run-hook` for @hook_name (with @args) against @repo, the
+    same way the evn hook script does.
+    """
+    conf = repo.conf
+    cmd = [
+        conf.python,
+        conf.python_evn_admin_cli_file_fullpath,
+        'run-hook',
+        hook_name,
+        repo.path,
+    ] + list(args)
+    return Popen(cmd, stdout=PIPE, stderr=PIPE)
+
+#===============================================================================
+# Test Classes
+#===============================================================================
+class TestLockedPidFile(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp(prefix='evn-test-')
+        self.path = os.path.join(self.dir, 'lock')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    @unittest.skipIf(os.name == 'nt', 'requires fcntl')
+    def test_01_wait_blocks_until_released(self):
+        holder = hold_lock(self.path)
+        waiter = wait_in_thread(self.path)
+        time.sleep(0.5)
+        self.assertTrue(waiter.waiting)
+
+        holder.stdin.close()
+        holder.wait()
+        waiter.join()
+        self.assertFalse(waiter.waiting)
+        self.assertEqual(waiter.pid, holder.pid)
+
+    @unittest.skipIf(os.name == 'nt', 'requires fcntl')
+    def test_02_dead_holder_does_not_block(self):
+        holder = hold_lock(self.path)
+        holder.send_signal(signal.SIGKILL)
+        holder.wait()
+
+        # The file's still there, but the kernel has dropped the lock.
+        self.assertTrue(os.path.exists(self.path))
+        waiter = wait_in_thread(self.path)
+        waiter.join()
+        self.assertFalse(waiter.waiting)
+        self.assertEqual(waiter.pid, holder.pid)
+
+    def test_03_missing(self):
+        self.assertIsNone(wait_for_pid_file_release(self.path))
+
+    def test_04_created_in_place(self):
+        f = create_locked_pid_file(self.path)
+        try:
+            with open(self.path, 'r') as g:
+                self.assertEqual(g.read(), str(os.getpid()))
+            self.assertEqual(os.listdir(self.dir), [ 'lock' ])
+        finally:
+            if f is not None:
+                f.close()
+
+class TestRevLock(EnversionTest, unittest.TestCase):
+    def test_01_post_commit_waits_for_base_rev(self):
+        repo = self.create_repo()
+        svn = repo.svn
+        evnadmin = repo.evnadmin
+
+        dot()
+        evnadmin.disable(repo.name)
+        svn.mkdir(repo.ra('/trunk/foo/'), m='Adding foo')
+        svn.mkdir(repo.ra('/trunk/bar/'), m='Adding bar')
+
+        # Stand in for r2's post-commit having started, but not finished.
+        dot()
+        lock = create_locked_pid_file(revlock_path(repo, 2))
+        try:
+            waiter = run_hook(repo, 'post-commit', '3')
+            time.sleep(2)
+            self.assertIsNone(waiter.poll())
+
+            # Processing r2 doesn't wake r3's post-commit; only releasing
+            # the lock it's waiting on does.
+            p = run_hook(repo, 'post-commit', '2')
+            (stdout, stderr) = p.communicate()
+            self.assertEqual((p.returncode, stderr), (0, ''))
+            self.assertEqual(repo.revprops_at(0)['evn']['last_rev'], 2)
+            time.sleep(1)
+            self.assertIsNone(waiter.poll())
+        finally:
+            if lock is not None:
+                lock.close()
+
+        dot()
+        (stdout, stderr) = waiter.communicate()
+        self.assertEqual((waiter.returncode, stderr), (0, ''))
+        self.assertEqual(repo.revprops_at(0)['evn']['last_rev'], 3)
+
+    def test_02_max_revlock_waits(self):
+        repo = self.create_repo()
+        svn = repo.svn
+        evnadmin = repo.evnadmin
+
+        dot()
+        conf = repo.conf
+        conf.set('main', 'max-revlock-waits', '1')
+        conf.save()
+        self.assertEqual(repo.reload_conf().max_revlock_waits, 1)
+
+        evnadmin.disable(repo.name)
+        svn.mkdir(repo.ra('/trunk/foo/'), m='Adding foo')
+        svn.mkdir(repo.ra('/trunk/bar/'), m='Adding bar')
+        self.assertFalse(os.path.exists(revlock_path(repo, 2)))
+
+        # r2's post-commit never runs, so r3's gives up waiting for its lock
+        # file after a second.
+        dot()
+        start = time.time()
+        p = run_hook(repo, 'post-commit', '3')
+        (stdout, stderr) = p.communicate()
+        elapsed = time.time() - start
+
+        self.assertEqual(p.returncode, 1)
+        expected = e.LastRevNotSetToBaseRevDuringPostCommit
+        self.assertTrue(crude_error_message_test(stderr, expected))
+        self.assertGreaterEqual(elapsed, 1)
+        self.assertLess(elapsed, 30)
+        self.assertEqual(repo.revprops_at(0)['evn']['last_rev'], 1)
+
+def main():
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite())
+
+if __name__ == '__main__':
+    main()
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
@@ -0,0 +1,236 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import sys
+import unittest
+
+import cStringIO as StringIO
+
+import svn.fs
+import svn.repos
+
+from evn.repo import (
+    RepositoryRevOrTxn,
+    RepositoryRevisionConfig,
+)
+
+from evn.admin.commands import (
+    AnalyzeCommand,
+)
+
+from evn.test import (
+    EnversionTest,
+)
+
+from evn.util import (
+    Options,
+)
+
+from evn.config import (
+    get_or_create_config,
+)
+
+from evn.test.dot import (
+    dot,
+)
+
+#===============================================================================
+# Globals
+#===============================================================================
+conf = get_or_create_config()
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def suite():
+    module = sys.modules[__name__]
+    return unittest.defaultTestLoader.loadTestsFromModule(module)
+
+def open_fs(repo):
+    return svn.repos.fs(svn.repos.open(repo.path))
+
+def evn_revprops(repo):
+    """
+    Returns a dict of rev -> dict of raw (i.e. as stored) evn revision
+    properties, for every revision in @repo.
+    """
+    fs = open_fs(repo)
+    prefix = repo.conf.propname_prefix + ':'
+    revprops = dict()
+    for rev in xrange(svn.fs.youngest_rev(fs)+1):
+        revprops[rev] = dict(
+            (n, v) for (n, v) in svn.fs.revision_proplist(fs, rev).items()
+                if n.startswith(prefix)
+        )
+    return revprops
+
+def restore_evn_revprops(repo, revprops):
+    """
+    Writes back the raw evn revision properties previously returned by
+    evn_revprops(), removing any that have been added since.
+    """
+    fs = open_fs(repo)
+    for (rev, props) in evn_revprops(repo).items():
+        expected = revprops[rev]
+        for name in set(props) | set(expected):
+            value = expected.get(name)
+            if props.get(name) != value:
+                svn.fs.change_rev_prop(fs, rev, name, value)
+
+def analyze_in_process(repo):
+    """
+    Runs `evnadmin analyze` against @repo in our process (so that anything
+    patched in by the caller is in effect), and returns the number of
+    revision property writes it made.
+    """
+    writes = [ 0 ]
+    write = RepositoryRevisionConfig._write
+
+    def counting_write(self, name, value):
+        writes[0] += 1
+        return write(self, name, value)
+
+    command = AnalyzeCommand(sys.stdin, StringIO.StringIO(), sys.stderr)
+    command.conf = repo.reload_conf()
+    command.path = repo.path
+    command.options = Options(dict(quiet=True))
+
+    RepositoryRevisionConfig._write = counting_write
+    try:
+        with command:
+            command.run()
+    finally:
+        RepositoryRevisionConfig._write = write
+    return writes[0]
+
+#===============================================================================
+# Test Classes
+#===============================================================================
+class TestRevPropBatch(EnversionTest, unittest.TestCase):
+    def test_01_batch(self):
+        repo = self.create_repo()
+        fs = open_fs(repo)
+        rc = RepositoryRevisionConfig(fs=fs, rev=1, conf=repo.conf)
+
+        writes = list()
+        write = rc._write
+
+        def counting_write(name, value):
+            writes.append(name)
+            return write(name, value)
+
+        rc._write = counting_write
+
+        dot()
+        with rc.batch():
+            rc.notes = [ 'foo' ]
+            with rc.batch():
+                rc.notes = [ 'foo', 'bar' ]
+            rc.warnings = [ 'baz' ]
+            self.assertTrue(rc.is_batching)
+            self.assertEqual(rc.notes, [ 'foo', 'bar' ])
+            self.assertEqual(writes, [])
+            self.assertIsNone(svn.fs.revision_prop(fs, 1, 'evn:notes'))
+
+        self.assertFalse(rc.is_batching)
+        self.assertEqual(sorted(writes), [ 'evn:notes', 'evn:warnings' ])
+        other = RepositoryRevisionConfig(fs=fs, rev=1, conf=repo.conf)
+        self.assertEqual(other.notes, [ 'foo', 'bar' ])
+        self.assertEqual(other.warnings, [ 'baz' ])
+
+    def test_02_exception_flushes_nothing(self):
+        repo = self.create_repo()
+        fs = open_fs(repo)
+        rc = RepositoryRevisionConfig(fs=fs, rev=1, conf=repo.conf)
+        before = evn_revprops(repo)
+
+        dot()
+        with self.assertRaises(ValueError):
+            with rc.batch():
+                rc.notes = [ 'foo' ]
+                rc.warnings = [ 'bar' ]
+                raise ValueError()
+
+        self.assertFalse(rc.is_batching)
+        self.assertNotIn('notes', rc)
+        self.assertNotIn('warnings', rc)
+        self.assertEqual(evn_revprops(repo), before)
+
+    def test_03_analyze_matches_unbatched(self):
+        repo = self.create_repo()
+        client = repo.svn
+        evnadmin = repo.evnadmin
+        ra = repo.ra
+
+        dot()
+        evnadmin.disable(repo.name)
+        client.mkdir(ra('/trunk/foo/'), m='Adding foo')
+        client.cp(ra('/trunk/'), ra('/branches/1.x/'), m='Branching')
+        client.cp(ra('/branches/1.x/'), ra('/tags/1.0/'), m='Tagging')
+        client.mv(ra('/branches/1.x/'), ra('/branches/2.x/'), m='Renaming')
+        client.rm(ra('/branches/2.x/'), m='Removing 2.x')
+        unanalyzed = evn_revprops(repo)
+
+        dot()
+        batched_writes = analyze_in_process(repo)
+        batched = evn_revprops(repo)
+        self.assertEqual(repo.revprops_at(0)['evn']['last_rev'], 6)
+        self.assertIn('/tags/1.0/', repo.roots_at(6))
+
+        dot()
+        restore_evn_revprops(repo, unanalyzed)
+        self.assertEqual(evn_revprops(repo), unanalyzed)
+        begin = RepositoryRevOrTxn._begin_revprop_batch
+        RepositoryRevOrTxn._begin_revprop_batch = lambda self: None
+        try:
+            unbatched_writes = analyze_in_process(repo)
+        finally:
+            RepositoryRevOrTxn._begin_revprop_batch = begin
+
+        self.assertEqual(evn_revprops(repo), batched)
+        self.assertLessEqual(batched_writes, unbatched_writes)
+
+    def test_04_analyze_exception_flushes_nothing(self):
+        repo = self.create_repo()
+        client = repo.svn
+        evnadmin = repo.evnadmin
+        ra = repo.ra
+
+        dot()
+        evnadmin.disable(repo.name)
+        client.cp(ra('/trunk/'), ra('/branches/1.x/'), m='Branching')
+        before = evn_revprops(repo)
+
+        # Fail at the point every modification made whilst processing the
+        # first revision is pending, i.e. when the batch would otherwise be
+        # flushed.
+        end = RepositoryRevOrTxn._end_revprop_batch
+
+        def failing_end(self, flush=True):
+            if flush:
+                raise ValueError()
+            return end(self, flush=flush)
+
+        dot()
+        RepositoryRevOrTxn._end_revprop_batch = failing_end
+        try:
+            with self.assertRaises(ValueError):
+                analyze_in_process(repo)
+        finally:
+            RepositoryRevOrTxn._end_revprop_batch = end
+
+        self.assertEqual(evn_revprops(repo), before)
+
+        dot()
+        analyze_in_process(repo)
+        self.assertEqual(repo.revprops_at(0)['evn']['last_rev'], 2)
+        self.assertIn('/branches/1.x/', repo.roots_at(2))
+
+def main():
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite())
+
+if __name__ == '__main__':
+    main()
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
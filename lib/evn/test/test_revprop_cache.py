@@ -0,0 +1,114 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import sys
+import json
+import unittest
+
+from evn.repo import (
+    RevPropCache,
+)
+
+from evn.progress import (
+    analyze_log_path,
+)
+
+from evn.test import (
+    EnversionTest,
+)
+
+from evn.config import (
+    get_or_create_config,
+)
+
+from evn.test.dot import (
+    dot,
+)
+
+#===============================================================================
+# Globals
+#===============================================================================
+conf = get_or_create_config()
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def suite():
+    module = sys.modules[__name__]
+    return unittest.defaultTestLoader.loadTestsFromModule(module)
+
+#===============================================================================
+# Test Classes
+#===============================================================================
+class TestRevPropCache(unittest.TestCase):
+    def test_01_decoded_values_are_copies(self):
+        c = RevPropCache()
+        raw = "{'/trunk/': {'created': 1}}"
+        roots = c.decode('fs', 1, 'evn:roots', raw)
+        roots['/trunk/']['created'] = 2
+        self.assertEqual(
+            c.decode('fs', 1, 'evn:roots', raw),
+            { '/trunk/': { 'created': 1 } },
+        )
+        self.assertEqual((c.hits, c.misses), (1, 1))
+
+    def test_02_stale_raw_value_misses(self):
+        c = RevPropCache()
+        c.decode('fs', 0, 'evn:last_rev', '1')
+        # I.e. written by another process behind our back.
+        self.assertEqual(c.decode('fs', 0, 'evn:last_rev', '2'), 2)
+        self.assertEqual(c.decode('fs', 0, 'evn:last_rev', '2'), 2)
+        self.assertEqual((c.hits, c.misses), (1, 2))
+
+    def test_03_write_through(self):
+        c = RevPropCache()
+        c.decode('fs', 1, 'evn:roots', '{}')
+        c.write('fs', 1, 'evn:roots', None)
+        self.assertEqual(c[(id('fs'), 1)], {})
+        c.write('fs', 2, 'evn:roots', '{}')
+        self.assertNotIn((id('fs'), 2), c)
+
+    def test_04_bounded(self):
+        c = RevPropCache(max_size=2)
+        for rev in (1, 2, 3):
+            c.decode('fs', rev, 'evn:roots', '{}')
+        self.assertEqual(len(c), 1)
+        self.assertEqual(c.stats.entries, 1)
+
+class TestRevPropCacheAnalyze(EnversionTest, unittest.TestCase):
+    def test_01_analyze_reports_hits(self):
+        repo = self.create_repo()
+        evnadmin = repo.evnadmin
+
+        dot()
+        evnadmin.disable(repo.name)
+        for i in xrange(2, 5):
+            path = '/branches/%d.x/' % i
+            repo.svn.cp(repo.ra('/trunk/'), repo.ra(path), m='Branching')
+
+        dot()
+        evnadmin.analyze(repo.name)
+        evnadmin.enable(repo.name)
+
+        with open(analyze_log_path(repo.path), 'r') as f:
+            records = [ json.loads(l) for l in f ]
+        caches = records[-1]['caches']
+        self.assertGreater(caches['revprops']['hits'], 0)
+        self.assertEqual(
+            sorted(repo.roots_at(4)),
+            [
+                '/branches/2.x/',
+                '/branches/3.x/',
+                '/branches/4.x/',
+                '/trunk/',
+            ],
+        )
+
+def main():
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite())
+
+if __name__ == '__main__':
+    main()
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
@@ -0,0 +1,134 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import os
+import sys
+import json
+import unittest
+
+from evn.test import (
+    EnversionTest,
+)
+
+from evn.util import (
+    chdir,
+)
+
+from evn.rootindex import (
+    RootIndex,
+    root_index_path,
+)
+
+from evn.progress import (
+    analyze_log_path,
+)
+
+from evn.config import (
+    get_or_create_config,
+)
+
+from evn.test.dot import (
+    dot,
+)
+
+#===============================================================================
+# Globals
+#===============================================================================
+conf = get_or_create_config()
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def suite():
+    module = sys.modules[__name__]
+    return unittest.defaultTestLoader.loadTestsFromModule(module)
+
+#===============================================================================
+# Test Classes
+#===============================================================================
+class TestRootIndex(EnversionTest, unittest.TestCase):
+    def _assert_index_matches_revprops(self, repo, end_rev):
+        index = RootIndex(root_index_path(repo.path))
+        try:
+            self.assertEqual(index.last_rev, end_rev)
+            for rev in range(1, end_rev+1):
+                expected = dict(
+                    (p, r['created'])
+                        for (p, r) in repo.roots_at(rev).items()
+                )
+                self.assertEqual(index.roots_at(rev), expected)
+            self.assertEqual(index.roots_at(end_rev+1), None)
+        finally:
+            index.close()
+
+    def test_01_index_maintained_and_rebuilt(self):
+        repo = self.create_repo()
+        svn = repo.svn
+        evnadmin = repo.evnadmin
+
+        dot()
+        svn.cp(repo.ra('/trunk/'), repo.ra('/branches/1.x/'), m='Branching')
+        svn.cp(repo.ra('/branches/1.x/'), repo.ra('/tags/1.0/'), m='Tagging')
+        svn.mv(repo.ra('/branches/1.x/'), repo.ra('/branches/2.x/'), m='Mv')
+        svn.rm(repo.ra('/branches/2.x/'), m='Removing branch')
+        with chdir(repo.wc):
+            svn.up()
+            svn.cp('trunk', 'branches/3.x')
+            svn.ci(m='Branching')
+
+        dot()
+        self._assert_index_matches_revprops(repo, 6)
+
+        index = RootIndex(root_index_path(repo.path))
+        self.assertEqual(index.created_rev('/branches/1.x/', 3), 2)
+        self.assertEqual(index.created_rev('/branches/1.x/', 4), None)
+        self.assertEqual(index.modified_rev(5), 5)
+        self.assertEqual(index.modified_rev(7), None)
+        index.close()
+
+        dot()
+        os.unlink(root_index_path(repo.path))
+        evnadmin.rebuild_root_index(repo.name)
+        self._assert_index_matches_revprops(repo, 6)
+
+    def test_02_historical_rootmatchers_shared(self):
+        repo = self.create_repo()
+        svn = repo.svn
+        evnadmin = repo.evnadmin
+
+        dot()
+        evnadmin.disable(repo.name)
+        svn.cp(repo.ra('/trunk/'), repo.ra('/branches/1.x/'), m='Branching')
+        svn.mkdir(repo.ra('/trunk/foo/'), m='Adding foo')
+        svn.mkdir(repo.ra('/trunk/bar/'), m='Adding bar')
+        svn.cp(repo.ra('/trunk/'), repo.ra('/tags/1.0/'), m='Tagging', r='3')
+        svn.cp(repo.ra('/trunk/'), repo.ra('/tags/1.1/'), m='Tagging', r='4')
+
+        dot()
+        evnadmin.analyze(repo.name)
+        evnadmin.enable(repo.name)
+
+        index = RootIndex(root_index_path(repo.path))
+        self.assertEqual(index.modified_rev(3), 2)
+        self.assertEqual(index.modified_rev(4), 2)
+        index.close()
+
+        # r3 and r4 have the same roots as r2, so the tag in r6 should have
+        # reused the root matcher loaded for the tag in r5.
+        with open(analyze_log_path(repo.path), 'r') as f:
+            records = [ json.loads(l) for l in f ]
+        caches = records[-1]['caches']
+        self.assertEqual(caches['rootmatchers']['hits'], 1)
+
+        roots = repo.roots_at(6)
+        self.assertEqual(roots['/tags/1.0/']['copied_from'], ('/trunk/', 3))
+        self.assertEqual(roots['/tags/1.1/']['copied_from'], ('/trunk/', 4))
+
+def main():
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite())
+
+if __name__ == '__main__':
+    main()
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
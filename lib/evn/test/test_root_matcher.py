@@ -0,0 +1,89 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import sys
+import unittest
+
+from evn.root import (
+    SimpleRootMatcher,
+)
+
+from evn.config import (
+    get_or_create_config,
+)
+
+#===============================================================================
+# Globals
+#===============================================================================
+conf = get_or_create_config()
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def suite():
+    module = sys.modules[__name__]
+    return unittest.defaultTestLoader.loadTestsFromModule(module)
+
+#===============================================================================
+# Test Classes
+#===============================================================================
+class TestSimpleRootMatcher(unittest.TestCase):
+    def test_01_find_root_path(self):
+        rm = SimpleRootMatcher(set(['/trunk/', '/branches/1.x/']))
+        self.assertEqual(rm.find_root_path('/trunk/foo.c'), '/trunk/')
+        self.assertEqual(rm.find_root_path('/trunk/'), '/trunk/')
+        self.assertEqual(
+            rm.find_root_path('/branches/1.x/a/'),
+            '/branches/1.x/',
+        )
+        self.assertIsNone(rm.find_root_path('/branches/'))
+        self.assertIsNone(rm.find_root_path('/branches/2.x/foo.c'))
+        self.assertIsNone(rm.find_root_path('/trunk'))
+
+    def test_02_nested_roots_match_longest_prefix(self):
+        rm = SimpleRootMatcher(set())
+        rm.add_root_path('/src/trunk/')
+        rm.add_root_path('/src/')
+
+        path = '/src/trunk/foo.c'
+        self.assertEqual(rm.find_root_path(path), '/src/trunk/')
+        self.assertEqual(rm.get_root_details(path).root_path, '/src/trunk/')
+        self.assertEqual(rm.find_root_path('/src/trunk/a/b/'), '/src/trunk/')
+        self.assertEqual(rm.find_root_path('/src/tags/foo.c'), '/src/')
+        self.assertEqual(rm.find_root_path('/src/trunkx/foo.c'), '/src/')
+        self.assertEqual(rm.get_root_details('/src/foo.c').root_path, '/src/')
+
+        rm.remove_root_path('/src/trunk/')
+        self.assertEqual(rm.find_root_path(path), '/src/')
+
+    def test_03_roots_under_path_tracks_changes(self):
+        rm = SimpleRootMatcher(set(['/trunk/', '/branches/1.x/']))
+        rm.add_root_path('/branches/2.x/')
+        rm.remove_root_path('/branches/1.x/')
+
+        # The first call builds the trie from the roots as they are now.
+        under = lambda p: sorted(rm.find_roots_under_path(p))
+        self.assertEqual(under('/branches/'), [ '/branches/2.x/' ])
+        self.assertEqual(under('/'), [ '/branches/2.x/', '/trunk/' ])
+        self.assertEqual(under('/trunk/'), [])
+        self.assertEqual(under('/tags/'), [])
+
+        # Subsequent changes are applied to it directly.
+        rm.add_root_path('/branches/3.x/')
+        rm.add_root_path('/tags/1.0/')
+        rm.remove_root_path('/branches/2.x/')
+        self.assertEqual(under('/branches/'), [ '/branches/3.x/' ])
+        self.assertEqual(under('/tags/'), [ '/tags/1.0/' ])
+
+        rm.remove_root_path('/tags/1.0/')
+        self.assertEqual(under('/tags/'), [])
+        self.assertEqual(under('/'), [ '/branches/3.x/', '/trunk/' ])
+
+def main():
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite())
+
+if __name__ == '__main__':
+    main()
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
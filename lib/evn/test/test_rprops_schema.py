@@ -0,0 +1,152 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import sys
+import unittest
+
+from evn.test import (
+    ensure_fails,
+    EnversionTest,
+)
+
+from evn.util import (
+    chdir,
+)
+
+from evn.config import (
+    get_or_create_config,
+)
+
+from evn.test.dot import (
+    dot,
+)
+
+#===============================================================================
+# Globals
+#===============================================================================
+conf = get_or_create_config()
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def suite():
+    module = sys.modules[__name__]
+    return unittest.defaultTestLoader.loadTestsFromModule(module)
+
+#===============================================================================
+# Test Classes
+#===============================================================================
+class TestRpropsSchemaMigration(EnversionTest, unittest.TestCase):
+    def _roots_by_rev(self, repo, end_rev):
+        return dict(
+            (rev, repo.roots_at(rev)) for rev in range(1, end_rev+1)
+        )
+
+    def test_01_migrate_to_deltas_and_back(self):
+        repo = self.create_repo()
+        repo.conf.set('main', 'roots-checkpoint-interval', '2')
+        repo.conf.save()
+        svn = repo.svn
+        evnadmin = repo.evnadmin
+
+        dot()
+        svn.cp(repo.ra('/trunk/'), repo.ra('/branches/1.x/'), m='Branching')
+        svn.cp(repo.ra('/branches/1.x/'), repo.ra('/tags/1.0/'), m='Tagging')
+        svn.mv(repo.ra('/branches/1.x/'), repo.ra('/branches/2.x/'), m='Mv')
+        expected = self._roots_by_rev(repo, 4)
+
+        dot()
+        error = 'repo is not set readonly'
+        with ensure_fails(self, error):
+            evnadmin.migrate_rprops(repo.name, to_version='2')
+
+        dot()
+        evnadmin.set_repo_readonly(repo.name)
+        evnadmin.migrate_rprops(repo.name, to_version='2')
+        evnadmin.unset_repo_readonly(repo.name)
+
+        self.assertEqual(self._roots_by_rev(repo, 4), expected)
+        self.assertEqual(repo.revprops_at(0)['evn']['rprops_version'], 2)
+
+        props = repo.revprops_at(4)['evn']
+        self.assertNotIn('roots', props)
+        self.assertIn('roots_delta', props)
+        self.assertIn('roots_checkpoint', props)
+
+        # New revisions should be written as deltas, and old revisions should
+        # still be updated correctly (i.e. /branches/3.x/'s entry on r5 when
+        # it's removed in r6).
+        dot()
+        svn.cp(repo.ra('/trunk/'), repo.ra('/branches/3.x/'), m='Branching')
+        svn.rm(repo.ra('/branches/3.x/'), m='Removing branch')
+        with chdir(repo.wc):
+            svn.up()
+            svn.cp('trunk', 'branches/4.x')
+            svn.ci(m='Branching')
+
+        dot()
+        props = repo.revprops_at(6)['evn']
+        self.assertNotIn('roots', props)
+        self.assertEqual(props['roots_delta']['removed'], ['/branches/3.x/'])
+        self.assertEqual(repo.roots_at(5)['/branches/3.x/']['removed'], 6)
+        self.assertNotIn('/branches/3.x/', repo.roots_at(6))
+        self.assertIn('/branches/4.x/', repo.roots)
+
+        expected = self._roots_by_rev(repo, 7)
+
+        dot()
+        evnadmin.set_repo_readonly(repo.name)
+        evnadmin.migrate_rprops(repo.name, to_version='1')
+        evnadmin.unset_repo_readonly(repo.name)
+
+        self.assertEqual(self._roots_by_rev(repo, 7), expected)
+        for rev in range(1, 8):
+            props = repo.revprops_at(rev)['evn']
+            self.assertIn('roots', props)
+            self.assertNotIn('roots_delta', props)
+            self.assertNotIn('roots_checkpoint', props)
+
+    def test_02_migrate_to_compact_and_back(self):
+        repo = self.create_repo()
+        svn = repo.svn
+        evnadmin = repo.evnadmin
+
+        dot()
+        svn.cp(repo.ra('/trunk/'), repo.ra('/branches/1.x/'), m='Branching')
+        svn.cp(repo.ra('/branches/1.x/'), repo.ra('/tags/1.0/'), m='Tagging')
+        expected = self._roots_by_rev(repo, 3)
+
+        dot()
+        evnadmin.set_repo_readonly(repo.name)
+        evnadmin.migrate_rprops(repo.name, to_version='3', to_base_version='2')
+        evnadmin.unset_repo_readonly(repo.name)
+
+        self.assertEqual(self._roots_by_rev(repo, 3), expected)
+        props = repo.revprops_at(0)['evn']
+        self.assertEqual(props['version'], 2)
+        self.assertEqual(props['rprops_version'], 3)
+
+        dot()
+        svn.cp(repo.ra('/trunk/'), repo.ra('/branches/2.x/'), m='Branching')
+        self.assertIn('/branches/2.x/', repo.roots)
+        self.assertEqual(repo.roots_at(2)['/branches/1.x/']['copies'], {
+            3: [('/tags/1.0/', 3)],
+        })
+        expected = self._roots_by_rev(repo, 4)
+
+        dot()
+        evnadmin.set_repo_readonly(repo.name)
+        evnadmin.migrate_rprops(repo.name, to_version='1', to_base_version='1')
+        evnadmin.unset_repo_readonly(repo.name)
+
+        self.assertEqual(self._roots_by_rev(repo, 4), expected)
+        self.assertEqual(repo.revprops_at(0)['evn']['version'], 1)
+
+def main():
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite())
+
+if __name__ == '__main__':
+    main()
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
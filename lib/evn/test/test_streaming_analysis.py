@@ -0,0 +1,114 @@
+#===============================================================================
+# Imports
+#===============================================================================
+import sys
+import unittest
+
+from evn.change import (
+    ChangeSet,
+)
+
+from evn.test import (
+    ensure_blocked,
+    EnversionTest,
+)
+
+from evn.path import (
+    join_path,
+)
+
+from evn.util import (
+    chdir,
+    Options,
+    bulk_chargen,
+)
+
+from evn.config import (
+    get_or_create_config,
+)
+
+from evn.test.dot import (
+    dot,
+)
+
+from evn.constants import (
+    e, # Errors
+)
+
+#===============================================================================
+# Globals
+#===============================================================================
+conf = get_or_create_config()
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def suite():
+    module = sys.modules[__name__]
+    return unittest.defaultTestLoader.loadTestsFromModule(module)
+
+#===============================================================================
+# Test Classes
+#===============================================================================
+class TestStreamingAnalysis(EnversionTest, unittest.TestCase):
+    def test_01_spilled_files(self):
+        repo = self.create_repo()
+        repo.conf.set('main', 'streaming-analysis', '1')
+        repo.conf.save()
+        svn = repo.svn
+
+        dot()
+        names = [ 'file%d.txt' % i for i in range(10) ]
+        tree = dict((name, bulk_chargen(100)) for name in names)
+        with chdir(repo.wc):
+            svn.mkdir('trunk/src')
+            repo.build(tree, prefix='trunk/src')
+            svn.add(*[ 'trunk/src/' + name for name in names ])
+            svn.ci(m='Adding src')
+
+        dot()
+        cs = ChangeSet(repo.path, 2, Options(dict(spill_files=True)))
+        cs.load()
+        self.assertEqual(cs.spilled_file_count, 10)
+        self.assertEqual(cs.analysis.change_count, 11)
+        src = cs['/trunk/src/']
+        self.assertEqual(src.spilled_file_count, 10)
+        self.assertFalse(src.is_empty)
+
+        dot()
+        svn.cp(repo.ra('/trunk/'), repo.ra('/tags/1.0/'), m='Tagging')
+        svn.up(repo.wc)
+
+        dot()
+        error = e.TagModified
+        tagdir = join_path(repo.wc, 'tags/1.0/src')
+        with chdir(tagdir):
+            tree = { 'file0.txt': bulk_chargen(200) }
+            repo.build(tree, prefix='tags/1.0/src')
+            with ensure_blocked(self, error):
+                svn.ci('file0.txt', m='Modifying tag')
+            svn.revert('file0.txt')
+
+            tree = { 'new.txt': bulk_chargen(100) }
+            repo.build(tree, prefix='tags/1.0/src')
+            svn.add('new.txt')
+            with ensure_blocked(self, error):
+                svn.ci('new.txt', m='Adding to tag')
+
+        dot()
+        error = e.BlockedFileExtension
+        with chdir(repo.wc):
+            tree = { 'test.dll': bulk_chargen(100) }
+            repo.build(tree, prefix='trunk/src')
+            svn.add('trunk/src/test.dll')
+            with ensure_blocked(self, error):
+                svn.ci('trunk/src/test.dll', m='Adding test.dll')
+
+def main():
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite())
+
+if __name__ == '__main__':
+    main()
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et:
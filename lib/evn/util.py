@@ -3,7 +3,11 @@
 #===============================================================================
 import os
 import sys
+import zlib
+import base64
 import shutil
+import time
+import marshal
 import inspect
 import datetime
 import itertools
@@ -247,6 +251,59 @@ def literal_eval(v):
     else:
         return ast.literal_eval(v)
 
+# Prefix identifying property values written by encode_compact_propval().
+# Values written via pformat() can never start with '#' (and literal_eval()
+# will reject any value that does), so the two formats can't be confused.
+COMPACT_PROPVAL_HEADER = '#evn:z1:'
+
+def plain_value(value):
+    """
+    Returns a copy of @value with any dict, list or tuple subclass instances
+    (i.e. ConfigDict/ConfigList) converted into plain dicts, lists and tuples.
+    """
+    v = value
+    if isinstance(v, dict):
+        return dict((k, plain_value(i)) for (k, i) in dict.items(v))
+    elif isinstance(v, list):
+        return [ plain_value(i) for i in v ]
+    elif isinstance(v, tuple):
+        return tuple(plain_value(i) for i in v)
+    else:
+        return v
+
+def is_compact_propval(value):
+    return value.startswith(COMPACT_PROPVAL_HEADER)
+
+def encode_compact_propval(value):
+    """
+    Encodes @value (which must only consist of the types supported by
+    literal_eval()) as a zlib-compressed, base64-encoded marshal string,
+    prefixed with COMPACT_PROPVAL_HEADER.  Both encoding and decoding are
+    done entirely in C, and are orders of magnitude faster than pformat()
+    and literal_eval() for large values.
+
+        >>> v = { '/trunk/': { 'created': 1, 'copies': { 1: [('/b/', 2)] } } }
+        >>> s = encode_compact_propval(v)
+        >>> is_compact_propval(s)
+        True
+        >>> decode_propval(s) == v
+        True
+        >>> decode_propval(pformat(v)) == v
+        True
+    """
+    data = zlib.compress(marshal.dumps(plain_value(value), 2))
+    return COMPACT_PROPVAL_HEADER + base64.b64encode(data)
+
+def decode_propval(value):
+    """
+    Decodes a property value written either by encode_compact_propval() or
+    in literal_eval() form.
+    """
+    if value.startswith(COMPACT_PROPVAL_HEADER):
+        data = base64.b64decode(value[len(COMPACT_PROPVAL_HEADER):])
+        return marshal.loads(zlib.decompress(data))
+    return literal_eval(value)
+
 def load_propval(orig_value, propname, attempts):
     c = itertools.count(0)
 
@@ -455,6 +512,54 @@ def pid_exists(pid):
         else:
             return True
 
+def create_locked_pid_file(path):
+    """
+    Creates @path containing our pid.  On platforms with fcntl, an exclusive
+    advisory lock is held on the file until the returned file object is
+    closed (or the process exits), and the file is only renamed into place
+    once that lock has been acquired.  That way, anyone that can see the file
+    can block on it via wait_for_pid_file_release().  On other platforms,
+    None is returned and waiters fall back to polling the pid.
+    """
+    pid = str(os.getpid())
+    if os.name == 'nt':
+        with open(path, 'w') as f:
+            f.write(pid)
+        return
+
+    import fcntl
+    tmp = '.'.join((path, pid))
+    f = open(tmp, 'w')
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    f.write(pid)
+    f.flush()
+    os.rename(tmp, path)
+    return f
+
+def wait_for_pid_file_release(path, sleep=1):
+    """
+    Blocks until the process that created @path via create_locked_pid_file()
+    has finished with it.  If the process dies without cleaning up, the lock
+    is released by the kernel, so stale pid files don't block.  Returns the
+    pid recorded in the file, or None if the file couldn't be read.
+    """
+    try:
+        f = open(path, 'r')
+    except IOError:
+        return
+
+    with f:
+        if os.name != 'nt':
+            import fcntl
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH)
+        pid = try_int(f.read())
+
+    if os.name == 'nt' and pid:
+        while pid_exists(pid):
+            time.sleep(sleep)
+
+    return pid
+
 class chdir(object):
     def __init__(self, path):
         self.old_path = os.getcwd()
@@ -0,0 +1,568 @@
+#!/usr/bin/env python
+"""
+Development benchmarks for Enversion.  These aren't installed with the evn
+package; run them from a source checkout, i.e.:
+
+    python test/bench.py revprop-encoding --roots 20000
+
+Run `python test/bench.py --help` for a list of benchmarks.
+"""
+#===============================================================================
+# Imports
+#===============================================================================
+import gc
+import os
+import sys
+import shutil
+import weakref
+import resource
+import optparse
+import tempfile
+import subprocess
+
+from os.path import (
+    abspath,
+    dirname,
+)
+
+from timeit import (
+    default_timer,
+)
+
+from pprint import (
+    pformat,
+)
+
+sys.path.insert(0, os.path.join(dirname(dirname(abspath(__file__))), 'lib'))
+
+from evn.util import (
+    literal_eval,
+    decode_propval,
+    encode_compact_propval,
+    render_text_table,
+)
+
+from evn.path import (
+    format_dir,
+)
+
+from evn.root import (
+    SimpleRootMatcher,
+)
+
+#===============================================================================
+# Helpers
+#===============================================================================
+def time_call(func, number=None, repeat=3):
+    """
+    Returns the best time (in seconds) of @repeat runs of @func, where each
+    run consists of @number calls.  If @number is None, it's picked such that
+    a run takes at least a tenth of a second.  The time returned is per call.
+    """
+    if number is None:
+        number = 1
+        while True:
+            start = default_timer()
+            for i in xrange(number):
+                func()
+            if default_timer() - start >= 0.1:
+                break
+            number *= 10
+
+    best = None
+    for i in xrange(repeat):
+        start = default_timer()
+        for j in xrange(number):
+            func()
+        elapsed = (default_timer() - start) / number
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def format_seconds(seconds):
+    for (unit, scale) in (('s', 1), ('ms', 1e3), ('us', 1e6)):
+        if seconds * scale >= 1:
+            return '%.3f%s' % (seconds * scale, unit)
+    return '%.3fns' % (seconds * 1e9)
+
+def synthetic_roots(count):
+    """
+    Returns a dict of @count roots in the same form as evn:roots, with a
+    mixture of roots inherited from earlier revisions (which only carry the
+    revision they were created in) and fully-populated roots.
+    """
+    roots = dict()
+    for i in xrange(count):
+        path = '/branches/team-%d/feature-%d/' % (i % 50, i)
+        if i % 10:
+            roots[path] = { 'created': i + 1 }
+            continue
+        roots[path] = {
+            'created': i + 1,
+            'creation_method': 'copied',
+            'copied_from': ('/trunk/', i),
+            'copies': { i + 2: [ ('/tags/%d.0/' % i, i + 2) ] },
+        }
+    return roots
+
+def _pformat_and_verify(value):
+    # What AbstractRepositoryConfig._try_convert() does for dicts.
+    s = pformat(value)
+    assert literal_eval(s) == value
+    return s
+
+def synthetic_root_paths(count):
+    """
+    Returns a set of @count root paths spread across a few projects, each
+    with a trunk and a mixture of branches and (mostly) tags.
+    """
+    paths = set()
+    projects = max(count // 1000, 1)
+    for i in xrange(count):
+        project = '/src/project-%d/' % (i % projects)
+        n = i // projects
+        if n == 0:
+            paths.add(project + 'trunk/')
+        elif n % 5:
+            paths.add(project + 'tags/%d.%d/' % (n // 100, n % 100))
+        else:
+            paths.add(project + 'branches/feature-%d/' % n)
+    return paths
+
+def svnmucc(root_url, message, actions):
+    with tempfile.NamedTemporaryFile() as f:
+        f.write('\n'.join(actions))
+        f.flush()
+        cmd = [
+            'svnmucc',
+            '-m', message,
+            '--root-url', root_url,
+            '--extra-args', f.name,
+        ]
+        with open(os.devnull, 'w') as devnull:
+            subprocess.check_call(cmd, stdout=devnull)
+
+def create_large_file_repo(path, size):
+    """
+    Creates a repository at @path whose r1 adds a file of @size megabytes
+    (of incompressible data), and whose r2 modifies a block in the middle
+    of it.  Returns the revision of the modification.
+    """
+    subprocess.check_call(['svnadmin', 'create', path])
+    root_url = 'file://%s' % os.path.abspath(path)
+
+    with tempfile.NamedTemporaryFile() as f:
+        data = bytearray(os.urandom(size * 1024 * 1024))
+        f.write(data)
+        f.flush()
+        svnmucc(root_url, 'Adding large file.', [ 'put', f.name, 'big.dat' ])
+
+        middle = len(data) // 2
+        data[middle:middle+4096] = os.urandom(4096)
+        f.seek(0)
+        f.write(data)
+        f.flush()
+        actions = [ 'put', f.name, 'big.dat' ]
+        svnmucc(root_url, 'Modifying large file.', actions)
+
+    return 2
+
+def create_large_move_repo(path, count):
+    """
+    Creates a repository at @path whose r2 moves @count directories from /a/
+    to /b/.  Every tenth move replaces an existing directory in /b/ (i.e. is
+    a rename via replacement).  Returns the revision of the move.
+    """
+    subprocess.check_call(['svnadmin', 'create', path])
+    root_url = 'file://%s' % os.path.abspath(path)
+
+    actions = [ 'mkdir', 'a', 'mkdir', 'b' ]
+    for i in xrange(count):
+        actions += [ 'mkdir', 'a/d%d' % i ]
+        if i % 10 == 0:
+            actions += [ 'mkdir', 'b/d%d' % i ]
+    svnmucc(root_url, 'Creating directories.', actions)
+
+    actions = list()
+    for i in xrange(count):
+        if i % 10 == 0:
+            actions += [ 'rm', 'b/d%d' % i ]
+        actions += [ 'mv', 'a/d%d' % i, 'b/d%d' % i ]
+    svnmucc(root_url, 'Moving directories.', actions)
+
+    return 2
+
+def create_large_add_repo(path, count):
+    """
+    Creates a repository at @path whose r1 adds @count empty files, spread
+    over directories of 100 files each.  Returns the revision of the add.
+    """
+    subprocess.check_call(['svnadmin', 'create', path])
+    root_url = 'file://%s' % os.path.abspath(path)
+
+    with tempfile.NamedTemporaryFile() as empty:
+        actions = [ 'mkdir', 'trunk' ]
+        for i in xrange(count):
+            if i % 100 == 0:
+                actions += [ 'mkdir', 'trunk/d%d' % (i // 100) ]
+            actions += [ 'put', empty.name, 'trunk/d%d/f%d' % (i // 100, i) ]
+        svnmucc(root_url, 'Adding files.', actions)
+
+    return 1
+
+def max_rss_in_bytes():
+    # ru_maxrss is in kilobytes on Linux, and in bytes on OS X.
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if os.uname()[0] == 'Darwin' else rss * 1024
+
+#===============================================================================
+# Classes
+#===============================================================================
+class LengthBucketRootMatcher(object):
+    """
+    The original SimpleRootMatcher (sans root details), which grouped roots
+    into sets by path depth and probed each depth in turn, and found roots
+    under a path via a linear scan.  Kept for benchmarking purposes.
+    """
+    def __init__(self, roots):
+        self.roots = set()
+        self.root_dirs_by_length = dict()
+        self.lengths = None
+        for p in roots:
+            self.add_root_path(p)
+
+    @property
+    def reversed_root_dir_lengths(self):
+        if self.lengths is None:
+            lengths = reversed(sorted(self.root_dirs_by_length.keys()))
+            self.lengths = [ l+1 for l in lengths ]
+        return self.lengths
+
+    def add_root_path(self, p):
+        assert (
+            p == format_dir(p) and
+            p not in self.roots and
+            p.count('/') >= 2 and p != '//'
+        )
+        dirs = p.split('/')[1:-1]
+        length = len(dirs)
+        assert length >= 1
+        for i in range(length, 0, -1):
+            roots = self.root_dirs_by_length.get(i)
+            if roots:
+                assert '/%s/' % '/'.join(dirs[:i]) not in roots
+        if length not in self.root_dirs_by_length:
+            self.root_dirs_by_length[length] = set()
+            self.lengths = None
+        self.root_dirs_by_length[length].add(p)
+        self.roots.add(p)
+
+    def remove_root_path(self, p):
+        assert p in self.roots
+        length = p.count('/')-1
+        assert length >= 1
+        roots = self.root_dirs_by_length[length]
+        roots.remove(p)
+        if not roots:
+            del self.root_dirs_by_length[length]
+            self.lengths = None
+        self.roots.remove(p)
+
+    def find_root_path(self, path):
+        parts = path.split('/')[1:]
+        parts_length = len(parts)
+        for r in self.reversed_root_dir_lengths:
+            if r > parts_length:
+                continue
+            root_path = '/%s/' % '/'.join(parts[:r-1])
+            if root_path in self.roots:
+                return root_path
+
+    def find_roots_under_path(self, p):
+        return [ r for r in self.roots if r != p and r.startswith(p) ]
+
+#===============================================================================
+# Benchmarks
+#===============================================================================
+def benchmark_revprop_encoding(count=10000, number=None):
+    """
+    Times encoding and decoding a synthetic evn:roots value of @count roots
+    in both the literal (pformat()/literal_eval()) and compact forms.
+    Returns a list of (format, size, encode time, decode time) tuples.
+    """
+    roots = synthetic_roots(count)
+    results = list()
+    encoders = (
+        ('literal', _pformat_and_verify, literal_eval),
+        ('compact', encode_compact_propval, decode_propval),
+    )
+    for (name, encode, decode) in encoders:
+        encoded = encode(roots)
+        assert decode(encoded) == roots
+        results.append((
+            name,
+            len(encoded),
+            time_call(lambda: encode(roots), number=number),
+            time_call(lambda: decode(encoded), number=number),
+        ))
+    return results
+
+def run_revprop_encoding(opts, args):
+    """
+    evn:roots literal (rprops v1/v2) vs compact (v3) encoding.
+    """
+    rows = [ ('Format', 'Size', 'Encode', 'Decode') ]
+    results = benchmark_revprop_encoding(
+        count=opts.roots or 10000,
+        number=opts.number,
+    )
+    for (name, size, encode, decode) in results:
+        rows.append((
+            name,
+            size,
+            format_seconds(encode),
+            format_seconds(decode),
+        ))
+    banner = 'evn:roots encoding (%d roots)' % (opts.roots or 10000)
+    render_text_table(rows, banner=banner, output=sys.stdout)
+
+def benchmark_root_matcher(count=50000, number=None):
+    """
+    Times building root matchers over @count synthetic roots, looking up the
+    roots of a batch of paths, adding and removing a root, finding the roots
+    under a project, then adding and removing a root again (i.e. once
+    SimpleRootMatcher has built its trie), for both LengthBucketRootMatcher
+    and SimpleRootMatcher.  Returns a list of (implementation, build time,
+    lookup time, add/remove time, roots under time, add/remove time after
+    roots under) tuples.
+    """
+    roots = synthetic_root_paths(count)
+    sample = sorted(roots)[::max(len(roots) // 100, 1)]
+    paths = [ p + 'lib/foo.c' for p in sample ] + [ '/src/README' ]
+    under = '/src/project-0/'
+    new_root = under + 'branches/benchmark/'
+
+    results = list()
+    for cls in (LengthBucketRootMatcher, SimpleRootMatcher):
+        rm = cls(set(roots))
+        assert [ rm.find_root_path(p) for p in paths ] == sample + [ None ]
+
+        def lookup():
+            for p in paths:
+                rm.find_root_path(p)
+
+        def add_remove():
+            rm.add_root_path(new_root)
+            rm.remove_root_path(new_root)
+
+        results.append((
+            cls.__name__,
+            time_call(lambda: cls(roots), number=number, repeat=1),
+            time_call(lookup, number=number) / len(paths),
+            time_call(add_remove, number=number),
+            time_call(lambda: rm.find_roots_under_path(under), number=number),
+            time_call(add_remove, number=number),
+        ))
+    return results
+
+def run_root_matcher(opts, args):
+    """
+    SimpleRootMatcher vs the original length-bucketed root matcher.
+    """
+    count = opts.roots or 50000
+    rows = [
+        ('Matcher', 'Build', 'Lookup', 'Add/Remove', 'Under', 'Add/Remove'),
+    ]
+    for result in benchmark_root_matcher(count=count, number=opts.number):
+        rows.append(
+            (result[0],) + tuple(format_seconds(t) for t in result[1:])
+        )
+    banner = 'Root matcher (%d roots)' % count
+    render_text_table(rows, banner=banner, output=sys.stdout)
+
+def benchmark_changeset_load(repo_path, rev, number=None):
+    """
+    Times loading the changeset for @rev of the repository at @repo_path,
+    with and without text deltas being sent by svn.repos.replay2() (i.e.
+    the replay-text-deltas configuration option).  Returns a list of (mode,
+    change count, load time) tuples.
+    """
+    from evn.change import ChangeSet
+    from evn.util import Options
+
+    results = list()
+    for (mode, send_deltas) in (('deltas', True), ('metadata', False)):
+        options = Options(dict(send_deltas=send_deltas))
+
+        def load():
+            cs = ChangeSet(repo_path, rev, options)
+            cs.load()
+            return cs
+
+        count = len(load()._all_changes)
+        results.append((mode, count, time_call(load, number=number)))
+    return results
+
+def run_changeset_load(opts, args):
+    """
+    Changeset load with and without text deltas ([REPO_PATH REV]).
+    """
+    base = None
+    if args:
+        (path, rev) = (args[0], int(args[1]))
+        banner = 'r%d changeset load' % rev
+    else:
+        base = tempfile.mkdtemp(prefix='evn-bench-')
+        path = os.path.join(base, 'repo')
+        rev = create_large_file_repo(path, opts.size)
+        banner = 'Changeset load (%dMB file modified)' % opts.size
+
+    try:
+        rows = [ ('Replay', 'Changes', 'Load') ]
+        results = benchmark_changeset_load(path, rev, number=opts.number)
+        for (mode, count, load) in results:
+            rows.append((mode, count, format_seconds(load)))
+        render_text_table(rows, banner=banner, output=sys.stdout)
+    finally:
+        if base:
+            shutil.rmtree(base, ignore_errors=True)
+
+def benchmark_large_move(counts=(1000, 2000, 4000, 8000), number=1):
+    """
+    Times loading (and thus analysing the renames within) a changeset that
+    moves N directories, for each N in @counts.  Returns a list of (N, load
+    time, load time per move) tuples; the time per move should stay roughly
+    constant as N grows.
+    """
+    from evn.change import ChangeSet
+    from evn.util import Options
+
+    results = list()
+    for count in counts:
+        base = tempfile.mkdtemp(prefix='evn-bench-')
+        try:
+            path = os.path.join(base, 'repo')
+            rev = create_large_move_repo(path, count)
+
+            def load():
+                cs = ChangeSet(path, rev, Options())
+                cs.load()
+                assert len(cs._rename) == count
+                return cs
+
+            elapsed = time_call(load, number=number, repeat=1)
+            results.append((count, elapsed, elapsed / count))
+        finally:
+            shutil.rmtree(base, ignore_errors=True)
+    return results
+
+def run_large_move(opts, args):
+    """
+    Changeset load for a commit of N directory moves ([N ...]).
+    """
+    counts = [ int(a) for a in args ] or [ 1000, 2000, 4000, 8000 ]
+    rows = [ ('Moves', 'Load', 'Per Move') ]
+    for (count, load, per_move) in benchmark_large_move(counts=counts):
+        rows.append((count, format_seconds(load), format_seconds(per_move)))
+    banner = 'Large move changeset load'
+    render_text_table(rows, banner=banner, output=sys.stdout)
+
+def benchmark_change_tree_memory(count=100000):
+    """
+    Loads a changeset that adds @count files (and their directories), and
+    returns a tuple of (node count, peak RSS growth per node in bytes, and
+    whether the changeset was freed by reference counting alone, i.e.
+    without destroy() or the cyclic garbage collector).
+    """
+    from evn.change import ChangeSet
+    from evn.util import Options
+
+    base = tempfile.mkdtemp(prefix='evn-bench-')
+    try:
+        path = os.path.join(base, 'repo')
+        rev = create_large_add_repo(path, count)
+
+        gc.collect()
+        gc.disable()
+        try:
+            before = max_rss_in_bytes()
+            cs = ChangeSet(path, rev, Options())
+            cs.load()
+            nodes = len(cs._all_changes)
+            growth = max_rss_in_bytes() - before
+
+            ref = weakref.ref(cs)
+            del cs
+            freed = ref() is None
+        finally:
+            gc.enable()
+
+        return (nodes, float(growth) / nodes, freed)
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+def run_change_tree_memory(opts, args):
+    """
+    Peak RSS growth per node when loading a commit that adds N files ([N]).
+    """
+    # Only one N per run: the peak RSS of a process never goes back down.
+    count = int(args[0]) if args else 100000
+    (nodes, per_node, freed) = benchmark_change_tree_memory(count=count)
+    rows = [
+        ('Nodes', 'Bytes/Node', 'Freed'),
+        (nodes, '%.0f' % per_node, 'yes' if freed else 'no'),
+    ]
+    banner = 'Change tree memory'
+    render_text_table(rows, banner=banner, output=sys.stdout)
+
+#===============================================================================
+# Main
+#===============================================================================
+BENCHMARKS = (
+    ('revprop-encoding', run_revprop_encoding),
+    ('root-matcher', run_root_matcher),
+    ('changeset-load', run_changeset_load),
+    ('large-move', run_large_move),
+    ('change-tree-memory', run_change_tree_memory),
+)
+
+def main():
+    usage = '%prog [ options ] BENCHMARK [ ARGS ... ]\n\nBenchmarks:\n'
+    usage += '\n'.join(
+        '    %s: %s' % (name, ' '.join(func.__doc__.split()))
+            for (name, func) in BENCHMARKS
+    )
+    parser = optparse.OptionParser(usage=usage)
+    parser.add_option(
+        '-n', '--number',
+        dest='number',
+        type='int',
+        help='calls per timing run [default: automatic]',
+    )
+    parser.add_option(
+        '-r', '--roots',
+        dest='roots',
+        type='int',
+        metavar='COUNT',
+        help='number of roots to generate',
+    )
+    parser.add_option(
+        '-s', '--size',
+        dest='size',
+        type='int',
+        default=64,
+        metavar='MB',
+        help='size of the file changeset-load creates [default: %default]',
+    )
+
+    (opts, args) = parser.parse_args()
+    benchmarks = dict(BENCHMARKS)
+    if not args or args[0] not in benchmarks:
+        parser.error('expected one of: %s' % ', '.join(sorted(benchmarks)))
+
+    benchmarks[args[0]](opts, args[1:])
+
+if __name__ == '__main__':
+    main()
+
+# vim:set ts=8 sw=4 sts=4 tw=78 et: